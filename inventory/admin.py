@@ -9,7 +9,7 @@ class InventoryAdmin(admin.ModelAdmin):
 =======
 # inventory/admin.py
 from django.contrib import admin
-from .models import StockMovement
+from .models import StockLot, StockMovement, StockSnapshot
 
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
@@ -17,4 +17,29 @@ class StockMovementAdmin(admin.ModelAdmin):
     list_filter = ['movement_type', 'created_at']
     search_fields = ['medicine__name', 'reason']
     readonly_fields = ['created_at']
+
+    # Grand livre : les mouvements enregistrés ne sont ni modifiés ni supprimés
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockLot)
+class StockLotAdmin(admin.ModelAdmin):
+    list_display = ['medicine', 'lot_number', 'expiry_date', 'quantity', 'received_at']
+    list_filter = ['expiry_date']
+    list_select_related = ['medicine']
+    search_fields = ['medicine__name', 'lot_number']
+    # Les quantités évoluent uniquement par les mouvements de stock
+    readonly_fields = ['quantity', 'received_at']
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['medicine', 'taken_at', 'quantity']
+    list_select_related = ['medicine']
+    search_fields = ['medicine__name']
+    date_hierarchy = 'taken_at'
 >>>>>>> develop
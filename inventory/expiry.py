@@ -0,0 +1,169 @@
+# inventory/expiry.py
+# Retrait des lots périmés (ou proches de la péremption) et rapport des péremptions
+# Traitement par lots de médicaments, une transaction par lot : quelques requêtes
+# groupées par lot, jamais un save() par ligne
+
+import datetime
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from products.cache import invalidate_catalog
+from products.models import Medicine, stock_status_expression
+from .lots import earliest_lot_expiry, lots_stock_total
+from .models import StockLot, StockMovement
+from .stats import record_stock_changes
+
+# Nombre de médicaments traités par transaction
+SWEEP_BATCH_SIZE = 500
+
+
+class SweepReport:
+    """Résultat d'un retrait : volumes retirés et durée"""
+
+    def __init__(self):
+        self.lots = 0
+        self.medicines = 0
+        self.units = 0
+        self.out_of_stock = 0
+        self.elapsed = 0.0
+
+
+def expiry_cutoff(withdraw_days=0):
+    """Les lots qui périment avant cette date sont retirés (aujourd'hui + withdraw_days)"""
+    return timezone.localdate() + datetime.timedelta(days=withdraw_days)
+
+
+def expiring_lots(days=30):
+    """
+    Lots en stock qui périment dans les `days` prochains jours (déjà périmés compris)
+
+    Lecture de l'index partiel (expiry_date, medicine) des lots non vides.
+
+    Returns:
+        QuerySet: Lots avec leur médicament, par date de péremption
+    """
+    return (
+        StockLot.objects.filter(quantity__gt=0, expiry_date__lt=expiry_cutoff(days + 1))
+        .select_related('medicine', 'medicine__category')
+        .order_by('expiry_date', 'medicine__name', 'id')
+    )
+
+
+def _expired_medicine_batches(cutoff, batch_size):
+    """Identifiants des médicaments ayant des lots à retirer, par paquets (pagination par clé)"""
+    last_id = 0
+    while True:
+        ids = list(
+            StockLot.objects.filter(quantity__gt=0, expiry_date__lt=cutoff, medicine_id__gt=last_id)
+            .order_by('medicine_id')
+            .values_list('medicine_id', flat=True)
+            .distinct()[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def withdraw_lots(medicine_ids, cutoff, user):
+    """
+    Retire du stock les lots des médicaments donnés qui périment avant `cutoff`
+
+    Une transaction, nombre de requêtes constant :
+    1. Verrouillage des médicaments (tri par pk, même ordre que le checkout)
+    2. Lecture des lots à retirer puis mise à zéro en un UPDATE
+    3. Deux UPDATE des médicaments, recalculés à partir des lots restants :
+       stock et péremption du premier lot, puis statut de stock ; les
+       médicaments sans stock restant passent en rupture (is_available n'est
+       pas modifié : le catalogue filtre déjà sur le stock, et un
+       réapprovisionnement les rend de nouveau visibles)
+    4. Un mouvement de sortie « Périmé » par lot, avec bulk_create
+
+    Returns:
+        tuple: (lots retirés, unités retirées, médicaments passés en rupture)
+    """
+    with transaction.atomic():
+        states = {
+            pk: (stock, minimum, price)
+            for pk, stock, minimum, price in Medicine.objects.select_for_update()
+            .filter(pk__in=medicine_ids)
+            .order_by('pk')
+            .values_list('pk', 'stock_quantity', 'minimum_stock', 'price')
+        }
+        lots = list(
+            StockLot.objects.filter(
+                medicine_id__in=states, quantity__gt=0, expiry_date__lt=cutoff
+            ).values_list('pk', 'medicine_id', 'lot_number', 'expiry_date', 'quantity')
+        )
+        if not lots:
+            return 0, 0, 0
+
+        StockLot.objects.filter(pk__in=[lot[0] for lot in lots]).update(quantity=0)
+
+        removed = defaultdict(int)
+        for _, medicine_id, _, _, quantity in lots:
+            removed[medicine_id] += quantity
+
+        # Pas de CASE par médicament : avec des centaines de médicaments par
+        # paquet, le stock est recalculé à partir des lots (sous-requête indexée)
+        batch = Medicine.objects.filter(pk__in=removed)
+        batch.update(stock_quantity=lots_stock_total(), expiry_date=earliest_lot_expiry())
+        batch.update(stock_status=stock_status_expression())
+        out_of_stock = batch.filter(stock_quantity=0).count()
+
+        StockMovement.objects.bulk_create(
+            [
+                StockMovement(
+                    medicine_id=medicine_id,
+                    movement_type='out',
+                    quantity=quantity,
+                    reason=(
+                        f"{StockMovement.EXPIRED_REASON} - lot {lot_number or '-'} "
+                        f"(exp. {expiry:%d/%m/%Y})"
+                    ),
+                    created_by=user,
+                )
+                for _, medicine_id, lot_number, expiry, quantity in lots
+            ],
+            batch_size=1000,
+        )
+
+        record_stock_changes([
+            (states[pk], (max(0, states[pk][0] - quantity), states[pk][1], states[pk][2]))
+            for pk, quantity in removed.items()
+        ])
+        transaction.on_commit(invalidate_catalog)
+
+    return len(lots), sum(removed.values()), out_of_stock
+
+
+def sweep_expired_stock(user, withdraw_days=0, batch_size=SWEEP_BATCH_SIZE, progress=None):
+    """
+    Retire tous les lots qui périment avant aujourd'hui + `withdraw_days`
+
+    Args:
+        user (User): Auteur des mouvements de sortie
+        withdraw_days (int): Retirer aussi les lots qui périment dans ce délai
+        batch_size (int): Médicaments traités par transaction
+        progress (callable): Appelé avec le rapport après chaque paquet (optionnel)
+
+    Returns:
+        SweepReport: Volumes retirés et durée
+    """
+    started = time.perf_counter()
+    cutoff = expiry_cutoff(withdraw_days)
+    report = SweepReport()
+    for medicine_ids in _expired_medicine_batches(cutoff, batch_size):
+        lots, units, out_of_stock = withdraw_lots(medicine_ids, cutoff, user)
+        report.lots += lots
+        report.medicines += len(medicine_ids)
+        report.units += units
+        report.out_of_stock += out_of_stock
+        report.elapsed = time.perf_counter() - started
+        if progress:
+            progress(report)
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -24,6 +24,24 @@ class StockUpdateForm(forms.Form):
         widget=forms.TextInput(attrs={'class': 'form-control'}),
         help_text="Motif de la modification"
     )
+    lot_number = forms.CharField(
+        max_length=50,
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+        help_text="Numéro du lot fournisseur (entrée de stock)"
+    )
+    expiry_date = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+        help_text="Date de péremption du lot (obligatoire pour une entrée de stock)"
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Une entrée crée un lot : sa péremption doit être connue
+        if cleaned_data.get('movement_type') == 'in' and not cleaned_data.get('expiry_date'):
+            self.add_error('expiry_date', "La date de péremption du lot est obligatoire pour une entrée.")
+        return cleaned_data
 
 
 class StockMovementFilterForm(forms.Form):
@@ -48,5 +66,25 @@ class StockMovementFilterForm(forms.Form):
     )
 
 
+class DeliveryUploadForm(forms.Form):
+    file = forms.FileField(
+        label="Fichier de livraison",
+        help_text="CSV ou XLSX : médicament (id ou nom), quantité, lot, date de péremption",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+    reference = forms.CharField(
+        max_length=100,
+        required=False,
+        label="Référence du bon de livraison",
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if not file.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Seuls les fichiers CSV et XLSX sont acceptés.")
+        return file
+
+
 # NOTE: Les vues ont été déplacées vers inventory/views.py
 # Ce fichier ne contient que les formulaires
\ No newline at end of file
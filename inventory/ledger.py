@@ -0,0 +1,156 @@
+# inventory/ledger.py
+# Grand livre du stock : soldes à une date et rapprochement avec Medicine.stock_quantity
+# Les mouvements ne sont jamais modifiés ; des instantanés périodiques (StockSnapshot)
+# évitent de rejouer tout l'historique : solde = dernier instantané + mouvements suivants,
+# lus par l'index (medicine, created_at)
+
+import datetime
+
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from products.models import Medicine
+from .models import StockMovement, StockSnapshot
+
+# Marge avant l'heure de l'instantané : un mouvement horodaté juste avant
+# mais pas encore validé par sa transaction est ainsi compté
+SNAPSHOT_SETTLE = datetime.timedelta(minutes=5)
+
+
+def signed_quantity():
+    """Expression : variation du stock apportée par un mouvement"""
+    return Case(
+        When(movement_type='out', then=-F('quantity')),
+        default=F('quantity'),
+        output_field=IntegerField(),
+    )
+
+
+def ledger_moment(when):
+    """
+    Instant de fin d'un solde : une date désigne la fin de cette journée
+
+    Les mouvements pris en compte ont created_at <= instant (borne sargable,
+    jamais created_at__date).
+    """
+    if isinstance(when, datetime.datetime):
+        return when if timezone.is_aware(when) else timezone.make_aware(when)
+    return timezone.make_aware(
+        datetime.datetime.combine(when + datetime.timedelta(days=1), datetime.time.min)
+    ) - datetime.timedelta(microseconds=1)
+
+
+def _movements_total(after=None, until=None):
+    """Sous-requête : somme des variations du médicament sur ]after, until]"""
+    movements = StockMovement.objects.filter(medicine=OuterRef('pk'))
+    if after is not None:
+        movements = movements.filter(created_at__gt=after)
+    if until is not None:
+        movements = movements.filter(created_at__lte=until)
+    return Coalesce(
+        Subquery(
+            movements.values('medicine').annotate(total=Sum(signed_quantity())).values('total')[:1]
+        ),
+        0,
+    )
+
+
+def _with_snapshot(medicines, until=None):
+    """Annote le dernier instantané (antérieur à `until` le cas échéant)"""
+    snapshots = StockSnapshot.objects.filter(medicine=OuterRef('pk'))
+    if until is not None:
+        snapshots = snapshots.filter(taken_at__lte=until)
+    snapshots = snapshots.order_by('-taken_at')
+    return medicines.annotate(
+        snapshot_at=Subquery(snapshots.values('taken_at')[:1]),
+        snapshot_quantity=Subquery(snapshots.values('quantity')[:1]),
+    )
+
+
+def stock_as_of(when, medicines=None):
+    """
+    Stock des médicaments à une date, sans rejouer l'historique
+
+    Dernier instantané antérieur plus les mouvements qui le suivent ; sans
+    instantané antérieur, stock actuel moins les mouvements postérieurs.
+
+    Args:
+        when (date | datetime): Date (fin de journée) ou instant
+        medicines (QuerySet): Médicaments concernés (défaut : tous)
+
+    Returns:
+        QuerySet: Médicaments annotés avec `balance`
+    """
+    until = ledger_moment(when)
+    medicines = _with_snapshot(Medicine.objects.all() if medicines is None else medicines, until)
+    return medicines.annotate(
+        balance=Case(
+            When(
+                snapshot_at__isnull=False,
+                then=F('snapshot_quantity') + _movements_total(OuterRef('snapshot_at'), until),
+            ),
+            default=F('stock_quantity') - _movements_total(after=until),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def ledger_discrepancies(medicines=None):
+    """
+    Médicaments dont le stock ne correspond pas au grand livre
+
+    Solde du grand livre : dernier instantané plus tous les mouvements suivants.
+    Les médicaments sans instantané ne sont pas rapprochés.
+
+    Returns:
+        QuerySet: Médicaments annotés avec `ledger_balance`, écarts seulement
+    """
+    medicines = _with_snapshot(Medicine.objects.all() if medicines is None else medicines)
+    return (
+        medicines.filter(snapshot_at__isnull=False)
+        .annotate(ledger_balance=F('snapshot_quantity') + _movements_total(OuterRef('snapshot_at')))
+        .exclude(ledger_balance=F('stock_quantity'))
+    )
+
+
+def take_stock_snapshots(at=None, batch_size=1000):
+    """
+    Enregistre le solde de chaque médicament d'après le grand livre
+
+    L'instantané est pris à `at` (défaut : maintenant moins SNAPSHOT_SETTLE) à
+    partir de l'instantané précédent et des mouvements, pas de stock_quantity :
+    un écart éventuel reste ainsi visible par ledger_discrepancies.
+
+    Returns:
+        int: Nombre d'instantanés créés
+    """
+    at = at or timezone.now() - SNAPSHOT_SETTLE
+    balances = stock_as_of(at).order_by('pk').values_list('pk', 'balance')
+    created, batch = 0, []
+    for pk, balance in balances.iterator(chunk_size=batch_size):
+        batch.append(StockSnapshot(medicine_id=pk, taken_at=at, quantity=balance))
+        if len(batch) == batch_size:
+            created += len(StockSnapshot.objects.bulk_create(batch, ignore_conflicts=True))
+            batch = []
+    if batch:
+        created += len(StockSnapshot.objects.bulk_create(batch, ignore_conflicts=True))
+    return created
+
+
+def prune_stock_snapshots(before):
+    """
+    Supprime les instantanés antérieurs à `before`, sauf le dernier de chaque médicament
+
+    Returns:
+        int: Nombre d'instantanés supprimés
+    """
+    latest = StockSnapshot.objects.filter(
+        medicine=OuterRef('medicine'), taken_at__lt=before
+    ).order_by('-taken_at').values('pk')[:1]
+    deleted, _ = (
+        StockSnapshot.objects.filter(taken_at__lt=before)
+        .exclude(pk=Subquery(latest))
+        .delete()
+    )
+    return deleted
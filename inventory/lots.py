@@ -0,0 +1,227 @@
+# inventory/lots.py
+# Lots de stock et allocation FEFO (premier périmé, premier sorti)
+# Le stock d'un médicament est la somme de ses lots : toutes les sorties prélèvent
+# les lots par date de péremption croissante, avec des requêtes ensemblistes
+# (une fonction de fenêtre pour choisir les lots, un UPDATE groupé pour les décrémenter)
+
+from collections import defaultdict
+
+from django.db.models import (
+    Case, F, IntegerField, Min, OuterRef, PositiveIntegerField, Q, Subquery, Sum, Value, When, Window,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from products.models import Medicine
+from .models import StockLot, StockLotAllocation
+
+# Numéro des lots créés sans lot fournisseur connu (stock initial, retours sans lot d'origine)
+OPENING_LOT = 'INITIAL'
+
+
+def earliest_lot_expiry():
+    """
+    Expression : péremption du premier lot non vide du médicament
+
+    À utiliser dans un UPDATE de Medicine (expiry_date) ; la date actuelle est
+    conservée si le médicament n'a plus aucun lot en stock.
+    """
+    return Coalesce(
+        Subquery(
+            StockLot.objects.filter(medicine=OuterRef('pk'), quantity__gt=0)
+            .values('medicine')
+            .annotate(first=Min('expiry_date'))
+            .values('first')[:1]
+        ),
+        F('expiry_date'),
+    )
+
+
+def lots_stock_total():
+    """
+    Expression : somme des quantités des lots du médicament
+
+    Pour les UPDATE de Medicine portant sur beaucoup de médicaments à la fois
+    (un CASE par médicament deviendrait quadratique).
+    """
+    return Coalesce(
+        Subquery(
+            StockLot.objects.filter(medicine=OuterRef('pk'), quantity__gt=0)
+            .values('medicine')
+            .annotate(total=Sum('quantity'))
+            .values('total')[:1]
+        ),
+        0,
+    )
+
+
+def plan_fefo(requested, include_expired=False):
+    """
+    Choisit les lots à prélever pour chaque médicament, premier périmé en premier
+
+    Les lots déjà périmés (pas encore retirés par sweep_expired_stock) ne sont pas
+    vendables : sauf `include_expired`, ils sont ignorés et leurs unités comptent
+    dans les manquants.
+
+    Une seule requête, quel que soit le nombre de lots :
+    - chaque lot contenant au moins une unité, une demande de N unités entame au
+      plus les N premiers lots : une sous-requête LIMIT N par médicament (index
+      partiel medicine, expiry_date, id) borne les lots examinés ;
+    - sur ces candidats, le cumul des quantités (fonction de fenêtre, tri par
+      péremption puis id) ne garde que les lots effectivement entamés.
+
+    Args:
+        requested (dict): {medicine_id: quantité à sortir}
+        include_expired (bool): Prélever aussi les lots périmés (sorties manuelles,
+                                qui doivent garder les lots égaux au stock)
+
+    Returns:
+        tuple: (plan, manquants) où plan est la liste des tuples
+               (lot_id, medicine_id, quantité prélevée) et manquants le
+               dictionnaire {medicine_id: quantité non couverte par les lots}
+    """
+    if not requested:
+        return [], {}
+
+    needed = Case(
+        *[When(medicine_id=pk, then=Value(quantity)) for pk, quantity in requested.items()],
+        output_field=IntegerField(),
+    )
+    sellable = Q(quantity__gt=0)
+    if not include_expired:
+        sellable &= Q(expiry_date__gte=timezone.localdate())
+    candidates = Q()
+    for pk, quantity in requested.items():
+        candidates |= Q(pk__in=(
+            StockLot.objects.filter(sellable, medicine_id=pk)
+            .order_by('expiry_date', 'id')
+            .values('pk')[:quantity]
+        ))
+    lots = (
+        StockLot.objects.filter(candidates)
+        .annotate(running=Window(
+            Sum('quantity'),
+            partition_by=[F('medicine_id')],
+            order_by=[F('expiry_date').asc(), F('id').asc()],
+        ))
+        # Lots dont le cumul précédent ne couvre pas encore la demande
+        .filter(running__lt=F('quantity') + needed)
+        .order_by('medicine_id', 'expiry_date', 'id')
+        .values_list('pk', 'medicine_id', 'quantity', 'running')
+    )
+
+    plan, covered = [], defaultdict(int)
+    for lot_id, medicine_id, quantity, running in lots:
+        take = min(quantity, requested[medicine_id] - (running - quantity))
+        plan.append((lot_id, medicine_id, take))
+        covered[medicine_id] += take
+
+    missing = {
+        pk: quantity - covered[pk] for pk, quantity in requested.items() if covered[pk] < quantity
+    }
+    return plan, missing
+
+
+def consume_lots(plan):
+    """
+    Décrémente les lots du plan en un seul UPDATE
+
+    Doit être appelée dans la transaction qui verrouille les médicaments concernés.
+
+    Returns:
+        int: Nombre de lots modifiés
+    """
+    if not plan:
+        return 0
+    return StockLot.objects.filter(pk__in=[lot_id for lot_id, _, _ in plan]).update(
+        quantity=Case(
+            *[When(pk=lot_id, then=F('quantity') - take) for lot_id, _, take in plan],
+            default=F('quantity'),
+            output_field=PositiveIntegerField(),
+        )
+    )
+
+
+def add_lots(lots):
+    """
+    Crée des lots entrés en stock
+
+    Args:
+        lots (iterable): Tuples (medicine_id, numéro de lot, péremption, quantité)
+    """
+    return StockLot.objects.bulk_create(
+        [
+            StockLot(medicine_id=pk, lot_number=lot_number, expiry_date=expiry, quantity=quantity)
+            for pk, lot_number, expiry, quantity in lots
+        ],
+        batch_size=1000,
+    )
+
+
+def allocate_order_items(plan, order_items):
+    """Enregistre les prélèvements du plan FEFO pour les lignes de commande (bulk_create)"""
+    item_by_medicine = {item.medicine_id: item for item in order_items}
+    return StockLotAllocation.objects.bulk_create([
+        StockLotAllocation(lot_id=lot_id, order_item=item_by_medicine[medicine_id], quantity=take)
+        for lot_id, medicine_id, take in plan
+    ])
+
+
+def expired_allocations(item_ids, today):
+    """
+    Prélèvements des lignes de commande dans des lots périmés depuis
+
+    Ces unités ne retournent pas en stock à l'annulation (voir restore_order_items).
+
+    Returns:
+        list: Tuples (order_item_id, numéro de lot, péremption, quantité)
+    """
+    return list(
+        StockLotAllocation.objects.filter(order_item_id__in=item_ids, lot__expiry_date__lt=today)
+        .order_by('order_item_id', 'lot_id')
+        .values_list('order_item_id', 'lot__lot_number', 'lot__expiry_date', 'quantity')
+    )
+
+
+def restore_order_items(items, today):
+    """
+    Remet en stock les lignes de commande annulées, dans les lots d'origine
+
+    Les unités prélevées dans un lot périmé au jour `today` n'y retournent pas
+    (l'appelant les enregistre comme retirées, voir expired_allocations) : un
+    lot déjà retiré par sweep_expired_stock ne redevient pas vendable. Les lignes
+    sans allocation (commandes antérieures au suivi des lots) sont remises dans
+    un nouveau lot.
+
+    Args:
+        items (list): Tuples (order_item_id, medicine_id, quantité)
+        today (date): Date de référence de la péremption
+    """
+    allocations = list(
+        StockLotAllocation.objects.filter(order_item_id__in=[item_id for item_id, _, _ in items])
+        .values_list('order_item_id', 'lot_id', 'quantity', 'lot__expiry_date')
+    )
+    returned = defaultdict(int)
+    for _, lot_id, quantity, expiry in allocations:
+        if expiry >= today:
+            returned[lot_id] += quantity
+    if returned:
+        StockLot.objects.filter(pk__in=returned).update(
+            quantity=Case(
+                *[When(pk=lot_id, then=F('quantity') + quantity) for lot_id, quantity in returned.items()],
+                default=F('quantity'),
+                output_field=PositiveIntegerField(),
+            )
+        )
+
+    allocated = {item_id for item_id, _, _, _ in allocations}
+    unallocated = [item for item in items if item[0] not in allocated]
+    if unallocated:
+        expiry = dict(
+            Medicine.objects.filter(pk__in={medicine_id for _, medicine_id, _ in unallocated})
+            .values_list('pk', 'expiry_date')
+        )
+        add_lots([
+            (medicine_id, OPENING_LOT, expiry[medicine_id], quantity)
+            for _, medicine_id, quantity in unallocated
+        ])
@@ -0,0 +1,92 @@
+# inventory/management/commands/benchmark_fefo.py
+# Mesure du moteur d'allocation FEFO avec des milliers de lots par médicament
+# Les données de test sont créées dans une transaction annulée à la fin :
+# la base n'est pas modifiée (à lancer tout de même hors production)
+
+import datetime
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventory.lots import consume_lots, plan_fefo
+from inventory.models import StockLot
+from products.models import Category, Medicine
+
+
+class Rollback(Exception):
+    """Annule la transaction de mesure"""
+
+
+class Command(BaseCommand):
+    help = "Mesure le choix et le prélèvement des lots FEFO (milliers de lots par médicament)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lots', type=int, default=5000, help="Lots par médicament")
+        parser.add_argument('--medicines', type=int, default=3, help="Médicaments par commande")
+        parser.add_argument('--orders', type=int, default=200, help="Nombre d'allocations mesurées")
+        parser.add_argument('--quantity', type=int, default=40, help="Quantité demandée par médicament")
+        parser.add_argument('--seed', type=int, default=42, help="Graine du générateur aléatoire")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                self.run(rng, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rng, options):
+        lots_per_medicine = options['lots']
+        category = Category.objects.create(name=f"Benchmark FEFO {rng.random()}")
+        today = datetime.date.today()
+        medicines = Medicine.objects.bulk_create([
+            Medicine(
+                name=f"Benchmark FEFO {i}", description="Benchmark", category=category,
+                price=1, expiry_date=today, stock_quantity=0,
+            )
+            for i in range(options['medicines'])
+        ])
+        StockLot.objects.bulk_create(
+            [
+                StockLot(
+                    medicine=medicine,
+                    lot_number=f"B{n}",
+                    expiry_date=today + datetime.timedelta(days=rng.randint(30, 1500)),
+                    quantity=rng.randint(1, 20),
+                )
+                for medicine in medicines
+                for n in range(lots_per_medicine)
+            ],
+            batch_size=1000,
+        )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE inventory_stocklot")
+
+        requested = {medicine.pk: options['quantity'] for medicine in medicines}
+        timings, lots_touched = [], []
+        for _ in range(options['orders']):
+            started = time.perf_counter()
+            plan, missing = plan_fefo(requested)
+            consume_lots(plan)
+            timings.append((time.perf_counter() - started) * 1000)
+            lots_touched.append(len(plan))
+            if missing:
+                break
+
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(
+            f"{len(medicines)} médicament(s) x {lots_per_medicine} lots, "
+            f"{len(timings)} allocation(s) de {options['quantity']} unités par médicament "
+            f"({connection.vendor})"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Allocation + prélèvement : médiane {statistics.median(timings):.2f} ms, "
+            f"p95 {p95:.2f} ms, max {timings[-1]:.2f} ms ; "
+            f"{statistics.mean(lots_touched):.1f} lot(s) entamé(s) en moyenne"
+        ))
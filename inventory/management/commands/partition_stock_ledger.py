@@ -0,0 +1,125 @@
+# inventory/management/commands/partition_stock_ledger.py
+# Partitionnement mensuel du grand livre (inventory_stockmovement) sur PostgreSQL
+# Facultatif : sans partitionnement les index (medicine, created_at) et
+# (movement_type, created_at) suffisent. À planifier chaque mois pour créer les
+# partitions à venir ; --convert transforme une fois la table existante
+# (à lancer pendant une maintenance : la table est verrouillée le temps de la copie).
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+TABLE = 'inventory_stockmovement'
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def partition_sql(month):
+    """Création (idempotente) de la partition d'un mois"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {TABLE}_p{month:%Y%m} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00+00') TO ('{next_month(month):%Y-%m-%d} 00:00+00')"
+    )
+
+
+class Command(BaseCommand):
+    help = "Partitionne le grand livre du stock par mois (PostgreSQL uniquement)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', action='store_true',
+            help="Convertit la table existante en table partitionnée (copie des mouvements)",
+        )
+        parser.add_argument(
+            '--months-ahead', type=int, default=3, help="Partitions créées à l'avance",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help="Affiche le SQL sans l'exécuter",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Le partitionnement du grand livre nécessite PostgreSQL.")
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+            partitioned = cursor.fetchone()[0] == 'p'
+            if not partitioned and not options['convert']:
+                raise CommandError(
+                    "Le grand livre n'est pas partitionné : relancer avec --convert pour le convertir."
+                )
+
+            statements = [] if partitioned else self.conversion_sql(cursor)
+            first = datetime.date.today() if partitioned else self.first_month(cursor)
+            month, last = month_start(first), month_start(datetime.date.today())
+            for _ in range(options['months_ahead']):
+                last = next_month(last)
+            months = []
+            while month <= last:
+                months.append(month)
+                month = next_month(month)
+
+            # Les partitions sont créées avant la copie des mouvements
+            position = statements.index('-- copie') if statements else 0
+            statements[position:position] = [partition_sql(month) for month in months]
+            statements = [sql for sql in statements if not sql.startswith('--')]
+
+            if options['dry_run']:
+                self.stdout.write(";\n".join(statements) + ";")
+                return
+            with transaction.atomic():
+                for sql in statements:
+                    cursor.execute(sql)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Grand livre {'converti et ' if not partitioned else ''}partitionné : "
+            f"{len(months)} partition(s) mensuelle(s) jusqu'à {last:%m/%Y}."
+        ))
+
+    def first_month(self, cursor):
+        cursor.execute(f"SELECT MIN(created_at) FROM {TABLE}")
+        oldest = cursor.fetchone()[0]
+        return oldest.date() if oldest else datetime.date.today()
+
+    def conversion_sql(self, cursor):
+        """
+        SQL de conversion : la clé primaire devient (id, created_at) comme l'exige
+        PostgreSQL, index et clés étrangères sont recréés sous les mêmes noms
+        (migrations Django inchangées), l'id garde une séquence propre
+        """
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [TABLE, f'{TABLE}_pkey'],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+
+        return [
+            *[f"DROP INDEX {name}" for name, _ in indexes],
+            *[f"ALTER TABLE {TABLE} DROP CONSTRAINT {name}" for name, _ in foreign_keys],
+            f"ALTER TABLE {TABLE} RENAME TO {TABLE}_legacy",
+            f"ALTER TABLE {TABLE}_legacy RENAME CONSTRAINT {TABLE}_pkey TO {TABLE}_legacy_pkey",
+            f"CREATE TABLE {TABLE} (LIKE {TABLE}_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)",
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, created_at)",
+            f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id",
+            f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')",
+            f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT",
+            '-- copie',
+            f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_legacy",
+            f"SELECT setval('{TABLE}_id_seq', COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)",
+            f"DROP TABLE {TABLE}_legacy",
+            *[definition for _, definition in indexes],
+            *[f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}" for name, definition in foreign_keys],
+        ]
@@ -0,0 +1,39 @@
+# inventory/management/commands/receive_delivery.py
+# Réception d'une livraison fournisseur depuis un fichier CSV/XLSX (tout ou rien)
+# Exemple : python manage.py receive_delivery livraison.csv --user pharmacien --reference BL-2024-118
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.receiving import ReceivingError, parse_delivery, receive_delivery
+
+
+class Command(BaseCommand):
+    help = "Réceptionne une livraison fournisseur (médicament, quantité, lot, péremption)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier CSV ou XLSX de la livraison")
+        parser.add_argument('--user', required=True, help="Nom d'utilisateur du réceptionnaire")
+        parser.add_argument('--reference', default='', help="Référence du bon de livraison")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur inconnu : {options['user']}")
+
+        try:
+            with open(options['path'], 'rb') as file:
+                lines = parse_delivery(file, options['path'])
+                report = receive_delivery(lines, user, options['reference'])
+        except OSError as e:
+            raise CommandError(str(e))
+        except ReceivingError as e:
+            for line, message in e.errors:
+                self.stderr.write(f"Ligne {line} : {message}")
+            raise CommandError(f"{e} ; aucune modification enregistrée.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.lines} ligne(s) réceptionnée(s) pour {report.medicines} médicament(s), "
+            f"{report.units} unité(s) en {report.elapsed:.2f} s ({report.rows_per_second:.0f} lignes/s)."
+        ))
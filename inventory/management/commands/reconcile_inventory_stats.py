@@ -0,0 +1,33 @@
+# inventory/management/commands/reconcile_inventory_stats.py
+# Commande à planifier (cron, ex: chaque nuit) pour recalculer entièrement
+# les statistiques du tableau de bord de l'inventaire et l'agrégat des ventes récentes
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.sales import SALES_WINDOWS, rebuild_daily_sales
+from inventory.stats import reconcile_inventory_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques du stock à partir des médicaments et des mouvements"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sales-days', type=int, default=max(SALES_WINDOWS),
+            help="Nombre de jours de ventes journalières recalculés (0 : tout l'historique)",
+        )
+
+    def handle(self, *args, **options):
+        stats = reconcile_inventory_stats()
+
+        days = options['sales_days']
+        since = timezone.localdate() - datetime.timedelta(days=days - 1) if days else None
+        rows = rebuild_daily_sales(since)
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistiques recalculées : {stats.total_medicines} médicament(s), "
+            f"{stats.low_stock_count} en stock faible, {stats.out_of_stock_count} en rupture, "
+            f"{rows} ligne(s) de ventes journalières."
+        ))
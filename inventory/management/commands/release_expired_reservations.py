@@ -0,0 +1,14 @@
+# inventory/management/commands/release_expired_reservations.py
+# Commande à planifier (cron) pour libérer les réservations de stock expirées
+
+from django.core.management.base import BaseCommand
+
+from inventory.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Libère en masse les réservations de stock des paniers expirées"
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f"{released} réservation(s) expirée(s) libérée(s)."))
@@ -0,0 +1,37 @@
+# inventory/management/commands/stress_stock.py
+# Stress du stock : commandes (vue checkout) et update_stock simultanés sur les mêmes
+# médicaments, puis contrôle des invariants (pas de survente, pas de mise à jour perdue,
+# grand livre = solde). À relancer après toute optimisation du chemin du stock.
+# S'exécute dans une base de test créée puis détruite (voir pharmacy_online/benchmark.py) ;
+# sous SQLite (fichier en mode WAL) les écritures refusées pour verrou sont relancées.
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pharmacy_online.benchmark import benchmark_database, stock_stress
+
+
+class Command(BaseCommand):
+    help = "Commandes et mouvements de stock concurrents, puis contrôle de la cohérence du stock"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Clients simultanés")
+        parser.add_argument('--operations', type=int, default=50, help="Opérations par client")
+        parser.add_argument('--medicines', type=int, default=3, help="Médicaments disputés")
+        parser.add_argument('--stock', type=int, default=30, help="Stock initial par médicament")
+        parser.add_argument('--seed', type=int, default=42, help="Graine du générateur aléatoire")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            result = stock_stress(
+                threads=options['threads'], operations=options['operations'],
+                medicines=options['medicines'], stock=options['stock'], seed=options['seed'],
+            )
+        self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+        if result['violations']:
+            raise CommandError(f"{len(result['violations'])} invariant(s) du stock violé(s).")
+        self.stderr.write(self.style.SUCCESS(
+            f"Stock cohérent : {result['checkouts']} commande(s), "
+            f"{result['checkouts_per_second']} commande(s)/s, {result['lock_retries']} attente(s) de verrou."
+        ))
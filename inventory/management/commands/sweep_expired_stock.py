@@ -0,0 +1,57 @@
+# inventory/management/commands/sweep_expired_stock.py
+# Commande à planifier chaque nuit (cron) : retrait des lots périmés et
+# rapport des lots qui périment dans les prochains jours
+# Exemple : python manage.py sweep_expired_stock --user pharmacien --report-days 30
+
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.expiry import SWEEP_BATCH_SIZE, expiring_lots, sweep_expired_stock
+
+
+class Command(BaseCommand):
+    help = "Retire du stock les lots périmés et liste les lots qui périment bientôt"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help="Nom d'utilisateur auteur des sorties de stock")
+        parser.add_argument(
+            '--withdraw-days', type=int, default=0,
+            help="Retirer aussi les lots qui périment dans ce nombre de jours (défaut : 0)",
+        )
+        parser.add_argument(
+            '--report-days', type=int, default=30,
+            help="Lister les lots qui périment dans ce nombre de jours (0 : pas de rapport)",
+        )
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE,
+                            help="Médicaments traités par transaction")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur inconnu : {options['user']}")
+
+        def progress(report):
+            sys.stderr.write(f"\r{report.medicines} médicament(s), {report.lots} lot(s) retiré(s)")
+            sys.stderr.flush()
+
+        report = sweep_expired_stock(
+            user, options['withdraw_days'], options['batch_size'], progress=progress
+        )
+        if report.medicines:
+            sys.stderr.write('\n')
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.lots} lot(s) retiré(s) ({report.units} unité(s)) pour {report.medicines} "
+            f"médicament(s), dont {report.out_of_stock} passé(s) en rupture, en {report.elapsed:.2f} s."
+        ))
+
+        if options['report_days']:
+            lots = expiring_lots(options['report_days'])
+            self.stdout.write(f"Lots périmant dans les {options['report_days']} prochains jours :")
+            for lot in lots.iterator(chunk_size=1000):
+                self.stdout.write(
+                    f"  {lot.expiry_date:%d/%m/%Y}  {lot.medicine.name}  "
+                    f"lot {lot.lot_number or '-'}  {lot.quantity} unité(s)"
+                )
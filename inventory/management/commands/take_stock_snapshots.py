@@ -0,0 +1,39 @@
+# inventory/management/commands/take_stock_snapshots.py
+# Commande à planifier (cron, ex: chaque nuit) : instantané du solde de chaque
+# médicament d'après le grand livre, rapprochement avec le stock affiché
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.ledger import ledger_discrepancies, prune_stock_snapshots, take_stock_snapshots
+
+
+class Command(BaseCommand):
+    help = "Enregistre un instantané du stock par médicament et signale les écarts avec le grand livre"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days', type=int, default=0,
+            help="Supprime les instantanés plus anciens (le dernier de chaque médicament est gardé ; 0 : aucun)",
+        )
+        parser.add_argument(
+            '--show', type=int, default=20, help="Nombre maximum d'écarts affichés",
+        )
+
+    def handle(self, *args, **options):
+        discrepancies = ledger_discrepancies().order_by('pk')
+        count = discrepancies.count()
+        for medicine in discrepancies[:options['show']]:
+            self.stdout.write(self.style.WARNING(
+                f"Écart : {medicine.name} (#{medicine.pk}) stock {medicine.stock_quantity}, "
+                f"grand livre {medicine.ledger_balance}"
+            ))
+
+        created = take_stock_snapshots()
+        message = f"{created} instantané(s) enregistré(s), {count} écart(s) avec le grand livre"
+        if options['keep_days']:
+            before = timezone.now() - datetime.timedelta(days=options['keep_days'])
+            message += f", {prune_stock_snapshots(before)} ancien(s) instantané(s) supprimé(s)"
+        self.stdout.write(self.style.SUCCESS(message + "."))
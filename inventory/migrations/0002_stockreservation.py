@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+        ('orders', '0001_initial'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='orders.cart')),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='products.medicine')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['medicine', 'expires_at'], name='inventory_s_medicin_282ed9_idx')],
+                'unique_together': {('cart', 'medicine')},
+            },
+        ),
+    ]
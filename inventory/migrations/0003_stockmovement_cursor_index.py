@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['created_at', 'id'], name='inventory_s_created_36aee8_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:28
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+import django.db.models.deletion
+
+
+def initial_stats(apps, schema_editor):
+    # Première ligne de statistiques, calculée sur les données existantes ;
+    # elle est ensuite tenue à jour par incréments (inventory/stats.py)
+    Medicine = apps.get_model('products', 'Medicine')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    InventoryStats = apps.get_model('inventory', 'InventoryStats')
+    MedicineSales = apps.get_model('inventory', 'MedicineSales')
+
+    totals = Medicine.objects.aggregate(
+        total=Count('id'),
+        low=Count('id', filter=Q(stock_quantity__lte=F('minimum_stock'))),
+        out=Count('id', filter=Q(stock_quantity=0)),
+        value=Sum(F('stock_quantity') * F('price')),
+    )
+    InventoryStats.objects.create(
+        pk=1,
+        total_medicines=totals['total'],
+        low_stock_count=totals['low'],
+        out_of_stock_count=totals['out'],
+        total_stock_value=totals['value'] or Decimal(0),
+    )
+    sold = (
+        StockMovement.objects.filter(movement_type='out')
+        .values_list('medicine')
+        .annotate(total=Sum('quantity'))
+    )
+    MedicineSales.objects.bulk_create(
+        [MedicineSales(medicine_id=pk, sold_quantity=total) for pk, total in sold if total > 0],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_medicine_cursor_index'),
+        ('inventory', '0003_stockmovement_cursor_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_medicines', models.IntegerField(default=0)),
+                ('low_stock_count', models.IntegerField(default=0)),
+                ('out_of_stock_count', models.IntegerField(default=0)),
+                ('total_stock_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Inventory stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='MedicineSales',
+            fields=[
+                ('medicine', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='products.medicine')),
+                ('sold_quantity', models.PositiveIntegerField(db_index=True, default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Medicine sales',
+            },
+        ),
+        migrations.RunPython(initial_stats, migrations.RunPython.noop),
+    ]
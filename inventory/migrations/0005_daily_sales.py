@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:29
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_daily_sales(apps, schema_editor):
+    # Agrégat initial calculé sur l'historique des mouvements de sortie
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    DailySales = apps.get_model('inventory', 'DailySales')
+    totals = (
+        StockMovement.objects.filter(movement_type='out')
+        .annotate(day=TruncDate('created_at'))
+        .values_list('medicine', 'day')
+        .annotate(total=Sum('quantity'))
+    )
+    DailySales.objects.bulk_create(
+        [DailySales(medicine_id=pk, date=day, quantity=total)
+         for pk, day, total in totals if total > 0],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_medicine_cursor_index'),
+        ('inventory', '0004_inventory_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.medicine')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+                'indexes': [models.Index(fields=['date', 'medicine', 'quantity'], name='inventory_d_date_436062_idx')],
+                'unique_together': {('medicine', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_sales, migrations.RunPython.noop),
+    ]
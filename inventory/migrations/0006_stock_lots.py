@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_opening_lots(apps, schema_editor):
+    # Un lot initial par médicament en stock : la somme des lots égale le stock
+    Medicine = apps.get_model('products', 'Medicine')
+    StockLot = apps.get_model('inventory', 'StockLot')
+    StockLot.objects.bulk_create(
+        [
+            StockLot(medicine_id=pk, lot_number='INITIAL', expiry_date=expiry, quantity=stock)
+            for pk, stock, expiry in Medicine.objects.filter(stock_quantity__gt=0)
+            .values_list('pk', 'stock_quantity', 'expiry_date').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_orderstatuschange'),
+        ('products', '0004_medicine_stock_status'),
+        ('inventory', '0005_daily_sales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lot_number', models.CharField(blank=True, max_length=50)),
+                ('expiry_date', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='products.medicine')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockLotAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='inventory.stocklot')),
+                ('order_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lot_allocations', to='orders.orderitem')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stocklot',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['medicine', 'expiry_date', 'id'], name='inventory_lot_fefo_idx'),
+        ),
+        migrations.RunPython(create_opening_lots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_stock_lots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocklot',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['expiry_date', 'medicine'], name='inventory_lot_expiry_idx'),
+        ),
+    ]
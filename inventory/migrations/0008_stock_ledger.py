@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def create_opening_snapshots(apps, schema_editor):
+    # Le stock initial des médicaments n'a pas de mouvement : un premier
+    # instantané par médicament sert de point de départ au grand livre
+    Medicine = apps.get_model('products', 'Medicine')
+    StockSnapshot = apps.get_model('inventory', 'StockSnapshot')
+    now = timezone.now()
+    StockSnapshot.objects.bulk_create(
+        [
+            StockSnapshot(medicine_id=pk, taken_at=now, quantity=stock)
+            for pk, stock in Medicine.objects.values_list('pk', 'stock_quantity').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_medicine_expiry_index'),
+        ('inventory', '0007_stocklot_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('quantity', models.IntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['medicine', 'created_at'], name='inventory_mvt_medicine_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['movement_type', 'created_at'], name='inventory_mvt_type_idx'),
+        ),
+        # Nouvel index créé avant la suppression de l'index de la clé étrangère
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='medicine',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products.medicine'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='medicine',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.medicine'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stocksnapshot',
+            unique_together={('medicine', 'taken_at')},
+        ),
+        migrations.RunPython(create_opening_snapshots, migrations.RunPython.noop),
+    ]
@@ -20,19 +20,204 @@ from django.contrib.auth.models import User
 
 
 class StockMovement(models.Model):
+    """
+    Grand livre du stock : un mouvement n'est jamais modifié ni supprimé
+
+    Variation signée du stock : +quantity pour 'in', -quantity pour 'out',
+    quantity (déjà signée) pour 'adjustment'. Le solde à une date se calcule à
+    partir du dernier instantané StockSnapshot (voir inventory/ledger.py).
+    """
+
     MOVEMENT_TYPES = [
         ('in', 'Entrée'),
         ('out', 'Sortie'),
         ('adjustment', 'Ajustement'),
     ]
 
-    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='stock_movements')
+    # Début du motif des sorties de lots périmés (exclues des quantités vendues)
+    EXPIRED_REASON = "Périmé"
+
+    # Pas d'index propre à la clé étrangère : couverte par l'index (medicine, created_at)
+    medicine = models.ForeignKey(
+        Medicine, on_delete=models.CASCADE, related_name='stock_movements', db_index=False
+    )
     movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPES)
     quantity = models.IntegerField()
     reason = models.CharField(max_length=200)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Pagination par curseur de l'historique (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+            # Historique d'un médicament et solde depuis le dernier instantané
+            models.Index(fields=['medicine', 'created_at'], name='inventory_mvt_medicine_idx'),
+            # Sorties (ventes) ou entrées sur une période
+            models.Index(fields=['movement_type', 'created_at'], name='inventory_mvt_type_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Un mouvement de stock enregistré ne peut pas être modifié")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Un mouvement de stock ne peut pas être supprimé")
+
     def __str__(self):
         return f"{self.movement_type} - {self.medicine.name} ({self.quantity})"
+
+
+class StockReservation(models.Model):
+    """
+    Réservation temporaire de stock pour un panier
+
+    Le stock réservé par les autres paniers n'est plus proposé à la vente tant
+    que la réservation n'a pas expiré (voir inventory/reservations.py)
+    """
+
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='reservations')
+    cart = models.ForeignKey('orders.Cart', on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['cart', 'medicine']
+        indexes = [
+            # Somme des réservations actives d'un médicament (stock disponible)
+            models.Index(fields=['medicine', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"Réservation {self.medicine.name} ({self.quantity}) jusqu'à {self.expires_at}"
+
+
+class InventoryStats(models.Model):
+    """
+    Statistiques globales du stock, tenues à jour au fil des mouvements
+
+    Une seule ligne (pk=1), mise à jour par incréments (voir inventory/stats.py)
+    et recalculée périodiquement par la commande reconcile_inventory_stats
+    """
+
+    total_medicines = models.IntegerField(default=0)
+    low_stock_count = models.IntegerField(default=0)
+    out_of_stock_count = models.IntegerField(default=0)
+    total_stock_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Inventory stats"
+
+    def __str__(self):
+        return f"Statistiques du stock ({self.total_medicines} médicaments)"
+
+
+class MedicineSales(models.Model):
+    """Quantité totale sortie du stock par médicament (mouvements 'out' hors péremptions)"""
+
+    medicine = models.OneToOneField(
+        Medicine, on_delete=models.CASCADE, primary_key=True, related_name='sales'
+    )
+    sold_quantity = models.PositiveIntegerField(default=0, db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Medicine sales"
+
+    def __str__(self):
+        return f"{self.medicine.name} : {self.sold_quantity} vendu(s)"
+
+
+class DailySales(models.Model):
+    """
+    Quantité sortie du stock par médicament et par jour (mouvements 'out' hors péremptions)
+
+    Alimentée par incréments (voir inventory/sales.py) ; sert aux classements des
+    meilleures ventes sur 7, 30 ou 90 jours sans parcourir l'historique des mouvements
+    """
+
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily sales"
+        unique_together = ['medicine', 'date']
+        indexes = [
+            # Classement sur une fenêtre de dates : parcours de l'index seul
+            models.Index(fields=['date', 'medicine', 'quantity']),
+        ]
+
+    def __str__(self):
+        return f"{self.medicine.name} le {self.date} : {self.quantity}"
+
+
+class StockLot(models.Model):
+    """
+    Lot d'un médicament (numéro de lot, date de péremption, quantité restante)
+
+    Medicine.stock_quantity est la somme des quantités des lots et
+    Medicine.expiry_date la péremption du premier lot non vide (voir inventory/lots.py)
+    """
+
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='lots')
+    lot_number = models.CharField(max_length=50, blank=True)
+    expiry_date = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Allocation FEFO : lots non vides d'un médicament, par péremption
+            models.Index(
+                fields=['medicine', 'expiry_date', 'id'],
+                condition=models.Q(quantity__gt=0),
+                name='inventory_lot_fefo_idx',
+            ),
+            # Retrait des lots périmés et rapport des péremptions proches
+            models.Index(
+                fields=['expiry_date', 'medicine'],
+                condition=models.Q(quantity__gt=0),
+                name='inventory_lot_expiry_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.medicine.name} lot {self.lot_number or '-'} ({self.quantity}, exp. {self.expiry_date})"
+
+
+class StockSnapshot(models.Model):
+    """
+    Solde d'un médicament à un instant donné, d'après le grand livre
+
+    Pris périodiquement (commande take_stock_snapshots) : le stock à une date
+    est le dernier instantané antérieur plus les mouvements qui le suivent.
+    """
+
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='stock_snapshots')
+    taken_at = models.DateTimeField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        # L'index unique (medicine, taken_at) sert aussi à trouver le dernier instantané
+        unique_together = ['medicine', 'taken_at']
+
+    def __str__(self):
+        return f"{self.medicine.name} au {self.taken_at:%d/%m/%Y %H:%M} : {self.quantity}"
+
+
+class StockLotAllocation(models.Model):
+    """Quantité prélevée sur un lot pour une ligne de commande (traçabilité, annulation)"""
+
+    lot = models.ForeignKey(StockLot, on_delete=models.CASCADE, related_name='allocations')
+    order_item = models.ForeignKey(
+        'orders.OrderItem', on_delete=models.CASCADE, related_name='lot_allocations'
+    )
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.quantity} du lot {self.lot_id} pour la ligne {self.order_item_id}"
 >>>>>>> develop
@@ -0,0 +1,302 @@
+# inventory/receiving.py
+# Réception en masse des livraisons fournisseurs à partir d'un fichier CSV ou XLSX
+# Chaque ligne crée un lot (numéro, péremption) du médicament
+# Tout le fichier est validé avant la moindre écriture, puis appliqué en une seule
+# transaction (tout ou rien) avec un UPDATE groupé et des mouvements en bulk_create
+
+import csv
+import datetime
+import io
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Max, Q
+
+from products.models import Medicine
+from .lots import add_lots
+from .models import StockLot, StockMovement
+from .utils import increase_stock
+
+# Noms de colonnes acceptés dans l'en-tête du fichier (casse ignorée)
+COLUMN_ALIASES = {
+    'medicine': {'medicine', 'medicament', 'médicament', 'id', 'nom', 'name'},
+    'quantity': {'quantity', 'quantite', 'quantité', 'qte', 'qté'},
+    'lot': {'lot', 'batch', 'numero de lot', 'numéro de lot'},
+    'expiry': {'expiry', 'expiry_date', 'peremption', 'péremption', 'date de peremption',
+               'date de péremption'},
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y')
+
+
+class ReceivingError(Exception):
+    """
+    Levée quand le fichier de livraison contient des erreurs ; rien n'est modifié
+
+    L'attribut `errors` contient la liste des tuples (numéro de ligne, message)
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} erreur(s) dans le fichier de livraison")
+
+
+class DeliveryLine:
+    """Ligne d'un fichier de livraison (médicament résolu par resolve_medicines)"""
+
+    def __init__(self, line, medicine_ref, quantity, lot='', expiry=None):
+        self.line = line
+        self.medicine_ref = medicine_ref
+        self.quantity = quantity
+        self.lot = lot
+        self.expiry = expiry
+        self.medicine = None
+
+
+class ReceivingReport:
+    """Résultat d'une réception : volumes traités et débit"""
+
+    def __init__(self, lines, medicines, units, elapsed):
+        self.lines = lines
+        self.medicines = medicines
+        self.units = units
+        self.elapsed = elapsed
+
+    @property
+    def rows_per_second(self):
+        return self.lines / self.elapsed if self.elapsed else float(self.lines)
+
+
+# ===== LECTURE DU FICHIER =====
+
+def _iter_csv_rows(file):
+    """Lit un CSV ligne par ligne (séparateur ';', ',' ou tabulation détecté)"""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+    text.detach()
+
+
+def _iter_xlsx_rows(file):
+    """Lit la première feuille d'un classeur XLSX en mode lecture seule (flux)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ReceivingError([(0, "La lecture des fichiers XLSX nécessite le paquet openpyxl.")])
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ['' if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def _column_indexes(header):
+    """Position de chaque colonne attendue dans l'en-tête"""
+    normalized = [str(name).strip().lower() for name in header]
+    indexes = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for i, name in enumerate(normalized):
+            if name in aliases:
+                indexes[column] = i
+                break
+    return indexes
+
+
+def _parse_quantity(value):
+    """Quantité entière strictement positive (les cellules XLSX numériques sont des float)"""
+    try:
+        quantity = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(value)
+    if quantity <= 0 or quantity != quantity.to_integral_value():
+        raise ValueError(value)
+    return int(quantity)
+
+
+def _parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(str(value).strip(), date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(value)
+
+
+def parse_delivery(file, filename=''):
+    """
+    Lit et valide le format d'un fichier de livraison, ligne par ligne
+
+    Colonnes : médicament (id ou nom exact), quantité, lot (optionnel),
+    date de péremption (optionnelle). La première ligne est l'en-tête.
+
+    Args:
+        file: Fichier binaire ouvert (upload Django ou fichier local)
+        filename (str): Nom du fichier, l'extension .xlsx sélectionne le lecteur XLSX
+
+    Returns:
+        list: Lignes (DeliveryLine), médicaments non encore résolus
+
+    Raises:
+        ReceivingError: Si au moins une ligne est invalide
+    """
+    rows = _iter_xlsx_rows(file) if filename.lower().endswith('.xlsx') else _iter_csv_rows(file)
+
+    header = next(rows, None)
+    indexes = _column_indexes(header or [])
+    missing = [column for column in ('medicine', 'quantity') if column not in indexes]
+    if missing:
+        raise ReceivingError([(1, f"Colonne(s) manquante(s) dans l'en-tête : {', '.join(missing)}")])
+
+    def cell(row, column):
+        i = indexes.get(column)
+        return row[i] if i is not None and i < len(row) else ''
+
+    lines, errors = [], []
+    for number, row in enumerate(rows, start=2):
+        if not any(str(value).strip() for value in row):
+            continue
+        medicine_ref = cell(row, 'medicine')
+        if isinstance(medicine_ref, float) and medicine_ref.is_integer():
+            medicine_ref = int(medicine_ref)
+        medicine_ref = str(medicine_ref).strip()
+        try:
+            quantity = _parse_quantity(cell(row, 'quantity'))
+        except ValueError:
+            errors.append((number, f"Quantité invalide : {cell(row, 'quantity')!r}"))
+            continue
+        expiry = None
+        if str(cell(row, 'expiry')).strip():
+            try:
+                expiry = _parse_date(cell(row, 'expiry'))
+            except ValueError:
+                errors.append((number, f"Date de péremption invalide : {cell(row, 'expiry')!r}"))
+                continue
+        if not medicine_ref:
+            errors.append((number, "Médicament manquant"))
+            continue
+        lines.append(DeliveryLine(number, medicine_ref, quantity, str(cell(row, 'lot')).strip(), expiry))
+
+    if errors:
+        raise ReceivingError(errors)
+    if not lines:
+        raise ReceivingError([(1, "Le fichier ne contient aucune ligne de livraison")])
+    return lines
+
+
+# ===== VALIDATION ET APPLICATION =====
+
+def resolve_medicines(lines):
+    """
+    Associe chaque ligne à son médicament, en une seule requête
+
+    Raises:
+        ReceivingError: Médicament introuvable ou nom ambigu
+    """
+    ids = {line.medicine_ref for line in lines if line.medicine_ref.isdigit()}
+    names = {line.medicine_ref for line in lines if not line.medicine_ref.isdigit()}
+    found = Medicine.objects.filter(Q(pk__in=ids) | Q(name__in=names)).only('id', 'name', 'expiry_date')
+    by_id, by_name = {}, defaultdict(list)
+    for medicine in found:
+        by_id[str(medicine.pk)] = medicine
+        by_name[medicine.name].append(medicine)
+
+    errors = []
+    for line in lines:
+        if line.medicine_ref.isdigit():
+            line.medicine = by_id.get(line.medicine_ref)
+        elif len(by_name.get(line.medicine_ref, [])) == 1:
+            line.medicine = by_name[line.medicine_ref][0]
+        elif by_name.get(line.medicine_ref):
+            errors.append((line.line, f"Nom ambigu, utiliser l'identifiant : {line.medicine_ref}"))
+            continue
+        if line.medicine is None:
+            errors.append((line.line, f"Médicament introuvable : {line.medicine_ref}"))
+    if errors:
+        raise ReceivingError(errors)
+    return lines
+
+
+def movement_reason(reference, line):
+    """Motif du mouvement d'entrée (référence de livraison, lot et péremption)"""
+    reason = f"Livraison {reference}" if reference else "Livraison fournisseur"
+    if line.lot:
+        reason += f" - lot {line.lot}"
+    if line.expiry:
+        reason += f" - exp. {line.expiry:%d/%m/%Y}"
+    return reason[:200]
+
+
+def receive_delivery(lines, user, reference=''):
+    """
+    Applique une livraison validée, en une seule transaction
+
+    Nombre de requêtes constant quel que soit le nombre de lignes : un lot et
+    un mouvement d'entrée par ligne insérés avec bulk_create, un UPDATE groupé
+    du stock (voir increase_stock). Sans date de péremption, le lot reprend
+    celle du lot le plus récent du médicament, comme dans update_stock : celle
+    du médicament est la plus proche et peut être déjà passée.
+
+    Args:
+        lines (list): Lignes issues de parse_delivery
+        user (User): Membre du personnel qui réceptionne
+        reference (str): Référence du bon de livraison (optionnel)
+
+    Returns:
+        ReceivingReport: Volumes traités et durée
+
+    Raises:
+        ReceivingError: Si un médicament est introuvable ; rien n'est modifié
+    """
+    started = time.perf_counter()
+    resolve_medicines(lines)
+
+    totals = defaultdict(int)
+    for line in lines:
+        totals[line.medicine.pk] += line.quantity
+
+    with transaction.atomic():
+        latest = dict(
+            StockLot.objects.filter(medicine_id__in=totals)
+            .values_list('medicine')
+            .annotate(latest=Max('expiry_date'))
+        )
+        increase_stock(totals, lambda: add_lots([
+            (
+                line.medicine.pk, line.lot,
+                line.expiry or latest.get(line.medicine.pk) or line.medicine.expiry_date,
+                line.quantity,
+            )
+            for line in lines
+        ]))
+        StockMovement.objects.bulk_create(
+            [
+                StockMovement(
+                    medicine=line.medicine,
+                    movement_type='in',
+                    quantity=line.quantity,
+                    reason=movement_reason(reference, line),
+                    created_by=user,
+                )
+                for line in lines
+            ],
+            batch_size=1000,
+        )
+
+    return ReceivingReport(
+        lines=len(lines),
+        medicines=len(totals),
+        units=sum(totals.values()),
+        elapsed=time.perf_counter() - started,
+    )
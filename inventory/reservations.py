@@ -0,0 +1,116 @@
+# inventory/reservations.py
+# Réservations temporaires de stock pour les paniers
+# Le stock disponible à la vente = stock physique - réservations actives des autres paniers
+
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from products.models import Medicine
+from .models import StockReservation
+
+
+def reservation_ttl():
+    """Durée de vie d'une réservation (paramètre STOCK_RESERVATION_TTL_MINUTES)"""
+    return datetime.timedelta(minutes=getattr(settings, 'STOCK_RESERVATION_TTL_MINUTES', 15))
+
+
+def active_reservations(exclude_cart=None):
+    """
+    Retourne les réservations non expirées
+
+    Args:
+        exclude_cart (Cart): Panier dont les réservations sont ignorées (optionnel)
+
+    Returns:
+        QuerySet: Réservations actives
+    """
+    reservations = StockReservation.objects.filter(expires_at__gt=timezone.now())
+    if exclude_cart is not None:
+        reservations = reservations.exclude(cart=exclude_cart)
+    return reservations
+
+
+def reserved_quantities(medicine_ids, exclude_cart=None):
+    """
+    Quantités réservées par médicament, en une seule requête agrégée
+
+    Returns:
+        dict: {medicine_id: quantité réservée}
+    """
+    rows = (
+        active_reservations(exclude_cart)
+        .filter(medicine_id__in=medicine_ids)
+        .values('medicine_id')
+        .annotate(reserved=Sum('quantity'))
+    )
+    return {row['medicine_id']: row['reserved'] for row in rows}
+
+
+def available_to_promise(medicine, exclude_cart=None):
+    """
+    Stock qui peut encore être promis à un client
+
+    Args:
+        medicine (Medicine): Médicament concerné
+        exclude_cart (Cart): Panier dont la propre réservation ne compte pas
+
+    Returns:
+        int: Stock physique moins les réservations actives (minimum 0)
+    """
+    reserved = reserved_quantities([medicine.pk], exclude_cart).get(medicine.pk, 0)
+    return max(0, medicine.stock_quantity - reserved)
+
+
+def hold_stock(cart, medicine, quantity):
+    """
+    Fixe la réservation du panier pour un médicament à `quantity` unités
+
+    La ligne du médicament est verrouillée pendant le contrôle pour que deux
+    paniers ne puissent pas réserver les mêmes dernières unités.
+
+    Args:
+        cart (Cart): Panier qui réserve
+        medicine (Medicine): Médicament réservé
+        quantity (int): Quantité totale souhaitée dans le panier
+
+    Returns:
+        bool: True si la réservation est accordée, False si le stock disponible est insuffisant
+    """
+    with transaction.atomic():
+        medicine = Medicine.objects.select_for_update().get(pk=medicine.pk)
+        if quantity > available_to_promise(medicine, exclude_cart=cart):
+            return False
+
+        StockReservation.objects.update_or_create(
+            cart=cart,
+            medicine=medicine,
+            defaults={
+                'quantity': quantity,
+                'expires_at': timezone.now() + reservation_ttl(),
+            },
+        )
+        # Toute activité sur le panier prolonge l'ensemble de ses réservations
+        StockReservation.objects.filter(cart=cart).update(
+            expires_at=timezone.now() + reservation_ttl()
+        )
+    return True
+
+
+def release_hold(cart, medicine):
+    """Libère la réservation d'un médicament pour un panier"""
+    StockReservation.objects.filter(cart=cart, medicine=medicine).delete()
+
+
+def release_expired_reservations():
+    """
+    Supprime en masse toutes les réservations expirées
+
+    Returns:
+        int: Nombre de réservations supprimées
+    """
+    deleted, _ = StockReservation.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
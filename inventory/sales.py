@@ -0,0 +1,102 @@
+# inventory/sales.py
+# Agrégat journalier des ventes par médicament (table DailySales)
+# Les classements des meilleures ventes (7, 30 ou 90 jours) lisent cet agrégat
+# en une seule requête indexée au lieu de joindre tout l'historique des mouvements
+
+import datetime
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from products.models import Medicine
+from .models import DailySales, StockMovement
+
+# Fenêtres de classement proposées sur le tableau de bord (en jours)
+SALES_WINDOWS = (7, 30, 90)
+
+
+def add_daily_sales(quantities, date):
+    """
+    Ajoute des quantités vendues à l'agrégat du jour `date`
+
+    Deux requêtes quel que soit le nombre de médicaments : création des lignes
+    manquantes puis incrément F() de toutes les lignes en un UPDATE.
+
+    Args:
+        quantities (dict): {medicine_id: quantité sortie}
+        date (date): Jour de la vente (date locale)
+    """
+    with transaction.atomic():
+        DailySales.objects.bulk_create(
+            [DailySales(medicine_id=pk, date=date) for pk in quantities], ignore_conflicts=True
+        )
+        DailySales.objects.filter(date=date, medicine_id__in=quantities).update(
+            quantity=Case(
+                *[When(medicine_id=pk, then=F('quantity') + quantity)
+                  for pk, quantity in quantities.items()],
+                default=F('quantity'),
+                output_field=PositiveIntegerField(),
+            )
+        )
+
+
+def rebuild_daily_sales(since=None):
+    """
+    Recalcule l'agrégat à partir des mouvements de sortie
+
+    Args:
+        since (date): Premier jour recalculé (défaut : tout l'historique)
+
+    Returns:
+        int: Nombre de lignes (médicament, jour) écrites
+    """
+    movements = StockMovement.objects.filter(movement_type='out').exclude(
+        reason__startswith=StockMovement.EXPIRED_REASON
+    )
+    rows = DailySales.objects.all()
+    if since:
+        # Borne sur created_at (et non created_at__date) pour utiliser l'index
+        start = timezone.make_aware(datetime.datetime.combine(since, datetime.time.min))
+        movements = movements.filter(created_at__gte=start)
+        rows = rows.filter(date__gte=since)
+
+    totals = (
+        movements.annotate(day=TruncDate('created_at'))
+        .values_list('medicine', 'day')
+        .annotate(total=Sum('quantity'))
+    )
+    with transaction.atomic():
+        rows.delete()
+        created = DailySales.objects.bulk_create(
+            [DailySales(medicine_id=pk, date=day, quantity=total)
+             for pk, day, total in totals if total > 0],
+            batch_size=1000,
+        )
+    return len(created)
+
+
+def top_selling_medicines(days=30, limit=5, queryset=None):
+    """
+    Médicaments les plus vendus sur les `days` derniers jours (aujourd'hui inclus)
+
+    Une seule requête : jointure sur les lignes de DailySales de la fenêtre
+    (index date, medicine, quantity), regroupement par médicament.
+
+    Args:
+        days (int): Taille de la fenêtre en jours
+        limit (int): Nombre de médicaments retournés
+        queryset (QuerySet): Médicaments candidats (défaut : tous)
+
+    Returns:
+        QuerySet: Médicaments annotés de `sold_quantity`, par ventes décroissantes
+    """
+    start = timezone.localdate() - datetime.timedelta(days=days - 1)
+    medicines = Medicine.objects.all() if queryset is None else queryset
+    return (
+        medicines.filter(daily_sales__date__gte=start)
+        .annotate(sold_quantity=Sum('daily_sales__quantity'))
+        .filter(sold_quantity__gt=0)
+        .order_by('-sold_quantity', 'pk')[:limit]
+    )
@@ -0,0 +1,53 @@
+# inventory/signals.py
+# Signaux de l'inventaire : statistiques du stock tenues à jour à chaque
+# création, modification ou suppression d'un médicament via le modèle
+# (les UPDATE en masse du checkout appellent directement inventory/stats.py)
+# et lot initial et premier instantané du grand livre des médicaments créés
+
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from products.models import Medicine
+from .lots import OPENING_LOT, add_lots
+from .models import StockSnapshot
+from .stats import record_stock_changes, stock_state
+
+
+@receiver(post_init, sender=Medicine)
+def remember_stock_state(sender, instance, **kwargs):
+    """Mémorise l'état chargé pour calculer la variation au prochain enregistrement"""
+    instance._stats_state = stock_state(instance)
+
+
+@receiver(post_save, sender=Medicine)
+def update_stock_stats(sender, instance, created, raw=False, **kwargs):
+    """Répercute la modification du médicament sur les statistiques du stock"""
+    after = stock_state(instance)
+    if not raw and (created or instance._stats_state is not None):
+        record_stock_changes([(None if created else instance._stats_state, after)])
+    instance._stats_state = after
+
+
+@receiver(post_delete, sender=Medicine)
+def remove_stock_stats(sender, instance, **kwargs):
+    """Retire le médicament supprimé des statistiques du stock"""
+    state = stock_state(instance)
+    if state is not None:
+        record_stock_changes([(state, None)])
+
+
+@receiver(post_save, sender=Medicine)
+def create_opening_lot(sender, instance, created, raw=False, **kwargs):
+    """Le stock saisi à la création d'un médicament forme son premier lot"""
+    if created and not raw and instance.stock_quantity > 0:
+        add_lots([(instance.pk, OPENING_LOT, instance.expiry_date, instance.stock_quantity)])
+
+
+@receiver(post_save, sender=Medicine)
+def create_opening_snapshot(sender, instance, created, raw=False, **kwargs):
+    """Le stock initial n'a pas de mouvement : il forme le premier instantané du grand livre"""
+    if created and not raw:
+        StockSnapshot.objects.create(
+            medicine=instance, taken_at=timezone.now(), quantity=instance.stock_quantity
+        )
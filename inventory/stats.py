@@ -0,0 +1,228 @@
+# inventory/stats.py
+# Statistiques du tableau de bord de l'inventaire
+# Tenues à jour par incréments à chaque modification du stock (checkout, update_stock,
+# annulations, catalogue) : le tableau de bord s'affiche en temps constant.
+# Les incréments sont appliqués dans la transaction qui modifie le stock, jamais après :
+# un recalcul concurrent les voit soit déjà validés, soit encore à venir, pas les deux.
+# Un recalcul complet périodique (commande reconcile_inventory_stats) corrige les écarts.
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, PositiveIntegerField, Q, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from pharmacy_online.metrics import STOCKOUTS
+from products.cache import invalidate_catalog
+from products.models import Medicine, stock_status_expression
+from .models import InventoryStats, MedicineSales, StockMovement
+from .sales import add_daily_sales
+
+# Clé primaire de l'unique ligne de statistiques
+STATS_PK = 1
+
+# Médicaments verrouillés à la fois lors de la reconstruction des ventes
+SALES_BATCH_SIZE = 1000
+
+
+def stock_state(medicine):
+    """
+    État d'un médicament utile aux statistiques : (stock, seuil minimum, prix)
+
+    Returns:
+        tuple | None: None si un des champs n'est pas chargé (ex: .only())
+    """
+    values = medicine.__dict__
+    if any(name not in values for name in ('stock_quantity', 'minimum_stock', 'price')):
+        return None
+    return values['stock_quantity'], values['minimum_stock'], values['price']
+
+
+def _contribution(state):
+    """Contribution d'un médicament aux compteurs (total, stock faible, rupture, valeur)"""
+    if state is None:
+        return 0, 0, 0, Decimal(0)
+    stock, minimum, price = state
+    return 1, int(stock <= minimum), int(stock == 0), stock * Decimal(str(price))
+
+
+def stock_delta(changes):
+    """
+    Variation des compteurs pour une série de changements d'état
+
+    Args:
+        changes (iterable): Tuples (état avant, état après) ; None avant pour une
+                            création, None après pour une suppression
+
+    Returns:
+        tuple: (total, stock faible, rupture, valeur du stock)
+    """
+    delta = [0, 0, 0, Decimal(0)]
+    for before, after in changes:
+        for i, (old, new) in enumerate(zip(_contribution(before), _contribution(after))):
+            delta[i] += new - old
+    return tuple(delta)
+
+
+def record_stock_changes(changes):
+    """
+    Répercute des changements de stock sur les statistiques, dans la transaction en cours
+
+    La ligne de statistiques reste verrouillée jusqu'à la validation : le recalcul
+    complet, qui prend ce verrou avant de lire les médicaments, ne peut pas compter
+    une seconde fois une variation déjà incluse. Annulée avec la transaction.
+    """
+    changes = list(changes)
+    delta = stock_delta(changes)
+    if any(delta):
+        _apply_stock_delta(delta)
+
+    # Ruptures : stock positif avant, nul après
+    stockouts = sum(1 for before, after in changes if before and after and before[0] > 0 and after[0] == 0)
+    if stockouts:
+        transaction.on_commit(lambda: STOCKOUTS.inc(stockouts))
+
+
+def _apply_stock_delta(delta):
+    total, low, out, value = delta
+    updated = InventoryStats.objects.filter(pk=STATS_PK).update(
+        total_medicines=F('total_medicines') + total,
+        low_stock_count=F('low_stock_count') + low,
+        out_of_stock_count=F('out_of_stock_count') + out,
+        total_stock_value=F('total_stock_value') + value,
+        updated_at=timezone.now(),
+    )
+    # Ligne absente (supprimée à la main) : elle sera recréée par le prochain
+    # recalcul complet, qui inclura ce changement
+    return updated
+
+
+def record_sales(quantities):
+    """
+    Ajoute des sorties de stock aux quantités vendues par médicament
+
+    Met à jour le total par médicament et l'agrégat journalier (DailySales), dans la
+    transaction en cours : l'appelant tient déjà le verrou des médicaments concernés,
+    que le recalcul complet prend aussi (voir rebuild_medicine_sales).
+
+    Args:
+        quantities (dict): {medicine_id: quantité sortie}
+    """
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    if quantities:
+        _apply_sales(quantities, timezone.localdate())
+
+
+def _apply_sales(quantities, date):
+    # Quatre requêtes quel que soit le nombre de médicaments
+    with transaction.atomic():
+        add_daily_sales(quantities, date)
+        MedicineSales.objects.bulk_create(
+            [MedicineSales(medicine_id=pk) for pk in quantities], ignore_conflicts=True
+        )
+        MedicineSales.objects.filter(pk__in=quantities).update(
+            sold_quantity=Case(
+                *[When(pk=pk, then=F('sold_quantity') + quantity)
+                  for pk, quantity in quantities.items()],
+                default=F('sold_quantity'),
+                output_field=PositiveIntegerField(),
+            )
+        )
+
+
+def reconcile_inventory_stats():
+    """
+    Recalcule entièrement les statistiques à partir des médicaments et des mouvements
+
+    Le statut de stock dénormalisé (stock_status) est d'abord corrigé là où il ne
+    correspond plus au stock (ex: écriture en masse sans stock_status_expression),
+    et les compteurs sont calculés à partir du stock et du seuil, pas du statut.
+    Les compteurs sont lus sous le verrou de la ligne de statistiques : une variation
+    concurrente est soit validée avant la lecture, soit appliquée après le recalcul.
+    Les ventes sont reconstruites ensuite, hors de ce verrou (rebuild_medicine_sales).
+    Coûteux (parcours de tout l'historique) : à planifier hors des heures de pointe.
+
+    Returns:
+        InventoryStats: Statistiques recalculées
+    """
+    # Avant le verrou des statistiques : les écritures verrouillent les médicaments
+    # puis les statistiques, jamais l'inverse
+    if Medicine.objects.exclude(stock_status=stock_status_expression()).update(
+        stock_status=stock_status_expression()
+    ):
+        transaction.on_commit(invalidate_catalog)
+
+    with transaction.atomic():
+        stats, _ = InventoryStats.objects.select_for_update().get_or_create(pk=STATS_PK)
+        totals = Medicine.objects.aggregate(
+            total=Count('id'),
+            low=Count('id', filter=Q(stock_quantity__lte=F('minimum_stock')) | Q(stock_quantity__lte=0)),
+            out=Count('id', filter=Q(stock_quantity__lte=0)),
+            value=Coalesce(
+                Sum(F('stock_quantity') * F('price')), Decimal(0),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+        stats.total_medicines = totals['total']
+        stats.low_stock_count = totals['low']
+        stats.out_of_stock_count = totals['out']
+        stats.total_stock_value = totals['value']
+        stats.reconciled_at = timezone.now()
+        stats.save()
+
+    rebuild_medicine_sales()
+    return stats
+
+
+def rebuild_medicine_sales(batch_size=SALES_BATCH_SIZE):
+    """
+    Reconstruit les quantités vendues par médicament à partir des sorties de stock
+
+    Par lots de médicaments, chacun dans sa transaction : les médicaments du lot
+    sont verrouillés avant la lecture de leurs mouvements, comme le font les
+    écritures avant record_sales. Une vente concurrente est donc soit comptée
+    par la reconstruction, soit ajoutée après, et seul un lot est bloqué à la fois.
+    """
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Medicine.objects.select_for_update().filter(pk__gt=last_pk)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                return
+            sold = (
+                StockMovement.objects.filter(medicine_id__in=batch, movement_type='out')
+                .exclude(reason__startswith=StockMovement.EXPIRED_REASON)
+                .values_list('medicine')
+                .annotate(total=Sum('quantity'))
+            )
+            MedicineSales.objects.filter(medicine_id__in=batch).delete()
+            MedicineSales.objects.bulk_create(
+                [MedicineSales(medicine_id=pk, sold_quantity=total) for pk, total in sold if total > 0]
+            )
+        last_pk = batch[-1]
+
+
+def get_inventory_stats():
+    """Statistiques courantes (une requête ; calcul complet au premier appel)"""
+    return InventoryStats.objects.filter(pk=STATS_PK).first() or reconcile_inventory_stats()
+
+
+def get_popular_medicines(limit=5):
+    """
+    Médicaments les plus sortis du stock, avec leur attribut `sold_quantity`
+
+    Une requête indexée sur sold_quantity, indépendante de la taille de l'historique.
+    """
+    medicines = []
+    for sales in (
+        MedicineSales.objects.filter(sold_quantity__gt=0)
+        .select_related('medicine')
+        .order_by('-sold_quantity', 'medicine_id')[:limit]
+    ):
+        sales.medicine.sold_quantity = sales.sold_quantity
+        medicines.append(sales.medicine)
+    return medicines
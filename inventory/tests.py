@@ -1,3 +1,648 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import shutil
+import tempfile
+import tracemalloc
+import zipfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.checkout import InsufficientStockError, place_order
+from orders.models import Cart, CartItem
+from orders.transitions import transition_orders
+from pharmacy_online.benchmark import stock_stress
+from products.models import Category, Medicine
+from .expiry import expiring_lots, sweep_expired_stock
+from .forms import StockUpdateForm
+from .ledger import ledger_discrepancies, stock_as_of, take_stock_snapshots
+from .lots import plan_fefo
+from .models import DailySales, MedicineSales, StockLot, StockMovement, StockReservation, StockSnapshot
+from .reservations import (
+    available_to_promise, hold_stock, release_expired_reservations,
+)
+from .receiving import ReceivingError, parse_delivery, receive_delivery
+from .sales import rebuild_daily_sales, top_selling_medicines
+from .stats import get_inventory_stats, get_popular_medicines, reconcile_inventory_stats
+from .utils import get_low_stock_medicines, get_out_of_stock_medicines, update_stock
+
+
+def make_medicine(name='Doliprane', stock=10, **kwargs):
+    category, _ = Category.objects.get_or_create(name='Antidouleurs')
+    return Medicine.objects.create(
+        name=name,
+        description=f"Description de {name}",
+        category=category,
+        price=kwargs.pop('price', Decimal('2.50')),
+        expiry_date=kwargs.pop('expiry_date', datetime.date.today() + datetime.timedelta(days=365)),
+        stock_quantity=stock,
+        **kwargs
+    )
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.medicine = make_medicine(stock=5)
+        self.cart_a = Cart.objects.create(user=User.objects.create_user('alice'))
+        self.cart_b = Cart.objects.create(user=User.objects.create_user('bob'))
+
+    def test_holds_reduce_available_to_promise_for_other_carts(self):
+        self.assertTrue(hold_stock(self.cart_a, self.medicine, 4))
+
+        self.assertEqual(available_to_promise(self.medicine), 1)
+        self.assertEqual(available_to_promise(self.medicine, exclude_cart=self.cart_a), 5)
+        self.assertFalse(hold_stock(self.cart_b, self.medicine, 2))
+        self.assertTrue(hold_stock(self.cart_b, self.medicine, 1))
+
+    def test_expired_holds_are_ignored_and_swept(self):
+        hold_stock(self.cart_a, self.medicine, 5)
+        StockReservation.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+
+        self.assertEqual(available_to_promise(self.medicine), 5)
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+@override_settings(BACKGROUND_TASKS_MODE='sync')
+class InventoryStatsTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = User.objects.create_user('pharmacien', is_staff=True)
+
+    def snapshot(self):
+        stats = get_inventory_stats()
+        return (
+            stats.total_medicines, stats.low_stock_count,
+            stats.out_of_stock_count, stats.total_stock_value,
+            [(m.name, m.sold_quantity) for m in get_popular_medicines()],
+        )
+
+    def test_incremental_updates_match_full_reconciliation(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            doliprane = make_medicine('Doliprane', stock=30)
+            spasfon = make_medicine('Spasfon', stock=8, price=Decimal('4.10'))
+            make_medicine('Smecta', stock=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_stock(doliprane, 5, 'out', "Casse", self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_stock(spasfon, 20, 'in', "Livraison", self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            cart = Cart.objects.create(user=self.user)
+            CartItem.objects.create(cart=cart, medicine=spasfon, quantity=28)
+            CartItem.objects.create(cart=cart, medicine=doliprane, quantity=2)
+            place_order(cart, self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Medicine.objects.get(name='Smecta').delete()
+
+        incremental = self.snapshot()
+        self.assertEqual(incremental[:4], (2, 1, 1, Decimal('57.50')))
+        self.assertEqual(incremental[4], [('Spasfon', 28), ('Doliprane', 7)])
+
+        reconcile_inventory_stats()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_reconciliation_does_not_count_a_committed_change_twice(self):
+        doliprane = make_medicine('Doliprane', stock=30)
+        # Recalcul entre l'écriture et la fin de sa transaction
+        with self.captureOnCommitCallbacks(execute=True):
+            update_stock(doliprane, 30, 'out', "Vente", self.user)
+            reconcile_inventory_stats()
+        after_commit = self.snapshot()
+
+        reconcile_inventory_stats()
+        self.assertEqual(after_commit, self.snapshot())
+        self.assertEqual(after_commit[2], 1)
+        self.assertEqual(after_commit[4], [('Doliprane', 30)])
+
+    def test_rolled_back_changes_leave_the_statistics_untouched(self):
+        doliprane = make_medicine('Doliprane', stock=30)
+        before = self.snapshot()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            update_stock(doliprane, 30, 'out', "Vente", self.user)
+            raise RuntimeError
+        self.assertEqual(self.snapshot(), before)
+
+    def test_reconciliation_repairs_stock_status_drift(self):
+        medicine = make_medicine(stock=3)
+        # Écriture en masse qui a oublié stock_status_expression()
+        Medicine.objects.filter(pk=medicine.pk).update(stock_quantity=0)
+
+        stats = reconcile_inventory_stats()
+        medicine.refresh_from_db()
+        self.assertEqual(medicine.stock_status, 'out')
+        self.assertEqual(stats.out_of_stock_count, Medicine.objects.filter(stock_quantity=0).count())
+
+    def test_dashboard_queries_do_not_depend_on_history_size(self):
+        medicine = make_medicine(stock=10_000)
+        StockMovement.objects.bulk_create([
+            StockMovement(medicine=medicine, movement_type='out', quantity=1,
+                          reason="Vente", created_by=self.user)
+            for _ in range(500)
+        ])
+        reconcile_inventory_stats()
+
+        with self.assertNumQueries(2):
+            self.snapshot()
+
+
+class DailySalesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pharmacien', is_staff=True)
+        self.recent = make_medicine('Doliprane', stock=500)
+        self.older = make_medicine('Spasfon', stock=500)
+
+    def sell(self, medicine, quantity, days_ago):
+        movement = StockMovement.objects.create(
+            medicine=medicine, movement_type='out', quantity=quantity,
+            reason="Vente", created_by=self.user,
+        )
+        StockMovement.objects.filter(pk=movement.pk).update(
+            created_at=timezone.now() - datetime.timedelta(days=days_ago)
+        )
+
+    def test_rankings_depend_on_the_window(self):
+        self.sell(self.recent, 5, days_ago=1)
+        self.sell(self.recent, 3, days_ago=2)
+        self.sell(self.older, 40, days_ago=20)
+        rebuild_daily_sales()
+
+        with self.assertNumQueries(1):
+            week = [(m.name, m.sold_quantity) for m in top_selling_medicines(7)]
+        month = [(m.name, m.sold_quantity) for m in top_selling_medicines(30)]
+
+        self.assertEqual(week, [('Doliprane', 8)])
+        self.assertEqual(month, [('Spasfon', 40), ('Doliprane', 8)])
+
+    def test_incremental_sales_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            update_stock(self.recent, 4, 'out', "Vente", self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_stock(self.recent, 6, 'out', "Vente", self.user)
+            update_stock(self.older, 2, 'out', "Vente", self.user)
+        incremental = sorted(DailySales.objects.values_list('medicine', 'date', 'quantity'))
+
+        rebuild_daily_sales()
+        self.assertEqual(
+            sorted(DailySales.objects.values_list('medicine', 'date', 'quantity')), incremental
+        )
+        self.assertEqual(incremental[0][2], 10)
+
+
+@override_settings(BACKGROUND_TASKS_MODE='sync')
+class StockStatusTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = User.objects.create_user('pharmacien', is_staff=True)
+        self.medicine = make_medicine(stock=25, minimum_stock=10)
+
+    def status(self):
+        return Medicine.objects.values_list('stock_status', flat=True).get(pk=self.medicine.pk)
+
+    def test_status_follows_every_stock_mutation_path(self):
+        self.assertEqual(self.status(), 'ok')
+
+        update_stock(self.medicine, 15, 'out', "Casse", self.user)
+        self.assertEqual(self.status(), 'low')
+
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, medicine=self.medicine, quantity=10)
+        place_order(cart, self.user)
+        self.assertEqual(self.status(), 'out')
+
+        # Enregistrement partiel, comme list_editable de l'administration
+        medicine = Medicine.objects.get(pk=self.medicine.pk)
+        medicine.stock_quantity = 40
+        medicine.save(update_fields=['stock_quantity'])
+        self.assertEqual(self.status(), 'ok')
+
+    def test_reports_filter_on_the_precomputed_status(self):
+        make_medicine('Spasfon', stock=0)
+        make_medicine('Smecta', stock=3, minimum_stock=5)
+
+        self.assertEqual(
+            sorted(get_low_stock_medicines().values_list('name', flat=True)), ['Smecta', 'Spasfon']
+        )
+        self.assertEqual(list(get_out_of_stock_medicines().values_list('name', flat=True)), ['Spasfon'])
+        self.assertIn('stock_status', str(get_low_stock_medicines().query))
+
+
+class DeliveryReceivingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pharmacien', password='secret', is_staff=True)
+        self.doliprane = make_medicine('Doliprane', stock=0)
+        self.spasfon = make_medicine('Spasfon', stock=5)
+
+    def csv_file(self, rows, header='medicament;quantite;lot;peremption'):
+        return io.BytesIO('\n'.join([header, *rows]).encode())
+
+    def test_delivery_is_applied_in_one_batch(self):
+        lines = parse_delivery(self.csv_file([
+            'Doliprane;100;L001;31/12/2027',
+            f'{self.spasfon.pk};20;L002;2027-06-30',
+            'Doliprane;50;L003;',
+        ]))
+
+        report = receive_delivery(lines, self.user, 'BL-118')
+
+        self.doliprane.refresh_from_db()
+        self.spasfon.refresh_from_db()
+        self.assertEqual((self.doliprane.stock_quantity, self.spasfon.stock_quantity), (150, 25))
+        self.assertEqual(self.doliprane.stock_status, 'ok')
+        self.assertEqual((report.lines, report.medicines, report.units), (3, 2, 170))
+        self.assertEqual(StockMovement.objects.filter(movement_type='in').count(), 3)
+        self.assertTrue(StockMovement.objects.filter(reason__contains='lot L002').exists())
+
+    def test_line_without_expiry_does_not_inherit_an_expired_lot(self):
+        # Premier lot déjà périmé (pas encore retiré), lot récent valable
+        today = timezone.localdate()
+        expired = today - datetime.timedelta(days=3)
+        StockLot.objects.filter(medicine=self.spasfon).update(expiry_date=expired)
+        Medicine.objects.filter(pk=self.spasfon.pk).update(expiry_date=expired)
+        StockLot.objects.create(medicine=self.spasfon, lot_number='L900', quantity=2,
+                                expiry_date=today + datetime.timedelta(days=400))
+
+        receive_delivery(parse_delivery(self.csv_file(['Spasfon;20;L901;'])), self.user)
+
+        lot = StockLot.objects.get(lot_number='L901')
+        self.assertEqual(lot.expiry_date, today + datetime.timedelta(days=400))
+
+    def test_query_count_does_not_grow_with_the_delivery_size(self):
+        make_medicine('Smecta', stock=1)
+        small = parse_delivery(self.csv_file(['Doliprane;1;;']))
+        # Moins de lignes qu'un lot d'INSERT de SQLite (999 paramètres)
+        large = parse_delivery(self.csv_file(
+            [f'{name};{i + 1};;' for i in range(50) for name in ('Doliprane', 'Smecta', 'Spasfon')]
+        ))
+        with CaptureQueriesContext(connection) as one:
+            receive_delivery(small, self.user)
+        with CaptureQueriesContext(connection) as many:
+            receive_delivery(large, self.user)
+        self.assertEqual(len(one.captured_queries), len(many.captured_queries))
+
+    def test_any_error_rejects_the_whole_file(self):
+        lines = parse_delivery(self.csv_file(['Doliprane;10;;', 'Inconnu;5;;']))
+        with self.assertRaises(ReceivingError) as raised:
+            receive_delivery(lines, self.user)
+        self.assertEqual(raised.exception.errors[0][0], 3)
+
+        with self.assertRaises(ReceivingError) as raised:
+            parse_delivery(self.csv_file(['Doliprane;dix;;', 'Spasfon;2.5;;', 'Spasfon;3;;32/13/2027']))
+        self.assertEqual([line for line, _ in raised.exception.errors], [2, 3, 4])
+
+        self.doliprane.refresh_from_db()
+        self.assertEqual(self.doliprane.stock_quantity, 0)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_staff_upload_view(self):
+        self.client.login(username='pharmacien', password='secret')
+        upload = SimpleUploadedFile('livraison.csv', b'medicine,quantity\nDoliprane,12\n')
+
+        response = self.client.post(reverse('inventory:receive_delivery'), {'file': upload})
+
+        self.assertRedirects(response, reverse('inventory:dashboard'), fetch_redirect_response=False)
+        self.doliprane.refresh_from_db()
+        self.assertEqual(self.doliprane.stock_quantity, 12)
+
+
+@override_settings(BACKGROUND_TASKS_MODE='sync')
+class StockLotTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = User.objects.create_user('pharmacien', is_staff=True)
+        # Péremptions relatives à aujourd'hui : les lots vendus ne doivent pas être périmés
+        today = timezone.localdate()
+        self.january, self.march, self.june, self.later = (
+            today + datetime.timedelta(days=days) for days in (100, 160, 250, 500)
+        )
+        self.medicine = make_medicine(stock=0, expiry_date=today + datetime.timedelta(days=1000))
+        receive_delivery(parse_delivery(io.BytesIO(
+            'medicament;quantite;lot;peremption\n'
+            f'Doliprane;10;L-MARS;{self.march:%d/%m/%Y}\n'
+            f'Doliprane;5;L-JANV;{self.january:%d/%m/%Y}\n'
+            f'Doliprane;20;L-JUIN;{self.june:%d/%m/%Y}\n'.encode()
+        )), self.user)
+
+    def lots(self):
+        return dict(StockLot.objects.filter(medicine=self.medicine).values_list('lot_number', 'quantity'))
+
+    def assertRollupMatchesLots(self):
+        self.medicine.refresh_from_db()
+        total = StockLot.objects.filter(medicine=self.medicine).aggregate(total=Sum('quantity'))['total']
+        self.assertEqual(self.medicine.stock_quantity, total)
+
+    def test_checkout_allocates_first_expired_first_out(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, medicine=self.medicine, quantity=12)
+        order = place_order(cart, self.user)
+
+        self.assertEqual(self.lots(), {'L-JANV': 0, 'L-MARS': 3, 'L-JUIN': 20})
+        self.assertRollupMatchesLots()
+        self.assertEqual(self.medicine.expiry_date, self.march)
+        allocations = order.items.get().lot_allocations.values_list('lot__lot_number', 'quantity')
+        self.assertEqual(sorted(allocations), [('L-JANV', 5), ('L-MARS', 7)])
+
+        # L'annulation remet les quantités dans les lots d'origine
+        transition_orders([order.pk], 'cancelled', self.user, notify=False)
+        self.assertEqual(self.lots(), {'L-JANV': 5, 'L-MARS': 10, 'L-JUIN': 20})
+        self.assertRollupMatchesLots()
+        self.assertEqual(self.medicine.expiry_date, self.january)
+
+    def test_cancelled_units_from_an_expired_lot_are_not_restocked(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, medicine=self.medicine, quantity=12)
+        order = place_order(cart, self.user)
+        # Le lot de janvier a périmé depuis la commande
+        StockLot.objects.filter(lot_number='L-JANV').update(
+            expiry_date=timezone.localdate() - datetime.timedelta(days=1)
+        )
+
+        transition_orders([order.pk], 'cancelled', self.user, notify=False)
+
+        self.assertEqual(self.lots(), {'L-JANV': 0, 'L-MARS': 10, 'L-JUIN': 20})
+        self.assertRollupMatchesLots()
+        self.assertEqual(self.medicine.stock_quantity, 30)
+        withdrawn = StockMovement.objects.get(reason__startswith=StockMovement.EXPIRED_REASON)
+        self.assertEqual((withdrawn.movement_type, withdrawn.quantity), ('out', 5))
+        self.assertIn(order.order_number, withdrawn.reason)
+        self.assertFalse(ledger_discrepancies().exists())
+
+    def test_manual_movements_keep_the_rollup(self):
+        update_stock(self.medicine, 7, 'out', "Casse", self.user)
+        self.assertEqual(self.lots()['L-MARS'], 8)
+        update_stock(self.medicine, 40, 'adjustment', "Inventaire", self.user)
+        update_stock(self.medicine, 3, 'in', "Retour", self.user)
+        self.assertRollupMatchesLots()
+        self.assertEqual(self.medicine.stock_quantity, 43)
+
+    def test_manual_entry_creates_a_lot_with_its_own_expiry(self):
+        update_stock(self.medicine, 4, 'in', "Retour", self.user,
+                     lot_number='R-1', expiry_date=self.later)
+        self.assertEqual(
+            StockLot.objects.filter(lot_number='R-1').values_list('expiry_date', 'quantity').get(),
+            (self.later, 4),
+        )
+        # Sans péremption fournie : celle du lot le plus récent, jamais celle du premier lot
+        update_stock(self.medicine, 2, 'in', "Retour", self.user)
+        self.assertEqual(StockLot.objects.get(lot_number='').expiry_date, self.later)
+        self.assertRollupMatchesLots()
+        self.assertEqual(self.medicine.expiry_date, self.january)
+
+        form = StockUpdateForm({'movement_type': 'in', 'quantity': 3, 'reason': "Retour"})
+        self.assertFalse(form.is_valid())
+        self.assertIn('expiry_date', form.errors)
+
+    def test_expired_lots_are_not_sold(self):
+        # Lot de janvier périmé, pas encore retiré par le balayage
+        StockLot.objects.filter(lot_number='L-JANV').update(
+            expiry_date=timezone.localdate() - datetime.timedelta(days=1)
+        )
+        cart = Cart.objects.create(user=self.user)
+        item = CartItem.objects.create(cart=cart, medicine=self.medicine, quantity=31)
+        with self.assertRaises(InsufficientStockError):
+            place_order(cart, self.user)
+        self.assertEqual(self.lots()['L-JANV'], 5)
+
+        item.quantity = 12
+        item.save()
+        place_order(cart, self.user)
+        self.assertEqual(self.lots(), {'L-JANV': 5, 'L-MARS': 0, 'L-JUIN': 18})
+        self.assertRollupMatchesLots()
+
+    def test_plan_reads_only_the_lots_it_needs(self):
+        StockLot.objects.bulk_create([
+            StockLot(medicine=self.medicine, lot_number=f'B{i}',
+                     expiry_date=self.later, quantity=1)
+            for i in range(2000)
+        ])
+        with self.assertNumQueries(1):
+            plan, missing = plan_fefo({self.medicine.pk: 20})
+        self.assertEqual(missing, {})
+        self.assertEqual([take for _, _, take in plan], [5, 10, 5])
+
+
+class ExpirySweepTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pharmacien', is_staff=True)
+        today = timezone.localdate()
+        self.yesterday = today - datetime.timedelta(days=1)
+        self.in_ten_days = today + datetime.timedelta(days=10)
+        self.partly = make_medicine('Doliprane', stock=5, expiry_date=self.yesterday)
+        self.fully = make_medicine('Spasfon', stock=3, expiry_date=self.yesterday)
+        receive_delivery(parse_delivery(io.BytesIO(
+            f'medicament;quantite;lot;peremption\nDoliprane;10;L2;{self.in_ten_days:%Y-%m-%d}\n'.encode()
+        )), self.user)
+
+    def test_expired_lots_are_withdrawn(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            report = sweep_expired_stock(self.user)
+
+        self.assertEqual((report.lots, report.units, report.medicines, report.out_of_stock), (2, 8, 2, 1))
+        self.partly.refresh_from_db()
+        self.fully.refresh_from_db()
+        self.assertEqual((self.partly.stock_quantity, self.partly.is_available), (10, True))
+        self.assertEqual(self.partly.expiry_date, self.in_ten_days)
+        self.assertEqual((self.fully.stock_quantity, self.fully.stock_status), (0, 'out'))
+        self.assertEqual(
+            StockMovement.objects.filter(movement_type='out', reason__startswith='Périmé').count(), 2
+        )
+        # Un retrait pour péremption n'est pas une vente
+        reconcile_inventory_stats()
+        self.assertEqual(get_popular_medicines(), [])
+
+        # Rien à retirer au second passage
+        self.assertEqual(sweep_expired_stock(self.user).lots, 0)
+
+    def test_withdrawn_medicine_is_sold_again_once_restocked(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            sweep_expired_stock(self.user)
+        receive_delivery(parse_delivery(io.BytesIO(
+            f'medicament;quantite;lot;peremption\nSpasfon;4;S2;{self.in_ten_days:%Y-%m-%d}\n'.encode()
+        )), self.user)
+
+        self.fully.refresh_from_db()
+        self.assertEqual((self.fully.stock_quantity, self.fully.is_available), (4, True))
+        self.client.force_login(User.objects.create_user('client'))
+        response = self.client.post(reverse('products:add_to_cart', args=[self.fully.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(CartItem.objects.filter(medicine=self.fully, quantity=1).exists())
+
+    def test_soon_to_expire_lots_can_be_withdrawn_and_reported(self):
+        self.assertEqual(
+            [lot.lot_number for lot in expiring_lots(30)], ['INITIAL', 'INITIAL', 'L2']
+        )
+        self.assertEqual(len(expiring_lots(5)), 2)
+
+        sweep_expired_stock(self.user, withdraw_days=30)
+        self.partly.refresh_from_db()
+        self.assertEqual(self.partly.stock_quantity, 0)
+        self.assertFalse(expiring_lots(30).exists())
+
+    def test_query_count_does_not_grow_with_the_number_of_medicines(self):
+        with CaptureQueriesContext(connection) as few:
+            sweep_expired_stock(self.user)
+        for i in range(40):
+            make_medicine(f'Périmé {i}', stock=2, expiry_date=self.yesterday)
+        with CaptureQueriesContext(connection) as many:
+            sweep_expired_stock(self.user)
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pharmacien', is_staff=True)
+        self.now = timezone.now()
+        self.medicine = make_medicine(stock=10)
+        StockSnapshot.objects.update(taken_at=self.days_ago(10))
+        for days, quantity, movement_type in [(5, 5, 'in'), (2, 3, 'out')]:
+            update_stock(self.medicine, quantity, movement_type, "Test", self.user)
+            StockMovement.objects.filter(pk=StockMovement.objects.latest('id').pk).update(
+                created_at=self.days_ago(days)
+            )
+
+    def days_ago(self, days):
+        return self.now - datetime.timedelta(days=days)
+
+    def balance(self, when):
+        return stock_as_of(when, Medicine.objects.filter(pk=self.medicine.pk))[0].balance
+
+    def test_stock_as_of_replays_from_the_last_snapshot(self):
+        self.assertEqual(self.balance(self.days_ago(6)), 10)
+        self.assertEqual(self.balance(self.days_ago(3)), 15)
+        self.assertEqual(self.balance(self.now), 12)
+        self.assertEqual(self.balance(timezone.localdate()), 12)
+        # Avant le premier instantané : stock actuel moins les mouvements postérieurs
+        self.assertEqual(self.balance(self.days_ago(30)), 10)
+
+        self.assertEqual(take_stock_snapshots(at=self.days_ago(3)), 1)
+        StockMovement.objects.filter(movement_type='in').update(created_at=self.days_ago(20))
+        # Le mouvement antidaté n'est plus rejoué : l'instantané fait foi
+        self.assertEqual(self.balance(self.days_ago(1)), 12)
+
+    def test_discrepancies_with_the_displayed_stock(self):
+        self.assertFalse(ledger_discrepancies().exists())
+        Medicine.objects.filter(pk=self.medicine.pk).update(stock_quantity=99)
+        [medicine] = ledger_discrepancies()
+        self.assertEqual((medicine.stock_quantity, medicine.ledger_balance), (99, 12))
+
+    def test_withdrawal_beyond_stock_records_the_quantity_removed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            update_stock(self.medicine, 50, 'out', "Casse", self.user)
+
+        self.assertEqual(self.medicine.stock_quantity, 0)
+        self.assertEqual(StockMovement.objects.latest('id').quantity, 12)
+        # 3 sortis dans setUp, puis les 12 restants
+        self.assertEqual(MedicineSales.objects.get(medicine=self.medicine).sold_quantity, 15)
+        self.assertFalse(ledger_discrepancies().exists())
+
+    def test_movements_are_append_only(self):
+        movement = StockMovement.objects.first()
+        movement.quantity = 1
+        with self.assertRaises(ValueError):
+            movement.save()
+        with self.assertRaises(ValueError):
+            movement.delete()
+
+
+class StockMovementExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pharmacien', is_staff=True)
+        self.client.force_login(self.user)
+        self.medicine = make_medicine(stock=10)
+        update_stock(self.medicine, 5, 'in', "Livraison ; urgente", self.user)
+        update_stock(self.medicine, 3, 'out', "Vente", self.user)
+        self.url = reverse('inventory:export_stock_movements')
+
+    def test_csv_honours_the_list_filters(self):
+        response = self.client.get(self.url, {'movement_type': 'in', 'medicine': self.medicine.pk})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(content), delimiter=';'))
+        self.assertEqual(rows[0][:4], ['Date', 'Médicament', 'Type', 'Quantité'])
+        self.assertEqual([row[1:6] for row in rows[1:]], [['Doliprane', 'Entrée', '5', 'Livraison ; urgente', 'pharmacien']])
+
+        tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        response = self.client.get(self.url, {'date_from': tomorrow})
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()), 1)
+
+    def test_xlsx_is_a_readable_workbook(self):
+        response = self.client.get(self.url, {'format': 'xlsx'})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIn('xl/workbook.xml', archive.namelist())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('<c><v>3</v></c>', sheet)
+        self.assertIn('Livraison ; urgente', sheet)
+
+    def test_xlsx_continues_on_a_new_sheet_past_the_row_limit(self):
+        self.add_movements(3)
+        with mock.patch('pharmacy_online.exports.XLSX_SHEET_ROWS', 3):
+            response = self.client.get(self.url, {'format': 'xlsx'})
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        sheets = [archive.read(f'xl/worksheets/sheet{number}.xml').decode('utf-8') for number in (1, 2, 3)]
+        # 5 mouvements, 2 par feuille sous les intitulés répétés
+        self.assertEqual([sheet.count('<row>') for sheet in sheets], [3, 3, 2])
+        self.assertTrue(all('Médicament' in sheet for sheet in sheets))
+        workbook = archive.read('xl/workbook.xml').decode('utf-8')
+        self.assertIn('name="Mouvements de stock 3" sheetId="3" r:id="rId3"', workbook)
+        self.assertIn('/xl/worksheets/sheet3.xml', archive.read('[Content_Types].xml').decode('utf-8'))
+
+    def export_peak_memory(self, file_format):
+        response = self.client.get(self.url, {'format': file_format})
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def add_movements(self, count):
+        StockMovement.objects.bulk_create(
+            [
+                StockMovement(medicine=self.medicine, movement_type='out', quantity=i % 7 + 1,
+                              reason=f"Vente comptoir n°{i}", created_by=self.user)
+                for i in range(count)
+            ],
+            batch_size=1000,
+        )
+
+    def test_export_memory_does_not_grow_with_the_number_of_rows(self):
+        self.add_movements(5000)
+        small = {file_format: self.export_peak_memory(file_format) for file_format in ('csv', 'xlsx')}
+        self.add_movements(15000)
+        for file_format, peak in small.items():
+            large = self.export_peak_memory(file_format)
+            # 4 fois plus de lignes (1,2 Mo de CSV) : même plafond mémoire
+            self.assertLess(large, 3 * 1024 * 1024, file_format)
+            self.assertLess(large, peak * 1.25, file_format)
+
+
+@override_settings(BACKGROUND_TASKS_MODE='sync')
+class StockConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    def test_parallel_checkouts_and_stock_updates_keep_stock_consistent(self):
+        result = stock_stress(threads=6, operations=12, medicines=2, stock=15, seed=3)
+
+        self.assertEqual(result['violations'], [])
+        self.assertGreater(result['checkouts'], 0)
+        self.assertGreater(result['rejected_checkouts'], 0)
@@ -23,13 +23,22 @@ urlpatterns = [
     # Route pour consulter l'historique des mouvements de stock
     # Affiche tous les entrées/sorties/ajustements de stock
     path('stock-movements/', views.stock_movements, name='stock_movements'),
+
+    # Route pour exporter les mouvements filtrés en CSV ou XLSX (?format=xlsx), en streaming
+    path('stock-movements/export/', views.export_stock_movements, name='export_stock_movements'),
     
     # Route pour afficher le rapport des stocks faibles et ruptures
     # Permet d'identifier rapidement les produits nécessitant une commande
     path('low-stock/', views.low_stock_report, name='low_stock_report'),
+
+    # Route pour le rapport des lots qui périment dans les N prochains jours (?days=30)
+    path('expiring/', views.expiry_report, name='expiry_report'),
     
     # Route pour modifier manuellement le stock d'un médicament
     # <int:medicine_id> capture l'ID du médicament à modifier
     path('update-stock/<int:medicine_id>/', views.update_stock_view, name='update_stock'),
+
+    # Route pour réceptionner une livraison fournisseur complète (fichier CSV/XLSX)
+    path('receive/', views.receive_delivery_view, name='receive_delivery'),
 >>>>>>> develop
 ]
\ No newline at end of file
@@ -2,11 +2,18 @@
 # Fonctions utilitaires pour la gestion des stocks et inventaires
 # Contient la logique métier pour les mouvements de stock et les rapports
 
-from .models import StockMovement
-from products.models import Medicine
+from django.db import transaction
+from django.db.models import Case, F, Max, PositiveIntegerField, When
 
+from .lots import add_lots, consume_lots, earliest_lot_expiry, plan_fefo
+from .models import StockLot, StockMovement
+from .stats import record_sales, record_stock_changes
+from pharmacy_online.metrics import STOCK_UPDATES
+from products.cache import invalidate_catalog
+from products.models import Medicine, stock_status_expression
 
-def update_stock(medicine, quantity, movement_type, reason, user):
+
+def update_stock(medicine, quantity, movement_type, reason, user, lot_number='', expiry_date=None):
     """
     Met à jour le stock d'un médicament et enregistre le mouvement
     
@@ -21,6 +28,9 @@ def update_stock(medicine, quantity, movement_type, reason, user):
         movement_type (str): Type de mouvement ('in', 'out', 'adjustment')
         reason (str): Motif de la modification (ex: "Commande client", "Livraison fournisseur")
         user (User): Utilisateur effectuant la modification
+        lot_number (str): Numéro du lot créé par une entrée (optionnel)
+        expiry_date (date): Péremption du lot créé par une entrée ; à défaut,
+                            celle du lot le plus récent du médicament
     
     Returns:
         Medicine: Le médicament modifié avec le nouveau stock
@@ -29,45 +39,141 @@ def update_stock(medicine, quantity, movement_type, reason, user):
     - 'in' : Entrée de stock (ajoute la quantité)
     - 'out' : Sortie de stock (soustrait la quantité, minimum 0)
     - 'adjustment' : Ajustement direct (remplace la quantité)
+
+    Le stock est la somme des lots du médicament (voir inventory/lots.py) :
+    les entrées créent un lot, les sorties prélèvent les lots premier périmé,
+    premier sorti. Un lot sans péremption fournie ne reprend jamais celle du
+    premier lot (peut-être déjà périmé, donc retiré par inventory/expiry.py).
+
+    Les statistiques du stock sont mises à jour par incréments : compteurs via
+    le signal post_save du médicament, quantités vendues ci-dessous.
     """
-    # Sauvegarde de l'ancienne quantité pour le calcul des différences
-    old_quantity = medicine.stock_quantity
-
-    # Application de la modification selon le type de mouvement
-    if movement_type == 'in':
-        # Entrée de stock : ajout de la quantité
-        medicine.stock_quantity += quantity
-    elif movement_type == 'out':
-        # Sortie de stock : soustraction avec protection contre les stocks négatifs
-        medicine.stock_quantity = max(0, medicine.stock_quantity - quantity)
-    elif movement_type == 'adjustment':
-        # Ajustement direct : remplacement de la quantité
-        medicine.stock_quantity = quantity
-
-    # Sauvegarde des modifications en base de données
-    medicine.save()
-
-    # Enregistrement du mouvement de stock pour la traçabilité
-    # Pour les ajustements, on calcule la différence avec l'ancienne quantité
-    movement_quantity = quantity if movement_type != 'adjustment' else quantity - old_quantity
-    
-    StockMovement.objects.create(
-        medicine=medicine,
-        movement_type=movement_type,
-        quantity=movement_quantity,
-        reason=reason,
-        created_by=user
-    )
+    with transaction.atomic():
+        # Verrouillage et relecture : le stock peut avoir changé depuis le chargement
+        locked = Medicine.objects.select_for_update().get(pk=medicine.pk)
+
+        # Sauvegarde de l'ancienne quantité pour le calcul des différences
+        old_quantity = locked.stock_quantity
+
+        # Application de la modification selon le type de mouvement
+        if movement_type == 'in':
+            # Entrée de stock : ajout de la quantité
+            locked.stock_quantity += quantity
+        elif movement_type == 'out':
+            # Sortie de stock : soustraction avec protection contre les stocks négatifs
+            locked.stock_quantity = max(0, locked.stock_quantity - quantity)
+        elif movement_type == 'adjustment':
+            # Ajustement direct : remplacement de la quantité
+            locked.stock_quantity = quantity
 
+        # Répercussion sur les lots : nouveau lot ou prélèvement FEFO
+        difference = locked.stock_quantity - old_quantity
+        if difference > 0:
+            latest = (
+                StockLot.objects.filter(medicine=locked)
+                .aggregate(latest=Max('expiry_date'))['latest']
+            )
+            add_lots([(locked.pk, lot_number, expiry_date or latest or locked.expiry_date, difference)])
+        elif difference < 0:
+            # Lots périmés compris : les lots doivent rester égaux au stock
+            plan, _ = plan_fefo({locked.pk: -difference}, include_expired=True)
+            consume_lots(plan)
+        if difference:
+            # Péremption du médicament : celle du premier lot en stock
+            locked.expiry_date = (
+                StockLot.objects.filter(medicine=locked, quantity__gt=0)
+                .order_by('expiry_date')
+                .values_list('expiry_date', flat=True)
+                .first()
+            ) or locked.expiry_date
+
+        # Sauvegarde des modifications en base de données
+        locked.save()
+
+        # Enregistrement du mouvement de stock pour la traçabilité
+        # Quantité réellement déplacée : une sortie est limitée au stock disponible,
+        # un ajustement enregistre la différence avec l'ancienne quantité
+        if movement_type == 'out':
+            movement_quantity = old_quantity - locked.stock_quantity
+        elif movement_type == 'adjustment':
+            movement_quantity = difference
+        else:
+            movement_quantity = quantity
+
+        StockMovement.objects.create(
+            medicine=locked,
+            movement_type=movement_type,
+            quantity=movement_quantity,
+            reason=reason,
+            created_by=user
+        )
+
+        if movement_type == 'out':
+            record_sales({locked.pk: movement_quantity})
+        transaction.on_commit(lambda: STOCK_UPDATES.inc(movement_type=movement_type))
+
+    # L'objet reçu reflète le nouvel état
+    medicine.stock_quantity = locked.stock_quantity
+    medicine.stock_status = locked.stock_status
+    medicine.expiry_date = locked.expiry_date
     return medicine
 
 
+def increase_stock(quantities, update_lots):
+    """
+    Ajoute des quantités au stock de plusieurs médicaments en une seule requête
+
+    Utilisé par les entrées en masse (réception de livraisons, annulations de
+    commandes) ; les lots et les mouvements de stock sont créés par l'appelant.
+    Doit être appelée dans une transaction :
+    1. Verrouillage des médicaments (SELECT ... FOR UPDATE, tri par pk)
+    2. Création ou complément des lots par `update_lots()`
+    3. Un seul UPDATE F() + quantité, statut de stock et péremption du premier lot compris
+    4. Statistiques du stock et cache catalogue mis à jour après validation
+
+    Args:
+        quantities (dict): {medicine_id: quantité à ajouter}
+        update_lots (callable): Fonction sans argument appelée une fois les
+                                médicaments verrouillés, qui crée ou complète
+                                les lots pour les mêmes quantités
+    """
+    states = list(
+        Medicine.objects.select_for_update()
+        .filter(pk__in=quantities)
+        .order_by('pk')
+        .values_list('pk', 'stock_quantity', 'minimum_stock', 'price')
+    )
+    update_lots()
+
+    new_stock = Case(
+        *[When(pk=medicine_id, then=F('stock_quantity') + quantity)
+          for medicine_id, quantity in quantities.items()],
+        default=F('stock_quantity'),
+        output_field=PositiveIntegerField(),
+    )
+    Medicine.objects.filter(pk__in=quantities).update(
+        stock_quantity=new_stock,
+        stock_status=stock_status_expression(new_stock),
+        expiry_date=earliest_lot_expiry(),
+    )
+
+    record_stock_changes([
+        ((stock, minimum, price), (stock + quantities[pk], minimum, price))
+        for pk, stock, minimum, price in states
+    ])
+
+    # Des médicaments en rupture peuvent redevenir disponibles au catalogue
+    if any(stock == 0 for _, stock, _, _ in states):
+        transaction.on_commit(invalidate_catalog)
+
+
 def get_low_stock_medicines():
     """
     Retourne les médicaments avec un stock faible
     
     Un médicament est considéré en stock faible quand :
     stock_quantity <= minimum_stock (seuil défini dans le modèle)
+    Lecture du statut précalculé stock_status ('low' ou 'out'), indexé
     
     Returns:
         QuerySet: Liste des médicaments en stock faible
@@ -77,14 +183,14 @@ def get_low_stock_medicines():
     - Notifications au personnel
     - Planification des commandes fournisseurs
     """
-    return Medicine.objects.filter(stock_quantity__lte=models.F('minimum_stock'))
+    return Medicine.objects.filter(stock_status__in=['low', 'out'])
 
 
 def get_out_of_stock_medicines():
     """
     Retourne les médicaments en rupture de stock
     
-    Un médicament est en rupture quand stock_quantity = 0
+    Un médicament est en rupture quand stock_quantity = 0 (stock_status 'out', indexé)
     
     Returns:
         QuerySet: Liste des médicaments en rupture de stock
@@ -94,4 +200,4 @@ def get_out_of_stock_medicines():
     - Rapports de gestion
     - Alertes urgentes pour le personnel
     """
-    return Medicine.objects.filter(stock_quantity=0)
\ No newline at end of file
+    return Medicine.objects.filter(stock_status='out')
\ No newline at end of file
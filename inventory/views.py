@@ -18,35 +18,43 @@ def manage_inventory(request):
     return render(request, 'inventory/manage_inventory.html', {'inventories': inventories})
 =======
 # inventory/views.py
+import datetime
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.db.models import F, Sum, Count
-from django.core.paginator import Paginator
+from django.utils import timezone
+from pharmacy_online.exports import export_response
+from pharmacy_online.pagination import CursorPaginator
 from .models import StockMovement
 from products.models import Medicine, Category
+from .sales import SALES_WINDOWS, top_selling_medicines
+from .stats import get_inventory_stats, get_popular_medicines
 from .utils import update_stock, get_low_stock_medicines, get_out_of_stock_medicines
-from .forms import StockUpdateForm, StockMovementFilterForm
+from .expiry import expiring_lots
+from .ledger import ledger_moment, stock_as_of
+from .forms import StockUpdateForm, StockMovementFilterForm, DeliveryUploadForm
+from .receiving import ReceivingError, parse_delivery, receive_delivery
+
+# Lignes lues par requête (curseur côté serveur) pendant les exports
+EXPORT_CHUNK_SIZE = 2000
 
 
 @staff_member_required
 def inventory_dashboard(request):
-    # Statistiques générales
-    total_medicines = Medicine.objects.count()
+    # Statistiques générales, tenues à jour par incréments (voir inventory/stats.py)
+    stats = get_inventory_stats()
     total_categories = Category.objects.count()
-    low_stock_count = get_low_stock_medicines().count()
-    out_of_stock_count = get_out_of_stock_medicines().count()
-
-    # Valeur totale du stock
-    total_stock_value = Medicine.objects.aggregate(
-        total=Sum(F('stock_quantity') * F('price'))
-    )['total'] or 0
 
-    # Médicaments les plus vendus (basé sur les mouvements de sortie)
-    popular_medicines = Medicine.objects.annotate(
-        sold_quantity=Sum('stock_movements__quantity',
-                          filter=F('stock_movements__movement_type') == 'out')
-    ).order_by('-sold_quantity')[:5]
+    # Médicaments les plus vendus sur la fenêtre choisie : 7, 30 ou 90 jours
+    # (agrégat journalier des ventes) ou depuis toujours ('all', totaux par médicament)
+    sales_window = request.GET.get('window', '30')
+    if sales_window == 'all':
+        popular_medicines = get_popular_medicines(5)
+    else:
+        if sales_window not in [str(days) for days in SALES_WINDOWS]:
+            sales_window = '30'
+        popular_medicines = top_selling_medicines(int(sales_window), 5)
 
     # Mouvements récents
     recent_movements = StockMovement.objects.select_related(
@@ -54,18 +62,38 @@ def inventory_dashboard(request):
     ).order_by('-created_at')[:10]
 
     context = {
-        'total_medicines': total_medicines,
+        'total_medicines': stats.total_medicines,
         'total_categories': total_categories,
-        'low_stock_count': low_stock_count,
-        'out_of_stock_count': out_of_stock_count,
-        'total_stock_value': total_stock_value,
+        'low_stock_count': stats.low_stock_count,
+        'out_of_stock_count': stats.out_of_stock_count,
+        'total_stock_value': stats.total_stock_value,
+        'stats_reconciled_at': stats.reconciled_at,
         'popular_medicines': popular_medicines,
+        'sales_window': sales_window,
+        'sales_windows': SALES_WINDOWS,
         'recent_movements': recent_movements,
     }
 
     return render(request, 'inventory/dashboard.html', context)
 
 
+def filter_stock_movements(movements, form):
+    """Applique les filtres valides de StockMovementFilterForm (liste et export)"""
+    if not form.is_valid():
+        return movements
+    if form.cleaned_data['medicine']:
+        movements = movements.filter(medicine=form.cleaned_data['medicine'])
+    if form.cleaned_data['movement_type']:
+        movements = movements.filter(movement_type=form.cleaned_data['movement_type'])
+    # Bornes sur created_at (et non created_at__date) pour utiliser les index du grand livre
+    if form.cleaned_data['date_from']:
+        start = datetime.datetime.combine(form.cleaned_data['date_from'], datetime.time.min)
+        movements = movements.filter(created_at__gte=timezone.make_aware(start))
+    if form.cleaned_data['date_to']:
+        movements = movements.filter(created_at__lte=ledger_moment(form.cleaned_data['date_to']))
+    return movements
+
+
 @staff_member_required
 def stock_movements(request):
     movements = StockMovement.objects.select_related(
@@ -74,29 +102,50 @@ def stock_movements(request):
 
     # Filtrage
     form = StockMovementFilterForm(request.GET)
-    if form.is_valid():
-        if form.cleaned_data['medicine']:
-            movements = movements.filter(medicine=form.cleaned_data['medicine'])
-        if form.cleaned_data['movement_type']:
-            movements = movements.filter(movement_type=form.cleaned_data['movement_type'])
-        if form.cleaned_data['date_from']:
-            movements = movements.filter(created_at__date__gte=form.cleaned_data['date_from'])
-        if form.cleaned_data['date_to']:
-            movements = movements.filter(created_at__date__lte=form.cleaned_data['date_to'])
-
-    # Pagination
-    paginator = Paginator(movements, 25)
-    page_number = request.GET.get('page')
-    movements = paginator.get_page(page_number)
+    movements = filter_stock_movements(movements, form)
+
+    # Stock du médicament à la date de fin : dernier instantané + mouvements suivants
+    balance_as_of = None
+    if form.is_valid() and form.cleaned_data['medicine'] and form.cleaned_data['date_to']:
+        balance_as_of = stock_as_of(
+            form.cleaned_data['date_to'], Medicine.objects.filter(pk=form.cleaned_data['medicine'].pk)
+        )[0].balance
+
+    # Pagination par curseur : la page 5000 coûte autant que la première
+    paginator = CursorPaginator(movements, ('-created_at', '-id'), 25)
+    movements = paginator.get_page(request.GET.get('cursor'))
 
     context = {
         'movements': movements,
         'form': form,
+        'balance_as_of': balance_as_of,
     }
 
     return render(request, 'inventory/stock_movements.html', context)
 
 
+@staff_member_required
+def export_stock_movements(request):
+    # Export CSV/XLSX en streaming des mouvements filtrés (mêmes filtres que la liste) :
+    # lecture par curseur côté serveur, mémoire constante quel que soit le volume
+    form = StockMovementFilterForm(request.GET)
+    movements = filter_stock_movements(StockMovement.objects.all(), form).order_by('-created_at', '-id')
+    types = dict(StockMovement.MOVEMENT_TYPES)
+    rows = (
+        (created_at, name, types.get(movement_type, movement_type), quantity, reason, username)
+        for created_at, name, movement_type, quantity, reason, username in movements.values_list(
+            'created_at', 'medicine__name', 'movement_type', 'quantity', 'reason', 'created_by__username',
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return export_response(
+        ['Date', 'Médicament', 'Type', 'Quantité', 'Motif', 'Utilisateur'],
+        rows,
+        f"mouvements_stock_{timezone.localdate():%Y%m%d}",
+        request.GET.get('format', 'csv'),
+        sheet_name='Mouvements de stock',
+    )
+
+
 @staff_member_required
 def low_stock_report(request):
     low_stock_medicines = get_low_stock_medicines().select_related('category')
@@ -110,6 +159,22 @@ def low_stock_report(request):
     return render(request, 'inventory/low_stock_report.html', context)
 
 
+@staff_member_required
+def expiry_report(request):
+    # Lots en stock qui périment dans les N prochains jours (index sur la péremption)
+    try:
+        days = max(0, int(request.GET.get('days', 30)))
+    except ValueError:
+        days = 30
+
+    context = {
+        'days': days,
+        'expiring_lots': expiring_lots(days),
+    }
+
+    return render(request, 'inventory/expiry_report.html', context)
+
+
 @staff_member_required
 def update_stock_view(request, medicine_id):
     medicine = get_object_or_404(Medicine, id=medicine_id)
@@ -122,7 +187,11 @@ def update_stock_view(request, medicine_id):
             reason = form.cleaned_data['reason']
 
             try:
-                update_stock(medicine, quantity, movement_type, reason, request.user)
+                update_stock(
+                    medicine, quantity, movement_type, reason, request.user,
+                    lot_number=form.cleaned_data['lot_number'],
+                    expiry_date=form.cleaned_data['expiry_date'],
+                )
                 messages.success(
                     request,
                     f"Stock mis à jour pour {medicine.name}. Nouveau stock: {medicine.stock_quantity}"
@@ -139,4 +208,37 @@ def update_stock_view(request, medicine_id):
     }
 
     return render(request, 'inventory/update_stock.html', context)
+
+
+@staff_member_required
+def receive_delivery_view(request):
+    # Réception d'une livraison fournisseur complète depuis un fichier CSV/XLSX
+    errors = []
+
+    if request.method == 'POST':
+        form = DeliveryUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                lines = parse_delivery(upload, upload.name)
+                report = receive_delivery(lines, request.user, form.cleaned_data['reference'])
+                messages.success(
+                    request,
+                    f"Livraison enregistrée : {report.lines} ligne(s), {report.medicines} médicament(s), "
+                    f"{report.units} unité(s) ({report.rows_per_second:.0f} lignes/s)."
+                )
+                return redirect('inventory:dashboard')
+            except ReceivingError as e:
+                # Rien n'a été modifié : toutes les erreurs sont affichées pour correction
+                errors = e.errors
+                messages.error(request, str(e))
+    else:
+        form = DeliveryUploadForm()
+
+    context = {
+        'form': form,
+        'errors': errors,
+    }
+
+    return render(request, 'inventory/receive_delivery.html', context)
 >>>>>>> develop
@@ -4,7 +4,7 @@ from .models import Order, OrderItem
 =======
 # orders/admin.py
 from django.contrib import admin
-from .models import Order, OrderItem, Cart, CartItem
+from .models import Order, OrderItem, OrderStatusChange, Cart, CartItem
 
 >>>>>>> develop
 
@@ -53,6 +53,19 @@ class CartItemInline(admin.TabularInline):
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ['user', 'item_count', 'total_amount', 'updated_at']
+    list_select_related = ['user']
     readonly_fields = ['created_at', 'updated_at']
     inlines = [CartItemInline]
+
+    def get_queryset(self, request):
+        # Totaux calculés par la base pour toute la page (pas de requête par panier)
+        return super().get_queryset(request).with_totals()
+
+
+@admin.register(OrderStatusChange)
+class OrderStatusChangeAdmin(admin.ModelAdmin):
+    list_display = ['order', 'from_status', 'to_status', 'changed_by', 'changed_at']
+    list_filter = ['to_status', 'changed_at']
+    list_select_related = ['order', 'changed_by']
+    search_fields = ['order__order_number']
 >>>>>>> develop
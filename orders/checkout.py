@@ -0,0 +1,175 @@
+# orders/checkout.py
+# Moteur de validation de commande (checkout)
+# Transforme un panier en commande en une seule transaction, sans survente possible
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+
+from inventory.models import StockMovement
+from inventory.lots import allocate_order_items, consume_lots, earliest_lot_expiry, plan_fefo
+from inventory.reservations import reserved_quantities
+from inventory.stats import record_sales, record_stock_changes
+from products.cache import invalidate_catalog
+from products.models import Medicine, stock_status_expression
+from .models import Order, OrderItem
+
+
+class InsufficientStockError(Exception):
+    """
+    Levée quand au moins une ligne du panier dépasse le stock disponible
+
+    L'attribut `shortages` contient la liste des tuples
+    (médicament, quantité demandée, quantité disponible)
+    """
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        names = ', '.join(medicine.name for medicine, _, _ in shortages)
+        super().__init__(f"Stock insuffisant pour : {names}")
+
+
+def place_order(cart, user, notes=''):
+    """
+    Crée une commande à partir du panier et réserve le stock de façon atomique
+
+    Le nombre de requêtes SQL est constant quelle que soit la taille du panier :
+    1. Verrouillage des médicaments concernés (SELECT ... FOR UPDATE, tri par pk
+       pour que deux checkouts concurrents verrouillent dans le même ordre)
+    2. Contrôle du stock disponible, hors réservations actives des autres paniers
+    3. Choix des lots premier périmé, premier sorti (une requête avec fonction de
+       fenêtre) et décrément des lots en un seul UPDATE
+    4. Décrément conditionnel du stock en un seul UPDATE avec des expressions F()
+       (la clause WHERE exige stock_quantity >= quantité pour chaque ligne)
+    5. Création de la commande, de toutes les lignes, des prélèvements par lot
+       et des mouvements de stock de sortie avec bulk_create
+    6. Suppression du panier (et donc de ses réservations)
+
+    Args:
+        cart (Cart): Panier de l'utilisateur
+        user (User): Utilisateur qui passe la commande
+        notes (str): Notes libres saisies au checkout
+
+    Returns:
+        Order: La commande créée
+
+    Raises:
+        InsufficientStockError: Si une ligne dépasse le stock ; rien n'est modifié
+    """
+    with transaction.atomic():
+        # Quantités demandées par médicament
+        requested = dict(cart.items.values_list('medicine_id', 'quantity'))
+        if not requested:
+            raise ValueError("Le panier est vide.")
+
+        # ===== VERROUILLAGE ET CONTRÔLE DU STOCK =====
+
+        medicines = list(
+            Medicine.objects.select_for_update()
+            .filter(pk__in=requested)
+            .order_by('pk')
+        )
+
+        # Le stock réservé par d'autres paniers n'est pas disponible pour celui-ci
+        reserved = reserved_quantities(requested, exclude_cart=cart)
+        available = {
+            medicine.pk: max(0, medicine.stock_quantity - reserved.get(medicine.pk, 0))
+            for medicine in medicines
+        }
+
+        shortages = [
+            (medicine, requested[medicine.pk], available[medicine.pk])
+            for medicine in medicines
+            if available[medicine.pk] < requested[medicine.pk]
+        ]
+        if shortages:
+            raise InsufficientStockError(shortages)
+
+        # ===== PRÉLÈVEMENT DES LOTS (FEFO) =====
+
+        plan, missing = plan_fefo(requested)
+        if missing:
+            # Lots incohérents avec le stock : aucun prélèvement partiel
+            raise InsufficientStockError([
+                (medicine, requested[medicine.pk], requested[medicine.pk] - missing[medicine.pk])
+                for medicine in medicines if medicine.pk in missing
+            ])
+        consume_lots(plan)
+
+        # ===== DÉCRÉMENT CONDITIONNEL DU STOCK =====
+
+        # Un seul UPDATE pour toutes les lignes ; la condition par ligne garantit
+        # l'absence de survente même sur les bases sans SELECT ... FOR UPDATE
+        guard = Q()
+        for medicine_id, quantity in requested.items():
+            guard |= Q(pk=medicine_id, stock_quantity__gte=quantity)
+
+        new_stock = Case(
+            *[When(pk=medicine_id, then=F('stock_quantity') - quantity)
+              for medicine_id, quantity in requested.items()],
+            default=F('stock_quantity'),
+            output_field=PositiveIntegerField(),
+        )
+        updated = Medicine.objects.filter(guard).update(
+            stock_quantity=new_stock,
+            stock_status=stock_status_expression(new_stock),
+            expiry_date=earliest_lot_expiry(),
+        )
+        if updated != len(requested):
+            # Un autre checkout a consommé le stock entre-temps : annulation complète
+            raise InsufficientStockError([
+                (medicine, requested[medicine.pk], medicine.stock_quantity)
+                for medicine in medicines
+            ])
+
+        # ===== CRÉATION DE LA COMMANDE =====
+
+        total_amount = sum(
+            medicine.price * requested[medicine.pk] for medicine in medicines
+        )
+        order = Order.objects.create(
+            user=user,
+            total_amount=total_amount,
+            notes=notes,
+        )
+
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                medicine=medicine,
+                quantity=requested[medicine.pk],
+                price=medicine.price,
+            )
+            for medicine in medicines
+        ])
+        allocate_order_items(plan, items)
+
+        # Les réservations du panier deviennent des sorties de stock définitives
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                medicine=medicine,
+                movement_type='out',
+                quantity=requested[medicine.pk],
+                reason=f"Commande {order.order_number}",
+                created_by=user,
+            )
+            for medicine in medicines
+        ])
+
+        # Statistiques du tableau de bord de l'inventaire (appliquées après validation)
+        record_stock_changes([
+            (
+                (medicine.stock_quantity, medicine.minimum_stock, medicine.price),
+                (medicine.stock_quantity - requested[medicine.pk], medicine.minimum_stock, medicine.price),
+            )
+            for medicine in medicines
+        ])
+        record_sales(requested)
+
+        # Vider le panier (ses réservations sont supprimées en cascade)
+        cart.delete()
+
+        # Un médicament en rupture doit disparaître des pages du catalogue en cache
+        if any(medicine.stock_quantity == requested[medicine.pk] for medicine in medicines):
+            transaction.on_commit(invalidate_catalog)
+
+    return order
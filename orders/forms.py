@@ -0,0 +1,19 @@
+# orders/forms.py
+from django import forms
+from .models import Order
+
+
+class InvoiceExportForm(forms.Form):
+    status = forms.ChoiceField(
+        choices=[('', 'Tous les statuts')] + Order.STATUS_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    date_from = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    date_to = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
@@ -0,0 +1,209 @@
+# orders/invoices.py
+# Stockage des factures PDF générées
+# Une facture est rendue une seule fois (en arrière-plan) puis servie depuis
+# MEDIA_ROOT/invoices/<numéro de commande>/ ; son nom est l'empreinte de son contenu
+
+import datetime
+import hashlib
+import json
+import logging
+import multiprocessing
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from pharmacy_online.exports import ZipStream
+from pharmacy_online.tasks import run_in_background
+from .models import Order
+from .queries import orders_with_items
+from .utils import build_invoice_pdf, invoice_data
+
+logger = logging.getLogger(__name__)
+
+# Sous-répertoire de MEDIA_ROOT contenant les factures
+INVOICE_DIR = 'invoices'
+
+
+def invoice_fingerprint(data):
+    """Empreinte SHA-256 (tronquée) des données de la facture"""
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def invoice_directory(order_number):
+    """Répertoire des factures d'une commande, relatif à MEDIA_ROOT"""
+    return f"{INVOICE_DIR}/{order_number}"
+
+
+def invoice_name(data):
+    """Chemin de stockage de la facture, relatif à MEDIA_ROOT"""
+    return f"{invoice_directory(data['order_number'])}/{invoice_fingerprint(data)}.pdf"
+
+
+def load_invoice_order(order_id):
+    """Charge une commande avec tout ce que la facture affiche"""
+    return orders_with_items().get(pk=order_id)
+
+
+def store_invoice(data):
+    """
+    Rend et enregistre la facture si elle n'existe pas déjà pour ces données
+
+    Les versions précédentes de la facture de la commande (ex: ancien statut)
+    sont supprimées : seul le répertoire de la commande est parcouru.
+
+    Returns:
+        str: Chemin de stockage de la facture
+    """
+    name = invoice_name(data)
+    if default_storage.exists(name):
+        return name
+
+    pdf = build_invoice_pdf(data)
+    saved = default_storage.save(name, ContentFile(pdf))
+    if saved != name:
+        # Rendu concurrent des mêmes données (même contenu) : le fichier déjà
+        # enregistré sous le nom attendu est gardé, la copie supprimée
+        default_storage.delete(saved)
+
+    # Suppression des versions obsolètes de la facture de cette commande
+    directory = invoice_directory(data['order_number'])
+    _, files = default_storage.listdir(directory)
+    for filename in files:
+        path = f"{directory}/{filename}"
+        if path != name:
+            default_storage.delete(path)
+    return name
+
+
+def render_invoice(order_id):
+    """
+    Tâche d'arrière-plan : génère la facture à jour d'une commande
+
+    Returns:
+        str | None: Chemin de stockage, None si la commande n'existe plus
+    """
+    try:
+        order = load_invoice_order(order_id)
+    except Order.DoesNotExist:
+        return None
+    return store_invoice(invoice_data(order))
+
+
+def schedule_invoice(order_id):
+    """Planifie le rendu de la facture après validation de la transaction en cours"""
+    transaction.on_commit(lambda: run_in_background(render_invoice, order_id))
+
+
+def get_invoice(order):
+    """
+    Retourne le chemin de la facture à jour, en la générant si nécessaire
+
+    Cas normal : la facture a déjà été rendue en arrière-plan et seul le calcul
+    de l'empreinte est effectué.
+
+    Args:
+        order (Order): Commande (rechargée avec ses lignes)
+
+    Returns:
+        str: Chemin de stockage de la facture
+    """
+    return store_invoice(invoice_data(load_invoice_order(order.pk)))
+
+
+# ===== EXPORT GROUPÉ DES FACTURES =====
+
+def export_orders(status=None, date_from=None, date_to=None):
+    """
+    Commandes à inclure dans un export groupé de factures
+
+    Args:
+        status (str): Statut des commandes (optionnel)
+        date_from (date): Première date de création incluse (optionnel)
+        date_to (date): Dernière date de création incluse (optionnel)
+
+    Returns:
+        QuerySet: Commandes triées par date de création
+    """
+    orders = orders_with_items()
+    if status:
+        orders = orders.filter(status=status)
+    # Bornes sur created_at (et non created_at__date) pour utiliser l'index
+    if date_from:
+        start = datetime.datetime.combine(date_from, datetime.time.min)
+        orders = orders.filter(created_at__gte=timezone.make_aware(start))
+    if date_to:
+        end = datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min)
+        orders = orders.filter(created_at__lt=timezone.make_aware(end))
+    return orders.order_by('created_at', 'id')
+
+
+def _stored_invoice(name):
+    with default_storage.open(name, 'rb') as file:
+        return file.read()
+
+
+def render_invoices_parallel(datas, workers=None, window=None):
+    """
+    Rend les factures dans un pool de processus, dans l'ordre d'entrée
+
+    Une facture déjà enregistrée pour les mêmes données (voir store_invoice) est
+    relue telle quelle, sans nouveau rendu. Le nombre de rendus en cours est
+    borné (`window`) : la mémoire utilisée ne dépend pas du nombre total de factures.
+
+    Args:
+        datas (iterable): Données de factures (voir invoice_data)
+        workers (int): Nombre de processus (défaut : nombre de CPU)
+        window (int): Nombre maximum de rendus en attente (défaut : 4 par processus)
+
+    Yields:
+        tuple: (données, contenu PDF)
+    """
+    workers = workers or multiprocessing.cpu_count()
+    window = window or workers * 4
+    # 'spawn' : les processus fils n'héritent pas des connexions à la base ;
+    # ils ne sont démarrés qu'au premier rendu effectif
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = deque()
+        for data in datas:
+            name = invoice_name(data)
+            if default_storage.exists(name):
+                pending.append((data, None, name))
+            else:
+                pending.append((data, executor.submit(build_invoice_pdf, data), None))
+            if len(pending) >= window:
+                data, future, name = pending.popleft()
+                yield data, future.result() if future else _stored_invoice(name)
+        while pending:
+            data, future, name = pending.popleft()
+            yield data, future.result() if future else _stored_invoice(name)
+
+
+def iter_invoice_zip(orders, workers=None, progress=None, chunk_size=200):
+    """
+    Produit une archive ZIP des factures, morceau par morceau (pour le streaming)
+
+    Args:
+        orders (QuerySet): Commandes à exporter (voir export_orders)
+        workers (int): Nombre de processus de rendu
+        progress (callable): Appelé avec le nombre de factures déjà écrites (optionnel)
+        chunk_size (int): Nombre de commandes lues par requête
+
+    Yields:
+        bytes: Morceaux successifs de l'archive ZIP
+    """
+    datas = (invoice_data(order) for order in orders.iterator(chunk_size=chunk_size))
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for count, (data, pdf) in enumerate(render_invoices_parallel(datas, workers), start=1):
+            archive.writestr(f"facture_{data['order_number']}.pdf", pdf)
+            if progress:
+                progress(count)
+            yield stream.pop()
+    yield stream.pop()
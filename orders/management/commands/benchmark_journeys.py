@@ -0,0 +1,109 @@
+# orders/management/commands/benchmark_journeys.py
+# Mesure du débit et des latences des parcours principaux (voir pharmacy_online/benchmark.py)
+# S'exécute dans une base de test créée puis détruite pour l'occasion, comme les tests :
+# la base configurée n'est pas modifiée. Sous SQLite, la base de test est un fichier
+# en mode WAL ; SQLite n'accepte qu'une écriture à la fois : avec --concurrency > 1,
+# les parcours qui écrivent (panier, commande) y comptent des erreurs « database is
+# locked ». Mesurer la concurrence sur PostgreSQL.
+#
+# Exemple de comparaison entre deux commits :
+#   python manage.py benchmark_journeys --output avant.json
+#   git checkout <commit> && python manage.py benchmark_journeys --compare avant.json
+
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from pharmacy_online.benchmark import (
+    JOURNEYS, benchmark_database, compare_results, run_journey, seed_benchmark_data,
+)
+
+
+def current_commit():
+    """Commit courant du dépôt (None hors d'un dépôt git)"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Mesure les parcours utilisateurs principaux sur un jeu de données synthétique (JSON)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20, help="Nombre de catégories")
+        parser.add_argument('--medicines', type=int, default=2000, help="Nombre de médicaments")
+        parser.add_argument('--users', type=int, default=50, help="Nombre de clients")
+        parser.add_argument('--orders', type=int, default=5000, help="Commandes historiques")
+        parser.add_argument('--requests', type=int, default=200, help="Requêtes mesurées par parcours")
+        parser.add_argument('--concurrency', type=int, default=4, help="Clients simultanés")
+        parser.add_argument('--warmup', type=int, default=10, help="Requêtes non mesurées par parcours")
+        parser.add_argument(
+            '--journeys', default=','.join(JOURNEYS),
+            help=f"Parcours mesurés, séparés par des virgules ({', '.join(JOURNEYS)})",
+        )
+        parser.add_argument('--seed', type=int, default=42, help="Graine du générateur aléatoire")
+        parser.add_argument('--output', help="Fichier JSON des résultats (défaut : sortie standard)")
+        parser.add_argument('--compare', help="Résultats JSON de référence à comparer")
+
+    def handle(self, *args, **options):
+        journeys = [name.strip() for name in options['journeys'].split(',') if name.strip()]
+        unknown = set(journeys) - set(JOURNEYS)
+        if unknown:
+            raise CommandError(f"Parcours inconnu(s) : {', '.join(sorted(unknown))}")
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        with benchmark_database():
+            results = self.run(journeys, options)
+
+        output = json.dumps(results, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        for row in results['journeys']:
+            self.stderr.write(
+                f"{row['journey']:<20} {row['throughput_rps'] or 0:>8.1f} req/s  "
+                f"p50 {row['p50_ms'] or 0:>8.2f} ms  p99 {row['p99_ms'] or 0:>8.2f} ms  "
+                f"erreurs {row['errors']}"
+            )
+        if baseline:
+            self.stderr.write(f"Comparaison avec {baseline.get('commit') or options['compare']} (actuel / référence) :")
+            for row in compare_results(baseline, results):
+                self.stderr.write(
+                    f"{row['journey']:<20} p50 x{row['p50_ms_ratio']}  p99 x{row['p99_ms_ratio']}  "
+                    f"débit x{row['throughput_rps_ratio']}"
+                )
+
+    def run(self, journeys, options):
+        data = seed_benchmark_data(
+            categories=options['categories'], medicines=options['medicines'],
+            users=max(options['users'], options['concurrency']), orders=options['orders'],
+            seed=options['seed'],
+        )
+        rows = []
+        for name in journeys:
+            if options['warmup']:
+                run_journey(name, data, options['warmup'], 1, options['seed'])
+            rows.append(run_journey(name, data, options['requests'], options['concurrency'], options['seed']))
+        return {
+            'commit': current_commit(),
+            'date': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'options': {
+                name: options[name]
+                for name in ('requests', 'concurrency', 'warmup', 'seed')
+            },
+            'dataset': data.counts(),
+            'journeys': rows,
+        }
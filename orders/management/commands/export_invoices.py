@@ -0,0 +1,56 @@
+# orders/management/commands/export_invoices.py
+# Export groupé des factures (ex: clôture mensuelle) dans une archive ZIP
+# Rendu en parallèle dans un pool de processus, écriture en streaming
+
+import datetime
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.invoices import export_orders, iter_invoice_zip
+from orders.models import Order
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Date invalide (format AAAA-MM-JJ attendu) : {value}")
+
+
+class Command(BaseCommand):
+    help = "Exporte les factures des commandes filtrées dans une archive ZIP"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Chemin de l'archive ZIP à créer")
+        parser.add_argument('--status', choices=dict(Order.STATUS_CHOICES), help="Statut des commandes")
+        parser.add_argument('--from', dest='date_from', type=parse_date, help="Date de début (AAAA-MM-JJ)")
+        parser.add_argument('--to', dest='date_to', type=parse_date, help="Date de fin incluse (AAAA-MM-JJ)")
+        parser.add_argument('--workers', type=int, default=None, help="Nombre de processus de rendu")
+
+    def handle(self, *args, **options):
+        orders = export_orders(options['status'], options['date_from'], options['date_to'])
+        total = orders.count()
+        if not total:
+            raise CommandError("Aucune commande ne correspond aux filtres.")
+
+        started = time.perf_counter()
+
+        def progress(count):
+            # Compteur de progression sur une seule ligne (stderr)
+            if count % 50 == 0 or count == total:
+                elapsed = time.perf_counter() - started
+                sys.stderr.write(f"\r{count}/{total} factures ({count / elapsed:.1f} commandes/s)")
+                sys.stderr.flush()
+
+        with open(options['output'], 'wb') as output:
+            for chunk in iter_invoice_zip(orders, options['workers'], progress):
+                output.write(chunk)
+        sys.stderr.write('\n')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} factures exportées dans {options['output']} en {elapsed:.1f} s "
+            f"({total / elapsed:.1f} commandes/s)"
+        ))
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0003_order_console_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('pending', 'En attente'), ('confirmed', 'Confirmée'), ('ready', 'Prête à récupérer'), ('completed', 'Terminée'), ('cancelled', 'Annulée')], max_length=20)),
+                ('to_status', models.CharField(choices=[('pending', 'En attente'), ('confirmed', 'Confirmée'), ('ready', 'Prête à récupérer'), ('completed', 'Terminée'), ('cancelled', 'Annulée')], max_length=20)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to='orders.order')),
+            ],
+            options={
+                'ordering': ['-changed_at'],
+            },
+        ),
+    ]
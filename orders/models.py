@@ -32,8 +32,12 @@ class OrderItem(models.Model):
 # Modèles de données pour la gestion des commandes et du panier
 # Définit la structure des commandes, articles et panier d'achat
 
+from decimal import Decimal
 from django.db import models
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils.functional import cached_property
 from products.models import Medicine
 import uuid
 
@@ -57,6 +61,16 @@ class Order(models.Model):
         ('cancelled', 'Annulée'),            # Commande annulée (client ou personnel)
     ]
 
+    # Transitions de statut autorisées (voir orders/transitions.py)
+    # Une commande terminée ou annulée ne change plus de statut
+    ALLOWED_TRANSITIONS = {
+        'pending': ['confirmed', 'cancelled'],
+        'confirmed': ['ready', 'cancelled'],
+        'ready': ['completed', 'cancelled'],
+        'completed': [],
+        'cancelled': [],
+    }
+
     # ===== INFORMATIONS DE BASE =====
     
     # Numéro unique de commande généré automatiquement
@@ -98,6 +112,14 @@ class Order(models.Model):
     class Meta:
         # Tri par défaut : commandes les plus récentes en premier
         ordering = ['-created_at']
+        indexes = [
+            # Pagination par curseur (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+            # Console du personnel : filtre par statut trié par date
+            models.Index(fields=['status', 'created_at']),
+            # Historique des commandes d'un client trié par date
+            models.Index(fields=['user', 'created_at']),
+        ]
 
     def save(self, *args, **kwargs):
         """
@@ -123,6 +145,38 @@ class Order(models.Model):
         return reverse('orders:order_detail', kwargs={'pk': self.pk})
 
 
+class OrderStatusChange(models.Model):
+    """
+    Historique (audit) des changements de statut des commandes
+    
+    Une ligne par commande et par transition, écrite en masse par orders/transitions.py
+    """
+    
+    # Commande concernée
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='status_changes'        # order.status_changes.all()
+    )
+    
+    # Statuts avant et après la transition
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    
+    # Membre du personnel à l'origine du changement
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    # Date et heure du changement
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-changed_at']
+
+    def __str__(self):
+        """Représentation textuelle du changement de statut"""
+        return f"{self.order_id}: {self.from_status} → {self.to_status}"
+
+
 class OrderItem(models.Model):
     """
     Modèle pour les articles individuels d'une commande
@@ -162,6 +216,26 @@ class OrderItem(models.Model):
         return self.quantity * self.price
 
 
+class CartQuerySet(models.QuerySet):
+    """QuerySet des paniers avec calcul des totaux côté base de données"""
+
+    def with_totals(self):
+        """
+        Annote chaque panier avec son nombre d'articles et son montant total
+
+        Utilisé par les listes de paniers (ex: CartAdmin) pour éviter une
+        requête par panier
+        """
+        return self.annotate(
+            annotated_item_count=Coalesce(Sum('items__quantity'), 0),
+            annotated_total_amount=Coalesce(
+                Sum(F('items__quantity') * F('items__medicine__price'), output_field=DecimalField()),
+                Decimal('0'),
+                output_field=DecimalField(),
+            ),
+        )
+
+
 class Cart(models.Model):
     """
     Modèle pour le panier d'achat d'un utilisateur
@@ -185,12 +259,36 @@ class Cart(models.Model):
     # Date et heure de dernière modification
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         """Représentation textuelle du panier"""
         return f"Panier de {self.user.username}"
 
     # ===== PROPRIÉTÉS CALCULÉES =====
-    
+
+    @cached_property
+    def summary(self):
+        """
+        Calcule le nombre d'articles et le montant total en une seule requête agrégée
+
+        Réutilise les annotations de CartQuerySet.with_totals() si elles sont présentes.
+        Le résultat est mis en cache sur l'instance : recharger le panier après
+        l'avoir modifié.
+
+        Returns:
+            dict: {'item_count': int, 'total_amount': Decimal}
+        """
+        if hasattr(self, 'annotated_item_count'):
+            return {
+                'item_count': self.annotated_item_count,
+                'total_amount': self.annotated_total_amount,
+            }
+        return Cart.objects.filter(pk=self.pk).with_totals().values(
+            item_count=F('annotated_item_count'),
+            total_amount=F('annotated_total_amount'),
+        ).get()
+
     @property
     def total_amount(self):
         """
@@ -199,7 +297,7 @@ class Cart(models.Model):
         Returns:
             Decimal: Montant total de tous les articles du panier
         """
-        return sum(item.total_price for item in self.items.all())
+        return self.summary['total_amount']
 
     @property
     def item_count(self):
@@ -209,7 +307,7 @@ class Cart(models.Model):
         Returns:
             int: Nombre total d'articles (somme des quantités)
         """
-        return sum(item.quantity for item in self.items.all())
+        return self.summary['item_count']
 
 
 class CartItem(models.Model):
@@ -0,0 +1,74 @@
+# orders/queries.py
+# Requêtes de lecture des commandes partagées par les vues et les factures
+# Nombre de requêtes constant, quel que soit le nombre de commandes ou de lignes
+
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderItem
+
+
+def orders_with_items(queryset=None):
+    """
+    Commandes chargées avec leur client, leurs lignes et les médicaments des lignes
+
+    - select_related('user') : client dans la même requête que la commande
+    - prefetch des lignes avec leur médicament : une seule requête pour toutes les lignes
+    - item_count : nombre de lignes calculé par la base (sous-requête corrélée,
+      évaluée seulement pour les commandes renvoyées, sans GROUP BY global)
+
+    Args:
+        queryset (QuerySet): Commandes de départ (défaut : toutes)
+
+    Returns:
+        QuerySet: Commandes prêtes pour l'affichage (2 requêtes au total)
+    """
+    if queryset is None:
+        queryset = Order.objects.all()
+    return (
+        queryset.select_related('user')
+        .prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('medicine').order_by('id'))
+        )
+        .annotate(item_count=order_item_count())
+    )
+
+
+def order_item_count():
+    """Expression : nombre de lignes de la commande (sous-requête corrélée)"""
+    item_count = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return Coalesce(Subquery(item_count, output_field=IntegerField()), 0)
+
+
+def filter_admin_orders(orders, status=None, search=''):
+    """
+    Filtres de la liste des commandes du personnel (liste et export)
+
+    Args:
+        status (str): Statut des commandes, index (status, created_at) (optionnel)
+        search (str): Début du numéro de commande, index unique (optionnel)
+    """
+    if status:
+        orders = orders.filter(status=status)
+    if search:
+        orders = orders.filter(order_number__startswith=search)
+    return orders
+
+
+def order_status_counts():
+    """
+    Nombre de commandes par statut, en une seule requête groupée
+
+    Returns:
+        dict: {statut: nombre}, tous les statuts présents (0 si aucune commande)
+    """
+    counts = dict.fromkeys(dict(Order.STATUS_CHOICES), 0)
+    rows = Order.objects.order_by().values('status').annotate(count=Count('id'))
+    counts.update({row['status']: row['count'] for row in rows})
+    return counts
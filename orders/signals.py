@@ -0,0 +1,19 @@
+# orders/signals.py
+# Signaux des commandes : rendu des factures en arrière-plan
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .invoices import schedule_invoice
+from .models import Order
+
+
+@receiver(post_save, sender=Order)
+def render_invoice_on_save(sender, instance, **kwargs):
+    """
+    (Re)génère la facture à la création de la commande et à chaque changement
+
+    Le rendu a lieu après la validation de la transaction : les lignes de la
+    commande créées dans la même transaction sont donc présentes.
+    """
+    schedule_invoice(instance.pk)
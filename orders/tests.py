@@ -1,3 +1,325 @@
-from django.test import TestCase
+import datetime
+import io
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventory.models import StockMovement
+from inventory.reservations import hold_stock
+from products.models import Category, Medicine
+from .checkout import InsufficientStockError, place_order
+from .invoices import export_orders, get_invoice, iter_invoice_zip
+from .models import Cart, CartItem, Order, OrderStatusChange
+from .queries import order_status_counts, orders_with_items
+from .transitions import transition_orders
+from .utils import build_invoice_pdf, invoice_data
+
+
+def make_medicine(category, name, stock, price='5.00'):
+    return Medicine.objects.create(
+        name=name,
+        description=f"Description de {name}",
+        category=category,
+        price=Decimal(price),
+        expiry_date=datetime.date.today() + datetime.timedelta(days=365),
+        stock_quantity=stock,
+    )
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('client', password='secret')
+        self.category = Category.objects.create(name='Antidouleurs')
+        self.doliprane = make_medicine(self.category, 'Doliprane', stock=10, price='2.50')
+        self.ibuprofene = make_medicine(self.category, 'Ibuprofène', stock=3, price='4.00')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def test_creates_order_and_decrements_stock(self):
+        CartItem.objects.create(cart=self.cart, medicine=self.doliprane, quantity=4)
+        CartItem.objects.create(cart=self.cart, medicine=self.ibuprofene, quantity=3)
+
+        order = place_order(self.cart, self.user, notes='Allergie pénicilline')
+
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.total_amount, Decimal('22.00'))
+        self.doliprane.refresh_from_db()
+        self.ibuprofene.refresh_from_db()
+        self.assertEqual(self.doliprane.stock_quantity, 6)
+        self.assertEqual(self.ibuprofene.stock_quantity, 0)
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(movement_type='out').values_list('quantity', flat=True)),
+            [3, 4],
+        )
+
+    def test_other_carts_holds_are_not_sold(self):
+        CartItem.objects.create(cart=self.cart, medicine=self.ibuprofene, quantity=2)
+        other_cart = Cart.objects.create(user=User.objects.create_user('autre'))
+        hold_stock(other_cart, self.ibuprofene, 2)
+
+        with self.assertRaises(InsufficientStockError):
+            place_order(self.cart, self.user)
+
+    def test_short_line_rolls_back_everything(self):
+        CartItem.objects.create(cart=self.cart, medicine=self.doliprane, quantity=4)
+        CartItem.objects.create(cart=self.cart, medicine=self.ibuprofene, quantity=5)
+
+        with self.assertRaises(InsufficientStockError) as ctx:
+            place_order(self.cart, self.user)
+
+        self.assertEqual([m.pk for m, _, _ in ctx.exception.shortages], [self.ibuprofene.pk])
+        self.doliprane.refresh_from_db()
+        self.assertEqual(self.doliprane.stock_quantity, 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(Cart.objects.filter(pk=self.cart.pk).exists())
+
+    def _count_checkout_queries(self, user, lines):
+        cart = Cart.objects.create(user=user)
+        for i in range(lines):
+            medicine = make_medicine(self.category, f'{user.username} {i}', stock=50)
+            CartItem.objects.create(cart=cart, medicine=medicine, quantity=2)
+        with CaptureQueriesContext(connection) as ctx:
+            place_order(cart, user)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        small = self._count_checkout_queries(User.objects.create_user('petit'), 1)
+        large = self._count_checkout_queries(User.objects.create_user('grand'), 25)
+        self.assertEqual(small, large)
+
+    def test_checkout_view_redirects_to_cart_when_stock_is_short(self):
+        CartItem.objects.create(cart=self.cart, medicine=self.ibuprofene, quantity=3)
+        Medicine.objects.filter(pk=self.ibuprofene.pk).update(stock_quantity=1)
+        self.client.force_login(self.user)
+
+        response = self.client.post('/orders/checkout/')
+
+        self.assertRedirects(response, '/orders/cart/', fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('client', password='secret')
+        self.category = Category.objects.create(name='Vitamines')
+        self.cart = Cart.objects.create(user=self.user)
+        for i in range(10):
+            medicine = make_medicine(self.category, f'Vitamine {i}', stock=20, price='1.50')
+            CartItem.objects.create(cart=self.cart, medicine=medicine, quantity=i + 1)
+
+    def test_totals_use_a_single_aggregate_query(self):
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.item_count, 55)
+            self.assertEqual(cart.total_amount, Decimal('82.50'))
+
+    def test_with_totals_annotates_a_list_of_carts(self):
+        Cart.objects.create(user=User.objects.create_user('vide'))
+        with self.assertNumQueries(1):
+            totals = {cart.user_id: (cart.item_count, cart.total_amount)
+                      for cart in Cart.objects.with_totals()}
+        self.assertEqual(totals[self.user.pk], (55, Decimal('82.50')))
+        self.assertEqual(len(totals), 2)
+
+
+@override_settings(BACKGROUND_TASKS_MODE='sync')
+class InvoiceStoreTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = User.objects.create_user('client', password='secret')
+        category = Category.objects.create(name='Antidouleurs')
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, medicine=make_medicine(category, 'Doliprane', 5), quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = place_order(cart, self.user)
+
+    def test_invoice_is_rendered_once_when_the_order_is_created(self):
+        name = get_invoice(self.order)
+        self.assertTrue(default_storage.exists(name))
+
+        with mock.patch('orders.invoices.build_invoice_pdf') as build:
+            self.assertEqual(get_invoice(self.order), name)
+        build.assert_not_called()
+
+    def test_status_change_replaces_the_stored_invoice(self):
+        old_name = get_invoice(self.order)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.status = 'confirmed'
+            self.order.save()
+
+        new_name = get_invoice(self.order)
+        self.assertNotEqual(new_name, old_name)
+        self.assertFalse(default_storage.exists(old_name))
+        directory = f'invoices/{self.order.order_number}'
+        self.assertEqual(default_storage.listdir(directory)[1], [new_name.rsplit('/', 1)[1]])
+
+    def test_concurrent_render_of_the_same_data_keeps_one_file(self):
+        name = get_invoice(self.order)
+        default_storage.delete(name)
+
+        def render_meanwhile(data):
+            # L'autre rendu (tâche post_save) enregistre la même facture pendant celui-ci
+            pdf = build_invoice_pdf(data)
+            default_storage.save(name, ContentFile(pdf))
+            return pdf
+
+        with mock.patch('orders.invoices.build_invoice_pdf', side_effect=render_meanwhile):
+            self.assertEqual(get_invoice(self.order), name)
+        directory = f'invoices/{self.order.order_number}'
+        self.assertEqual(default_storage.listdir(directory)[1], [name.rsplit('/', 1)[1]])
+
+    def test_download_streams_the_stored_file(self):
+        self.client.force_login(self.user)
+        response = self.client.get(f'/orders/invoice/{self.order.pk}/')
+
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+class InvoiceExportTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Antidouleurs')
+        medicine = make_medicine(category, 'Doliprane', 100)
+        self.orders = []
+        for i in range(3):
+            user = User.objects.create_user(f'client{i}')
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, medicine=medicine, quantity=i + 1)
+            self.orders.append(place_order(cart, user))
+        Order.objects.filter(pk=self.orders[0].pk).update(status='cancelled')
+
+    def test_zip_contains_one_invoice_per_filtered_order(self):
+        seen = []
+        archive = b''.join(iter_invoice_zip(export_orders(status='pending'), workers=2, progress=seen.append))
+
+        names = zipfile.ZipFile(io.BytesIO(archive)).namelist()
+        self.assertEqual(names, [f"facture_{order.order_number}.pdf" for order in self.orders[1:]])
+        self.assertEqual(seen, [1, 2])
+
+    def test_zip_reuses_the_stored_invoices(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        for order in self.orders[1:]:
+            name = get_invoice(order)
+            default_storage.delete(name)
+            default_storage.save(name, ContentFile(b'%PDF stored ' + order.order_number.encode()))
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(iter_invoice_zip(export_orders(status='pending'), workers=1))))
+        for order in self.orders[1:]:
+            self.assertEqual(archive.read(f"facture_{order.order_number}.pdf"),
+                             b'%PDF stored ' + order.order_number.encode())
+
+    def test_order_list_export_honours_the_status_filter(self):
+        self.client.force_login(User.objects.create_user('pharmacien', is_staff=True))
+        response = self.client.get(reverse('orders:export_order_list'), {'status': 'pending'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'Numéro;Date;Statut;Client;Email;Articles;Montant')
+        self.assertEqual(
+            sorted(line.split(';')[0] for line in lines[1:]),
+            sorted(order.order_number for order in self.orders[1:]),
+        )
+        self.assertTrue(all(line.split(';')[5] == '1' for line in lines[1:]))
+
+    def test_date_filter_bounds_are_inclusive(self):
+        today = datetime.date.today()
+        self.assertEqual(export_orders(date_from=today, date_to=today).count(), 3)
+        self.assertEqual(export_orders(date_to=today - datetime.timedelta(days=1)).count(), 0)
+
+
+class OrderReadPathTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('client')
+        self.category = Category.objects.create(name='Antidouleurs')
+        self.medicines = [make_medicine(self.category, f'Médicament {i}', 1000) for i in range(4)]
+
+    def _create_orders(self, count, lines):
+        for _ in range(count):
+            cart = Cart.objects.create(user=self.user)
+            for medicine in self.medicines[:lines]:
+                CartItem.objects.create(cart=cart, medicine=medicine, quantity=1)
+            place_order(cart, self.user)
+
+    def _count_read_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            for order in orders_with_items(Order.objects.filter(user=self.user)):
+                invoice_data(order)
+                self.assertEqual(order.item_count, len(order.items.all()))
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_fixed_whatever_the_number_of_orders_and_items(self):
+        self._create_orders(1, lines=1)
+        self.assertEqual(self._count_read_queries(), 2)
+
+        self._create_orders(10, lines=4)
+        self.assertEqual(self._count_read_queries(), 2)
+
+    def test_status_counts_come_from_one_grouped_query(self):
+        self._create_orders(3, lines=1)
+        Order.objects.filter(pk=Order.objects.first().pk).update(status='ready')
+
+        with self.assertNumQueries(1):
+            counts = order_status_counts()
+        self.assertEqual(counts['pending'], 2)
+        self.assertEqual(counts['ready'], 1)
+        self.assertEqual(counts['cancelled'], 0)
+
+
+@override_settings(BACKGROUND_TASKS_MODE='sync')
+class OrderTransitionTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.staff = User.objects.create_user('pharmacien', is_staff=True)
+        category = Category.objects.create(name='Antidouleurs')
+        self.medicine = make_medicine(category, 'Doliprane', 100)
+        self.orders = []
+        for i in range(5):
+            user = User.objects.create_user(f'client{i}', email=f'client{i}@example.com')
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, medicine=self.medicine, quantity=2)
+            self.orders.append(place_order(cart, user))
+        self.ids = [order.pk for order in self.orders]
+
+    def test_only_allowed_transitions_are_applied(self):
+        Order.objects.filter(pk=self.ids[0]).update(status='completed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            changed = transition_orders(self.ids, 'confirmed', self.staff)
+            # E-mails envoyés après validation seulement
+            self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(sorted(order.pk for order in changed), self.ids[1:])
+        self.assertEqual(Order.objects.filter(status='confirmed').count(), 4)
+        self.assertEqual(OrderStatusChange.objects.filter(to_status='confirmed').count(), 4)
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_query_count_does_not_grow_with_the_number_of_orders(self):
+        with CaptureQueriesContext(connection) as one:
+            transition_orders(self.ids[:1], 'confirmed', self.staff, notify=False)
+        with CaptureQueriesContext(connection) as four:
+            transition_orders(self.ids[1:], 'confirmed', self.staff, notify=False)
+        self.assertEqual(len(one.captured_queries), len(four.captured_queries))
+
+    def test_cancellation_returns_stock_with_movements(self):
+        transition_orders(self.ids[:3], 'cancelled', self.staff, notify=False)
+
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock_quantity, 100 - 2 * 2)
+        self.assertEqual(StockMovement.objects.filter(movement_type='in').count(), 3)
+        self.assertEqual(transition_orders(self.ids[:3], 'confirmed', self.staff), [])
@@ -0,0 +1,189 @@
+# orders/transitions.py
+# Changements de statut des commandes, unitaires ou en masse
+# Un seul UPDATE pour toutes les commandes, historique et remises en stock en bulk_create
+
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.utils import timezone
+
+from inventory.models import StockMovement
+from inventory.lots import expired_allocations, restore_order_items
+from inventory.utils import increase_stock
+from pharmacy_online.tasks import run_in_background
+from .invoices import schedule_invoice
+from .models import Order, OrderItem, OrderStatusChange
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidTransitionError(Exception):
+    """Levée quand le statut demandé n'existe pas"""
+
+
+def source_statuses(new_status):
+    """Statuts depuis lesquels une commande peut passer au statut `new_status`"""
+    return [
+        status for status, targets in Order.ALLOWED_TRANSITIONS.items()
+        if new_status in targets
+    ]
+
+
+def transition_orders(order_ids, new_status, user, notify=True):
+    """
+    Fait passer un ensemble de commandes au statut `new_status`
+
+    Les commandes dont le statut actuel n'autorise pas la transition sont ignorées.
+    Nombre de requêtes constant quel que soit le nombre de commandes :
+    1. Verrouillage des commandes éligibles (SELECT ... FOR UPDATE, tri par pk)
+    2. Un seul UPDATE ... WHERE id IN (...) AND status IN (<statuts attendus>)
+    3. Historique des changements avec bulk_create
+    4. Pour une annulation : remise en stock en un UPDATE et mouvements en bulk_create
+
+    Après validation : factures régénérées en arrière-plan et e-mails envoyés
+    aux clients sur une seule connexion SMTP.
+
+    Args:
+        order_ids (iterable): Identifiants des commandes
+        new_status (str): Statut cible
+        user (User): Membre du personnel à l'origine du changement
+        notify (bool): Prévenir les clients par e-mail
+
+    Returns:
+        list: Commandes effectivement modifiées (statut déjà mis à jour)
+
+    Raises:
+        InvalidTransitionError: Si le statut cible est inconnu
+    """
+    if new_status not in Order.ALLOWED_TRANSITIONS:
+        raise InvalidTransitionError(f"Statut inconnu : {new_status}")
+
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update(of=('self',))
+            .filter(pk__in=list(order_ids), status__in=source_statuses(new_status))
+            .select_related('user')
+            .order_by('pk')
+        )
+        if not orders:
+            return []
+
+        ids = [order.pk for order in orders]
+        now = timezone.now()
+        Order.objects.filter(pk__in=ids, status__in=source_statuses(new_status)).update(
+            status=new_status, updated_at=now
+        )
+
+        OrderStatusChange.objects.bulk_create([
+            OrderStatusChange(
+                order=order, from_status=order.status, to_status=new_status, changed_by=user
+            )
+            for order in orders
+        ])
+
+        for order in orders:
+            order.status = new_status
+            order.updated_at = now
+
+        if new_status == 'cancelled':
+            restock_cancelled_orders(orders, user)
+
+        for order in orders:
+            schedule_invoice(order.pk)
+
+    if notify:
+        notify_customers(orders)
+    return orders
+
+
+def restock_cancelled_orders(orders, user):
+    """
+    Remet en stock les médicaments des commandes annulées
+
+    Les quantités retournent dans les lots d'où elles avaient été prélevées.
+    Un seul UPDATE pour tous les médicaments (voir inventory.utils.increase_stock)
+    et un mouvement d'entrée par ligne de commande, insérés avec bulk_create.
+    Les unités issues d'un lot périmé depuis ne sont pas remises en vente : leur
+    entrée est suivie d'une sortie « Périmé », comme un retrait du balayage.
+    """
+    by_number = {order.pk: order.order_number for order in orders}
+    items = list(
+        OrderItem.objects.filter(order_id__in=by_number)
+        .values_list('pk', 'order_id', 'medicine_id', 'quantity')
+    )
+    if not items:
+        return
+
+    today = timezone.localdate()
+    item_by_id = {item_id: (order_id, medicine_id) for item_id, order_id, medicine_id, _ in items}
+    expired = expired_allocations(list(item_by_id), today)
+
+    totals = defaultdict(int)
+    for _, _, medicine_id, quantity in items:
+        totals[medicine_id] += quantity
+    for item_id, _, _, quantity in expired:
+        totals[item_by_id[item_id][1]] -= quantity
+    totals = {medicine_id: quantity for medicine_id, quantity in totals.items() if quantity}
+
+    if totals:
+        increase_stock(totals, lambda: restore_order_items([
+            (item_id, medicine_id, quantity) for item_id, _, medicine_id, quantity in items
+        ], today))
+
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            medicine_id=medicine_id,
+            movement_type='in',
+            quantity=quantity,
+            reason=f"Annulation commande {by_number[order_id]}",
+            created_by=user,
+        )
+        for _, order_id, medicine_id, quantity in items
+    ] + [
+        StockMovement(
+            medicine_id=item_by_id[item_id][1],
+            movement_type='out',
+            quantity=quantity,
+            reason=(
+                f"{StockMovement.EXPIRED_REASON} - lot {lot_number or '-'} "
+                f"(exp. {expiry:%d/%m/%Y}) - annulation commande {by_number[item_by_id[item_id][0]]}"
+            ),
+            created_by=user,
+        )
+        for item_id, lot_number, expiry, quantity in expired
+    ])
+
+
+def notify_customers(orders):
+    """
+    Planifie l'e-mail de changement de statut de chaque client, en un seul envoi groupé
+
+    L'envoi SMTP a lieu en arrière-plan, après validation de la transaction en cours :
+    sa latence ne s'ajoute pas à celle de la requête du pharmacien.
+    """
+    messages = [
+        (
+            f"Commande {order.order_number} : {order.get_status_display()}",
+            f"Bonjour {order.user.first_name or order.user.username},\n\n"
+            f"Votre commande {order.order_number} est maintenant : "
+            f"{order.get_status_display()}.\n\nPharmacie en ligne",
+            settings.DEFAULT_FROM_EMAIL,
+            [order.user.email],
+        )
+        for order in orders
+        if order.user.email
+    ]
+    if messages:
+        transaction.on_commit(lambda: run_in_background(send_status_emails, messages))
+
+
+def send_status_emails(messages):
+    """Envoie les notifications de statut (tâche d'arrière-plan)"""
+    try:
+        send_mass_mail(messages, fail_silently=False)
+    except Exception:
+        # Un échec d'envoi ne doit pas annuler des changements déjà validés
+        logger.exception("Échec de l'envoi des notifications de statut")
@@ -49,5 +49,14 @@ urlpatterns = [
     # Route pour modifier le statut d'une commande (ex: confirmer, préparer, etc.)
     # <int:order_id> capture l'ID de la commande à modifier
     path('admin/update/<int:order_id>/', views.update_order_status, name='update_order_status'),
+
+    # Route pour modifier en une fois le statut de plusieurs commandes (cases cochées)
+    path('admin/bulk-update/', views.bulk_update_order_status, name='bulk_update_order_status'),
+
+    # Route pour exporter la liste filtrée des commandes en CSV ou XLSX (?format=xlsx)
+    path('admin/export/', views.export_order_list, name='export_order_list'),
+
+    # Route pour l'export groupé des factures (ZIP) selon le statut et la période
+    path('admin/invoices/export/', views.export_invoices, name='export_invoices'),
 >>>>>>> develop
 ]
\ No newline at end of file
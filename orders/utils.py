@@ -8,13 +8,84 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from io import BytesIO
-import datetime
+from functools import lru_cache
+
+from pharmacy_online.metrics import INVOICE_PDF_SECONDS
+
+
+@lru_cache(maxsize=1)
+def _invoice_styles():
+    """
+    Styles ReportLab des factures, construits une seule fois par processus
+
+    Returns:
+        tuple: (feuille de styles par défaut, style du titre principal)
+    """
+    # Récupération des styles par défaut de ReportLab
+    styles = getSampleStyleSheet()
+    
+    # Style personnalisé pour le titre principal
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,                    # Taille de police
+        spaceAfter=30,                  # Espace après le titre
+        textColor=colors.darkblue,      # Couleur du texte
+        alignment=1                     # Centrage (1 = centre)
+    )
+    return styles, title_style
+
+
+def invoice_data(order):
+    """
+    Extrait d'une commande les données affichées sur sa facture
+
+    Le résultat ne contient que des types simples : il peut être haché (détection
+    des factures déjà générées) ou envoyé à un autre processus pour le rendu.
+
+    Args:
+        order (Order): Commande (idéalement chargée avec ses lignes et médicaments)
+
+    Returns:
+        dict: Données de la facture
+    """
+    return {
+        'order_number': order.order_number,
+        'date': order.created_at.strftime('%d/%m/%Y %H:%M'),
+        'customer': f"{order.user.first_name} {order.user.last_name}",
+        'email': order.user.email,
+        'status': order.get_status_display(),
+        'items': [
+            [item.medicine.name, item.quantity, str(item.price), str(item.total_price)]
+            for item in order.items.all()
+        ],
+        'total_amount': str(order.total_amount),
+    }
 
 
 def generate_invoice_pdf(order):
     """
     Génère une facture PDF professionnelle pour une commande
     
+    Args:
+        order (Order): L'objet commande pour lequel générer la facture
+        
+    Returns:
+        bytes: Contenu binaire du PDF généré
+        
+    Utilisation typique :
+    - Téléchargement par le client
+    - Impression pour les archives
+    - Envoi par email
+    """
+    return build_invoice_pdf(invoice_data(order))
+
+
+@INVOICE_PDF_SECONDS.time()
+def build_invoice_pdf(data):
+    """
+    Construit le PDF d'une facture à partir des données de invoice_data()
+    
     Cette fonction utilise ReportLab pour créer un PDF structuré contenant :
     1. En-tête avec le nom de la pharmacie
     2. Informations de la commande (numéro, date, client)
@@ -22,17 +93,14 @@ def generate_invoice_pdf(order):
     4. Total de la commande
     5. Instructions de récupération
     6. Pied de page
+
+    N'accède pas à la base de données : peut s'exécuter dans un processus séparé.
     
     Args:
-        order (Order): L'objet commande pour lequel générer la facture
+        data (dict): Données de la facture
         
     Returns:
         bytes: Contenu binaire du PDF généré
-        
-    Utilisation typique :
-    - Téléchargement par le client
-    - Impression pour les archives
-    - Envoi par email
     """
     # Création d'un buffer en mémoire pour stocker le PDF
     buffer = BytesIO()
@@ -42,18 +110,7 @@ def generate_invoice_pdf(order):
 
     # ===== CONFIGURATION DES STYLES =====
     
-    # Récupération des styles par défaut de ReportLab
-    styles = getSampleStyleSheet()
-    
-    # Style personnalisé pour le titre principal
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,                    # Taille de police
-        spaceAfter=30,                  # Espace après le titre
-        textColor=colors.darkblue,      # Couleur du texte
-        alignment=1                     # Centrage (1 = centre)
-    )
+    styles, title_style = _invoice_styles()
 
     # ===== CONSTRUCTION DU CONTENU =====
     
@@ -68,11 +125,11 @@ def generate_invoice_pdf(order):
     
     # Tableau des informations de base de la commande
     order_info = [
-        ['Numéro de commande:', order.order_number],
-        ['Date:', order.created_at.strftime('%d/%m/%Y %H:%M')],
-        ['Client:', f"{order.user.first_name} {order.user.last_name}"],
-        ['Email:', order.user.email],
-        ['Statut:', order.get_status_display()],
+        ['Numéro de commande:', data['order_number']],
+        ['Date:', data['date']],
+        ['Client:', data['customer']],
+        ['Email:', data['email']],
+        ['Statut:', data['status']],
     ]
 
     # Création du tableau avec largeurs de colonnes personnalisées
@@ -100,16 +157,16 @@ def generate_invoice_pdf(order):
     items_data = [['Médicament', 'Quantité', 'Prix unitaire', 'Total']]
 
     # Ajout de chaque article de la commande
-    for item in order.items.all():
+    for name, quantity, price, total_price in data['items']:
         items_data.append([
-            item.medicine.name,                    # Nom du médicament
-            str(item.quantity),                    # Quantité commandée
-            f"{item.price}€",                     # Prix unitaire
-            f"{item.total_price}€"                # Prix total pour cet article
+            name,                                  # Nom du médicament
+            str(quantity),                         # Quantité commandée
+            f"{price}€",                          # Prix unitaire
+            f"{total_price}€"                     # Prix total pour cet article
         ])
 
     # Ligne de total général de la commande
-    items_data.append(['', '', 'TOTAL:', f"{order.total_amount}€"])
+    items_data.append(['', '', 'TOTAL:', f"{data['total_amount']}€"])
 
     # Création du tableau des articles avec largeurs optimisées
     items_table = Table(items_data, colWidths=[3 * inch, 1 * inch, 1.5 * inch, 1.5 * inch])
@@ -86,16 +86,30 @@ def generate_invoice(order):
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from .models import Order, OrderItem, Cart, CartItem
-from .utils import generate_invoice_pdf
+from .invoices import get_invoice, export_orders, iter_invoice_zip
+from .forms import InvoiceExportForm
+from .queries import filter_admin_orders, order_item_count, orders_with_items, order_status_counts
+from .transitions import transition_orders
+from pharmacy_online.exports import export_response
+from pharmacy_online.metrics import CHECKOUT_SECONDS, CHECKOUTS
+from pharmacy_online.pagination import CursorPaginator
+from .checkout import place_order, InsufficientStockError
+from inventory.reservations import hold_stock, release_hold
+
+# Lignes lues par requête (curseur côté serveur) pendant les exports
+EXPORT_CHUNK_SIZE = 2000
 
 
 @login_required
 def cart_view(request):
     try:
         cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.all()
+        cart_items = cart.items.select_related('medicine')
     except Cart.DoesNotExist:
         cart_items = []
         cart = None
@@ -115,7 +129,7 @@ def update_cart_item(request, item_id):
         action = request.POST.get('action')
 
         if action == 'increase':
-            if cart_item.quantity < cart_item.medicine.stock_quantity:
+            if hold_stock(cart_item.cart, cart_item.medicine, cart_item.quantity + 1):
                 cart_item.quantity += 1
                 cart_item.save()
             else:
@@ -125,11 +139,14 @@ def update_cart_item(request, item_id):
             if cart_item.quantity > 1:
                 cart_item.quantity -= 1
                 cart_item.save()
+                hold_stock(cart_item.cart, cart_item.medicine, cart_item.quantity)
             else:
+                release_hold(cart_item.cart, cart_item.medicine)
                 cart_item.delete()
                 messages.info(request, "Article retiré du panier.")
 
         elif action == 'remove':
+            release_hold(cart_item.cart, cart_item.medicine)
             cart_item.delete()
             messages.success(request, "Article retiré du panier.")
 
@@ -140,7 +157,7 @@ def update_cart_item(request, item_id):
 def checkout(request):
     try:
         cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.all()
+        cart_items = cart.items.select_related('medicine')
     except Cart.DoesNotExist:
         messages.error(request, "Votre panier est vide.")
         return redirect('products:medicine_list')
@@ -150,29 +167,16 @@ def checkout(request):
         return redirect('products:medicine_list')
 
     if request.method == 'POST':
-        # Créer la commande
-        order = Order.objects.create(
-            user=request.user,
-            total_amount=cart.total_amount,
-            notes=request.POST.get('notes', '')
-        )
-
-        # Créer les éléments de commande
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                medicine=cart_item.medicine,
-                quantity=cart_item.quantity,
-                price=cart_item.medicine.price
-            )
-
-            # Réduire le stock
-            medicine = cart_item.medicine
-            medicine.stock_quantity -= cart_item.quantity
-            medicine.save()
-
-        # Vider le panier
-        cart.delete()
+        # Créer la commande et réserver le stock en une seule transaction
+        try:
+            with CHECKOUT_SECONDS.time():
+                order = place_order(cart, request.user, notes=request.POST.get('notes', ''))
+        except InsufficientStockError as e:
+            CHECKOUTS.inc(outcome='insufficient_stock')
+            messages.error(request, str(e))
+            return redirect('orders:cart')
+
+        CHECKOUTS.inc(outcome='placed')
 
         messages.success(request, f"Commande {order.order_number} créée avec succès!")
         return redirect('orders:order_detail', pk=order.pk)
@@ -186,13 +190,13 @@ def checkout(request):
 
 @login_required
 def order_list(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    orders = orders_with_items(Order.objects.filter(user=request.user)).order_by('-created_at')
     return render(request, 'orders/order_list.html', {'orders': orders})
 
 
 @login_required
 def order_detail(request, pk):
-    order = get_object_or_404(Order, pk=pk, user=request.user)
+    order = get_object_or_404(orders_with_items(), pk=pk, user=request.user)
     return render(request, 'orders/order_detail.html', {'order': order})
 
 
@@ -200,13 +204,14 @@ def order_detail(request, pk):
 def generate_invoice(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="facture_{order.order_number}.pdf"'
-
-    pdf = generate_invoice_pdf(order)
-    response.write(pdf)
-
-    return response
+    # Facture déjà rendue en arrière-plan (sinon générée maintenant), servie en streaming
+    name = get_invoice(order)
+    return FileResponse(
+        default_storage.open(name, 'rb'),
+        as_attachment=True,
+        filename=f"facture_{order.order_number}.pdf",
+        content_type='application/pdf',
+    )
 
 
 # Administration des commandes (pour le staff)
@@ -215,20 +220,72 @@ from django.contrib.admin.views.decorators import staff_member_required
 
 @staff_member_required
 def admin_orders(request):
-    orders = Order.objects.all().order_by('-created_at')
-
+    # Filtre par statut et recherche par début de numéro de commande
     status_filter = request.GET.get('status')
-    if status_filter:
-        orders = orders.filter(status=status_filter)
+    search_query = request.GET.get('q', '').strip().upper()
+    orders = filter_admin_orders(orders_with_items(), status_filter, search_query)
+
+    # Pagination par curseur (50 commandes par page)
+    orders = CursorPaginator(orders, ('-created_at', '-id'), 50).get_page(request.GET.get('cursor'))
 
     context = {
         'orders': orders,
         'status_choices': Order.STATUS_CHOICES,
         'selected_status': status_filter,
+        'search_query': search_query,
+        'status_counts': order_status_counts(),
     }
     return render(request, 'orders/admin_orders.html', context)
 
 
+@staff_member_required
+def export_order_list(request):
+    # Export CSV/XLSX en streaming de la liste des commandes (mêmes filtres que
+    # admin_orders) : lecture par curseur côté serveur, mémoire constante
+    orders = filter_admin_orders(
+        Order.objects.all(), request.GET.get('status'), request.GET.get('q', '').strip().upper()
+    )
+    statuses = dict(Order.STATUS_CHOICES)
+    rows = (
+        (number, created_at, statuses.get(status, status), username, email, item_count, total)
+        for number, created_at, status, username, email, item_count, total in orders
+        .annotate(item_count=order_item_count())
+        .order_by('-created_at', '-id')
+        .values_list(
+            'order_number', 'created_at', 'status', 'user__username', 'user__email',
+            'item_count', 'total_amount',
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return export_response(
+        ['Numéro', 'Date', 'Statut', 'Client', 'Email', 'Articles', 'Montant'],
+        rows,
+        f"commandes_{timezone.localdate():%Y%m%d}",
+        request.GET.get('format', 'csv'),
+        sheet_name='Commandes',
+    )
+
+
+@staff_member_required
+def export_invoices(request):
+    # Export groupé des factures filtrées (statut, période) dans une archive ZIP
+    # rendue en parallèle et envoyée en streaming
+    form = InvoiceExportForm(request.GET)
+    if not form.is_valid():
+        messages.error(request, "Filtres d'export invalides.")
+        return redirect('orders:admin_orders')
+
+    orders = export_orders(
+        form.cleaned_data['status'],
+        form.cleaned_data['date_from'],
+        form.cleaned_data['date_to'],
+    )
+    workers = getattr(settings, 'INVOICE_EXPORT_WORKERS', None)
+
+    response = StreamingHttpResponse(iter_invoice_zip(orders, workers), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="factures.zip"'
+    return response
+
+
 @staff_member_required
 def update_order_status(request, order_id):
     order = get_object_or_404(Order, id=order_id)
@@ -236,9 +293,30 @@ def update_order_status(request, order_id):
     if request.method == 'POST':
         new_status = request.POST.get('status')
         if new_status in dict(Order.STATUS_CHOICES):
-            order.status = new_status
-            order.save()
-            messages.success(request, f"Statut de la commande {order.order_number} mis à jour.")
+            if transition_orders([order.pk], new_status, request.user):
+                messages.success(request, f"Statut de la commande {order.order_number} mis à jour.")
+            else:
+                messages.error(
+                    request,
+                    f"La commande {order.order_number} ne peut pas passer "
+                    f"de « {order.get_status_display()} » à ce statut."
+                )
+
+    return redirect('orders:admin_orders')
+
+
+@staff_member_required
+def bulk_update_order_status(request):
+    # Changement de statut groupé des commandes cochées dans la console du personnel
+    if request.method == 'POST':
+        new_status = request.POST.get('status')
+        order_ids = [pk for pk in request.POST.getlist('order_ids') if pk.isdigit()]
+        if new_status in dict(Order.STATUS_CHOICES) and order_ids:
+            changed = transition_orders(order_ids, new_status, request.user)
+            skipped = len(set(order_ids)) - len(changed)
+            messages.success(request, f"{len(changed)} commande(s) mise(s) à jour.")
+            if skipped:
+                messages.warning(request, f"{skipped} commande(s) ignorée(s) : transition non autorisée.")
 
     return redirect('orders:admin_orders')
 >>>>>>> develop
@@ -0,0 +1,416 @@
+# pharmacy_online/benchmark.py
+# Banc de mesure des parcours utilisateurs principaux : accueil, catalogue (avec et sans
+# recherche), ajout au panier, commande, détail de commande, facture, tableau de bord
+# Jeu de données de seed_pharmacy (historique cohérent, graine fixe), requêtes envoyées
+# par le client de test Django depuis plusieurs threads ; résultats en JSON pour
+# comparer deux commits (commande benchmark_journeys)
+# Stress du stock : commandes et mouvements simultanés sur les mêmes médicaments, puis
+# contrôle des invariants (commande stress_stock)
+
+import datetime
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from inventory.ledger import ledger_discrepancies
+from inventory.lots import lots_stock_total
+from inventory.models import StockMovement
+from inventory.utils import update_stock
+from orders.models import Order, OrderItem
+from products.models import Category, Medicine
+from .profiling import _percentile
+from .seeding import NAME_WORDS, seed_pharmacy
+from .tasks import wait_for_background_tasks
+
+# Mot de passe commun des comptes créés (haché une seule fois)
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Base de test créée pour la mesure puis détruite, comme pour les tests
+
+    La base configurée n'est pas modifiée. Sous SQLite, la base de test est un
+    fichier en mode WAL (et non en mémoire) pour que plusieurs threads s'y connectent.
+    Fichiers (factures) et cache sont isolés le temps de la mesure.
+    """
+    media_root = tempfile.mkdtemp(prefix='benchmark-')
+    old_name = connection.settings_dict['NAME']
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(media_root, 'benchmark.sqlite3')
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+        with override_settings(MEDIA_ROOT=media_root, CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'},
+        }):
+            yield
+    finally:
+        wait_for_background_tasks()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+class BenchmarkData:
+    """Identifiants du jeu de données utilisés par les parcours"""
+
+    def __init__(self, category_ids, medicine_ids, user_ids, staff_id, orders_by_user):
+        self.category_ids = category_ids
+        self.medicine_ids = medicine_ids
+        self.user_ids = user_ids
+        self.staff_id = staff_id
+        self.orders_by_user = orders_by_user
+
+    def counts(self):
+        return {
+            'categories': len(self.category_ids),
+            'medicines': len(self.medicine_ids),
+            'users': len(self.user_ids),
+            'orders': sum(len(orders) for orders in self.orders_by_user.values()),
+        }
+
+
+def seed_benchmark_data(categories=20, medicines=2000, users=50, orders=5000, seed=42):
+    """
+    Crée le jeu de données des mesures, reproductible (graine fixe)
+
+    Jeu de seed_pharmacy (pharmacy_online/seeding.py) : historique de commandes
+    et mouvements de stock cohérent avec le grand livre, popularité inégale des
+    médicaments ; les identifiants utiles aux parcours sont relus ensuite.
+
+    Returns:
+        BenchmarkData: Identifiants des objets créés
+    """
+    result = seed_pharmacy(
+        categories=categories, medicines=medicines, users=users, orders=orders, seed=seed,
+    )
+    first = result['first_ids']
+    user_ids = list(range(first['auth.User'], first['auth.User'] + users))
+    orders_by_user = {pk: [] for pk in user_ids}
+    for pk, user_id in Order.objects.filter(pk__gte=first['orders.Order']).values_list('pk', 'user_id'):
+        orders_by_user[user_id].append(pk)
+    return BenchmarkData(
+        list(range(first['products.Category'], first['products.Category'] + categories)),
+        list(
+            Medicine.objects.filter(pk__gte=first['products.Medicine'], stock_quantity__gt=0)
+            .order_by('pk').values_list('pk', flat=True)
+        ),
+        user_ids,
+        result['staff_id'],
+        orders_by_user,
+    )
+
+
+# ===== PARCOURS =====
+# Chaque parcours prépare sa requête (étapes non mesurées, ex: remplir le panier)
+# et renvoie une fonction qui envoie la requête mesurée
+
+def _home(client, data, user_id, rng):
+    return lambda: client.get(reverse('home'))
+
+
+def _medicine_list(client, data, user_id, rng):
+    page = {'category': rng.choice(data.category_ids)} if rng.random() < 0.5 else {}
+    return lambda: client.get(reverse('products:medicine_list'), page)
+
+
+def _medicine_search(client, data, user_id, rng):
+    return lambda: client.get(reverse('products:medicine_list'), {'search': rng.choice(NAME_WORDS)})
+
+
+def _add_to_cart(client, data, user_id, rng):
+    return lambda: client.post(reverse('products:add_to_cart', args=[rng.choice(data.medicine_ids)]))
+
+
+def _checkout(client, data, user_id, rng):
+    client.post(reverse('products:add_to_cart', args=[rng.choice(data.medicine_ids)]))
+    return lambda: client.post(reverse('orders:checkout'), {'notes': ''})
+
+
+def _order_detail(client, data, user_id, rng):
+    return lambda: client.get(reverse('orders:order_detail', args=[rng.choice(data.orders_by_user[user_id])]))
+
+
+def _generate_invoice(client, data, user_id, rng):
+    return lambda: client.get(reverse('orders:generate_invoice', args=[rng.choice(data.orders_by_user[user_id])]))
+
+
+def _inventory_dashboard(client, data, user_id, rng):
+    return lambda: client.get(reverse('inventory:dashboard'))
+
+
+JOURNEYS = {
+    'home': _home,
+    'medicine_list': _medicine_list,
+    'medicine_search': _medicine_search,
+    'add_to_cart': _add_to_cart,
+    'checkout': _checkout,
+    'order_detail': _order_detail,
+    'generate_invoice': _generate_invoice,
+    'inventory_dashboard': _inventory_dashboard,
+}
+
+# Parcours réservés au personnel (les autres utilisent les comptes clients)
+STAFF_JOURNEYS = {'inventory_dashboard'}
+
+
+def _read(response):
+    """Lit le corps d'une réponse (les réponses en streaming sont consommées)"""
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    response.close()
+
+
+def run_journey(name, data, requests=200, concurrency=4, seed=42):
+    """
+    Mesure un parcours : `requests` requêtes réparties entre `concurrency` clients
+
+    Avec concurrency > 1, chaque client s'exécute dans son propre thread (et sa
+    propre connexion à la base) : la base doit accepter plusieurs connexions
+    (PostgreSQL, fichier SQLite en mode WAL).
+
+    Returns:
+        dict: Débit (requêtes par seconde, étapes de préparation comprises),
+              latences p50/p95/p99 et codes de réponse
+    """
+    journey = JOURNEYS[name]
+    if name in STAFF_JOURNEYS:
+        accounts = [data.staff_id] * concurrency
+    else:
+        # Comptes clients ayant des commandes, un par client concurrent
+        accounts = [pk for pk in data.user_ids if data.orders_by_user[pk]][:concurrency]
+    shares = [requests // len(accounts) + (i < requests % len(accounts)) for i in range(len(accounts))]
+
+    def client_run(index):
+        rng = random.Random(f"{seed}-{name}-{index}")
+        client = Client(raise_request_exception=False)
+        client.force_login(User.objects.get(pk=accounts[index]))
+        timings, statuses = [], {}
+        try:
+            for _ in range(shares[index]):
+                send = journey(client, data, accounts[index], rng)
+                started = time.perf_counter()
+                response = send()
+                _read(response)
+                timings.append((time.perf_counter() - started) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        finally:
+            if len(accounts) > 1:
+                connection.close()
+        return timings, statuses
+
+    started = time.perf_counter()
+    if len(accounts) == 1:
+        results = [client_run(0)]
+    else:
+        with ThreadPoolExecutor(max_workers=len(accounts)) as pool:
+            results = list(pool.map(client_run, range(len(accounts))))
+    wall = time.perf_counter() - started
+
+    timings = sorted(timing for client_timings, _ in results for timing in client_timings)
+    statuses = {}
+    for _, client_statuses in results:
+        for status, count in client_statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    return {
+        'journey': name,
+        'requests': len(timings),
+        'concurrency': len(accounts),
+        'errors': sum(count for status, count in statuses.items() if int(status) >= 400),
+        'status_codes': statuses,
+        'throughput_rps': round(len(timings) / wall, 2) if wall else None,
+        'mean_ms': round(statistics.fmean(timings), 2) if timings else None,
+        'p50_ms': round(_percentile(timings, 50), 2) if timings else None,
+        'p95_ms': round(_percentile(timings, 95), 2) if timings else None,
+        'p99_ms': round(_percentile(timings, 99), 2) if timings else None,
+        'max_ms': round(timings[-1], 2) if timings else None,
+    }
+
+
+def compare_results(baseline, current):
+    """
+    Écarts entre deux résultats JSON, par parcours
+
+    Returns:
+        list: Dictionnaires (parcours, ratios p50, p99 et débit actuel / référence)
+    """
+    previous = {row['journey']: row for row in baseline.get('journeys', [])}
+    rows = []
+    for row in current.get('journeys', []):
+        before = previous.get(row['journey'])
+        if not before:
+            continue
+        rows.append({
+            'journey': row['journey'],
+            **{
+                f'{metric}_ratio': round(row[metric] / before[metric], 3) if row[metric] and before[metric] else None
+                for metric in ('p50_ms', 'p99_ms', 'throughput_rps')
+            },
+        })
+    return rows
+
+
+# ===== STRESS DU STOCK =====
+
+# Motif des mouvements de stock créés par le stress
+STRESS_REASON = "Stress du stock"
+
+# Nouvelles tentatives d'une opération refusée faute de verrou (SQLite : une écriture à la fois)
+LOCK_RETRIES = 200
+
+
+def _retry_locked(operation, retries):
+    """
+    Exécute `operation`, relancée tant que la base est verrouillée par une autre écriture
+
+    Le refus peut survenir après la validation (mises à jour différées des statistiques,
+    session) : les invariants sont donc contrôlés d'après la base, pas d'après les
+    opérations réussies côté client.
+    """
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return operation()
+        except OperationalError as error:
+            if 'locked' not in str(error) or attempt == LOCK_RETRIES - 1:
+                raise
+            retries[0] += 1
+            time.sleep(random.uniform(0, 0.001 * min(attempt + 1, 20)))
+
+
+def stock_stress(threads=8, operations=50, medicines=3, stock=30, seed=42):
+    """
+    Commandes et mouvements de stock simultanés sur quelques médicaments, puis contrôle
+
+    Chaque thread (un client connecté) enchaîne `operations` opérations sur les mêmes
+    médicaments : ajout au panier puis validation par la vue checkout (70 %),
+    update_stock en entrée ou en sortie (30 %). Invariants contrôlés à la fin :
+    - pas de mise à jour perdue : stock final = initial + entrées − lignes de commande
+      − sorties, lots = stock ;
+    - pas de survente : ce stock attendu n'est jamais négatif ;
+    - grand livre = solde (dernier instantané plus mouvements).
+
+    Les sessions sont signées dans un cookie le temps du stress : seules les
+    écritures du stock se disputent la base.
+
+    Returns:
+        dict: Débit de commandes, nombre d'opérations et liste des invariants violés
+    """
+    tag = uuid.uuid4().hex[:6]
+    category = Category.objects.create(name=f"Stress {tag}")
+    expiry = timezone.localdate() + datetime.timedelta(days=365)
+    hot = [
+        Medicine.objects.create(
+            name=f"Stress {tag} {i}", description="Stress", category=category,
+            price=Decimal('3.00'), expiry_date=expiry, stock_quantity=stock, minimum_stock=5,
+        )
+        for i in range(medicines)
+    ]
+    pks = [medicine.pk for medicine in hot]
+    password = make_password(BENCHMARK_PASSWORD)
+    staff = User.objects.create(username=f"stress_{tag}", password=password, is_staff=True)
+    customers = User.objects.bulk_create([
+        User(username=f"stress_{tag}_{i}", password=password) for i in range(threads)
+    ])
+
+    def client_run(index):
+        rng = random.Random(f"{seed}-stress-{index}")
+        retries = [0]
+        rejected = 0
+        client = Client(raise_request_exception=True)
+        try:
+            _retry_locked(lambda: client.force_login(customers[index]), retries)
+            for _ in range(operations):
+                pk = rng.choice(pks)
+                if rng.random() < 0.7:
+                    for _ in range(rng.randint(1, 3)):
+                        _retry_locked(lambda: client.post(reverse('products:add_to_cart', args=[pk])), retries)
+                    response = _retry_locked(lambda: client.post(reverse('orders:checkout')), retries)
+                    rejected += resolve(response.url).url_name != 'order_detail'
+                else:
+                    movement_type, quantity = rng.choice(('in', 'out')), rng.randint(1, 5)
+                    _retry_locked(
+                        lambda: update_stock(Medicine(pk=pk), quantity, movement_type, STRESS_REASON, staff),
+                        retries,
+                    )
+        finally:
+            connection.close()
+        return rejected, retries[0]
+
+    # Avec raise_request_exception, toute erreur remonte au thread : le journal
+    # des erreurs de requête ne ferait que répéter les refus pour verrou
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    started = time.perf_counter()
+    try:
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'), \
+                ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(client_run, range(threads)))
+    finally:
+        request_logger.setLevel(level)
+    wall = time.perf_counter() - started
+
+    orders = Order.objects.filter(user__in=customers)
+    checkouts = orders.count()
+    ordered = dict(
+        OrderItem.objects.filter(order__in=orders).values_list('medicine').annotate(total=Sum('quantity'))
+    )
+    moved = {
+        (medicine_id, movement_type): total
+        for medicine_id, movement_type, total in
+        StockMovement.objects.filter(medicine__in=pks, reason=STRESS_REASON)
+        .values_list('medicine', 'movement_type').annotate(total=Sum('quantity'))
+    }
+
+    violations = []
+    for medicine in Medicine.objects.filter(pk__in=pks).annotate(lot_total=lots_stock_total()).order_by('pk'):
+        expected = (
+            stock + moved.get((medicine.pk, 'in'), 0)
+            - ordered.get(medicine.pk, 0) - moved.get((medicine.pk, 'out'), 0)
+        )
+        if medicine.stock_quantity != expected:
+            violations.append(f"{medicine.name} : stock {medicine.stock_quantity}, attendu {expected}")
+        if expected < 0:
+            violations.append(f"{medicine.name} : survente de {-expected} unité(s)")
+        if medicine.lot_total != medicine.stock_quantity:
+            violations.append(f"{medicine.name} : lots {medicine.lot_total}, stock {medicine.stock_quantity}")
+    for medicine in ledger_discrepancies(Medicine.objects.filter(pk__in=pks)):
+        violations.append(
+            f"{medicine.name} : grand livre {medicine.ledger_balance}, stock {medicine.stock_quantity}"
+        )
+
+    return {
+        'database': connection.vendor,
+        'threads': threads,
+        'operations': threads * operations,
+        'medicines': medicines,
+        'wall_seconds': round(wall, 3),
+        'checkouts': checkouts,
+        'rejected_checkouts': sum(result[0] for result in results),
+        'checkouts_per_second': round(checkouts / wall, 2) if wall else None,
+        'lock_retries': sum(result[1] for result in results),
+        'violations': violations,
+    }
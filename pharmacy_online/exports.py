@@ -0,0 +1,204 @@
+# pharmacy_online/exports.py
+# Exports tabulaires (CSV, XLSX) envoyés en streaming, réutilisables par toutes les applications
+# Les lignes sont produites au fur et à mesure de la lecture (QuerySet.iterator) :
+# mémoire constante quel que soit le nombre de lignes, téléchargement immédiat
+
+import csv
+import datetime
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Lignes écrites entre deux morceaux envoyés au client
+ROWS_PER_CHUNK = 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Caractères de contrôle interdits dans le XML des feuilles XLSX
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PACKAGE_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# Lignes par feuille XLSX (limite d'Excel, intitulés compris) : au-delà, feuille suivante
+XLSX_SHEET_ROWS = 1048576
+
+
+def _xlsx_parts(sheet_names):
+    """Parties du classeur qui décrivent les feuilles (écrites après celles-ci)"""
+    sheets = range(1, len(sheet_names) + 1)
+    return {
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(
+                f'<Override PartName="/xl/worksheets/sheet{number}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for number in sheets
+            )
+            + '</Types>'
+        ),
+        '_rels/.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<Relationships xmlns="{_PACKAGE_NS}">'
+            f'<Relationship Id="rId1" Type="{_RELATIONSHIPS_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<Relationships xmlns="{_PACKAGE_NS}">'
+            + ''.join(
+                f'<Relationship Id="rId{number}" Type="{_RELATIONSHIPS_NS}/worksheet" '
+                f'Target="worksheets/sheet{number}.xml"/>'
+                for number in sheets
+            )
+            + '</Relationships>'
+        ),
+        'xl/workbook.xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<workbook xmlns="{_SPREADSHEET_NS}" xmlns:r="{_RELATIONSHIPS_NS}"><sheets>'
+            + ''.join(
+                f'<sheet name="{escape(name)}" sheetId="{number}" r:id="rId{number}"/>'
+                for number, name in zip(sheets, sheet_names)
+            )
+            + '</sheets></workbook>'
+        ),
+    }
+
+
+class ZipStream:
+    """Fichier en écriture seule dont le contenu est récupéré au fur et à mesure"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def cell_text(value):
+    """Texte d'une cellule (dates en heure locale, format français)"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%d/%m/%Y %H:%M')
+    if isinstance(value, datetime.date):
+        return value.strftime('%d/%m/%Y')
+    return str(value)
+
+
+def iter_csv(header, rows):
+    """
+    Produit un CSV (séparateur ';', BOM UTF-8 pour Excel), morceau par morceau
+
+    Yields:
+        bytes: Morceaux successifs du fichier
+    """
+    buffer = io.StringIO()
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([cell_text(value) for value in row])
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL.sub('', cell_text(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def iter_xlsx(header, rows, sheet_name='Export'):
+    """
+    Produit un classeur XLSX, morceau par morceau
+
+    Les feuilles sont écrites directement dans l'archive (chaînes en ligne, sans
+    table des chaînes partagées) : rien n'est conservé en mémoire entre deux morceaux.
+    Au-delà de XLSX_SHEET_ROWS lignes, l'export continue sur une nouvelle feuille
+    (« Export 2 », ...) avec les mêmes intitulés. Les feuilles sont en ZIP64 :
+    une feuille peut dépasser 2 Gio de XML.
+
+    Yields:
+        bytes: Morceaux successifs de l'archive
+    """
+    rows_per_sheet = XLSX_SHEET_ROWS - 1
+    sheet_names = []
+    rows, end = iter(rows), object()
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        row = next(rows, end)
+        while row is not end or not sheet_names:
+            number = len(sheet_names) + 1
+            sheet_names.append(sheet_name[:31] if number == 1 else f"{sheet_name[:24]} {number}")
+            with archive.open(f'xl/worksheets/sheet{number}.xml', 'w', force_zip64=True) as sheet:
+                sheet.write((
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    f'<worksheet xmlns="{_SPREADSHEET_NS}"><sheetData>' + _xlsx_row(header)
+                ).encode('utf-8'))
+                count = 0
+                while row is not end and count < rows_per_sheet:
+                    sheet.write(_xlsx_row(row).encode('utf-8'))
+                    count += 1
+                    if count % ROWS_PER_CHUNK == 0:
+                        yield stream.pop()
+                    row = next(rows, end)
+                sheet.write(b'</sheetData></worksheet>')
+            yield stream.pop()
+        for name, content in _xlsx_parts(sheet_names).items():
+            archive.writestr(name, content)
+    yield stream.pop()
+
+
+def export_response(header, rows, filename, file_format='csv', sheet_name='Export'):
+    """
+    Réponse HTTP en streaming d'un export CSV ou XLSX
+
+    Args:
+        header (list): Intitulés des colonnes
+        rows (iterable): Lignes (tuples de valeurs), lues au fur et à mesure
+        filename (str): Nom du fichier téléchargé, sans extension
+        file_format (str): 'csv' ou 'xlsx' (format inconnu : CSV)
+
+    Returns:
+        StreamingHttpResponse: Téléchargement du fichier
+    """
+    if file_format not in EXPORT_FORMATS:
+        file_format = 'csv'
+    content = iter_xlsx(header, rows, sheet_name) if file_format == 'xlsx' else iter_csv(header, rows)
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
@@ -0,0 +1,406 @@
+# pharmacy_online/metrics.py
+# Métriques métier et de performance au format texte Prometheus (endpoint /metrics)
+# Compteurs, histogrammes et jauges calculées à la lecture
+#
+# Plusieurs processus (workers gunicorn) : avec METRICS_DIR, chaque processus écrit
+# ses valeurs dans son propre fichier projeté en mémoire (mmap, une écriture = une
+# addition en mémoire, sans verrou entre processus) ; l'endpoint additionne les
+# fichiers de tous les processus, y compris ceux des workers redémarrés.
+# Les fichiers des processus terminés (workers redémarrés, processus de rendu des
+# factures) sont fusionnés dans metrics_archive.db à la lecture puis supprimés :
+# le nombre de fichiers reste celui des processus vivants.
+# Vider METRICS_DIR au démarrage du serveur (ex: hook on_starting de gunicorn).
+# Sans METRICS_DIR, les valeurs restent dans la mémoire du processus (développement).
+
+import glob
+import hmac
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Bornes (secondes) par défaut des histogrammes de durée
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_HEADER = struct.Struct('i')
+_VALUE = struct.Struct('d')
+
+
+class MmapValues:
+    """
+    Valeurs (float) d'un processus, dans un fichier projeté en mémoire
+
+    Format : taille utilisée (int32) puis des entrées [longueur de la clé (int32),
+    clé UTF-8 complétée à un multiple de 8 octets, valeur (double)]. La taille
+    utilisée est écrite après l'entrée : un lecteur ne voit que des entrées complètes.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.truncate(self.INITIAL_SIZE)
+        self.capacity = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), self.capacity)
+        self.used = _HEADER.unpack_from(self.map, 0)[0] or 8
+        self.positions = {key: position for key, _, position in read_entries(self.map, self.used)}
+
+    def add(self, key, amount):
+        with self.lock:
+            position = self.positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value = _VALUE.unpack_from(self.map, position)[0]
+            _VALUE.pack_into(self.map, position, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        padding = (8 - (_HEADER.size + len(encoded)) % 8) % 8
+        size = _HEADER.size + len(encoded) + padding + _VALUE.size
+        while self.used + size > self.capacity:
+            self.map.close()
+            self.capacity *= 2
+            self.file.truncate(self.capacity)
+            self.map = mmap.mmap(self.file.fileno(), self.capacity)
+        struct.pack_into(f'i{len(encoded)}s{padding}x', self.map, self.used, len(encoded), encoded)
+        position = self.used + size - _VALUE.size
+        _VALUE.pack_into(self.map, position, 0.0)
+        self.used += size
+        _HEADER.pack_into(self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def items(self):
+        with self.lock:
+            return {key: _VALUE.unpack_from(self.map, position)[0] for key, position in self.positions.items()}
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def read_entries(data, used=None):
+    """Entrées (clé, valeur, position) d'un fichier de valeurs"""
+    used = used or _HEADER.unpack_from(data, 0)[0]
+    position = 8
+    while position < used:
+        length = _HEADER.unpack_from(data, position)[0]
+        position += _HEADER.size
+        key = bytes(data[position:position + length]).decode('utf-8')
+        position += length + (8 - (_HEADER.size + length) % 8) % 8
+        yield key, _VALUE.unpack_from(data, position)[0], position
+        position += _VALUE.size
+
+
+class MemoryValues:
+    """Valeurs d'un processus en mémoire (sans METRICS_DIR)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def add(self, key, amount):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def items(self):
+        with self.lock:
+            return dict(self.values)
+
+
+# Fichier des valeurs fusionnées des processus terminés
+ARCHIVE_FILE = 'metrics_archive.db'
+
+
+def _file_pid(path):
+    """Pid d'un fichier metrics_<pid>.db (None pour l'archive)"""
+    name = os.path.basename(path)[len('metrics_'):-len('.db')]
+    return int(name) if name.isdigit() else None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_dead_files(directory):
+    """
+    Ajoute les valeurs des processus terminés à l'archive et supprime leurs fichiers
+
+    Verrou exclusif sur le répertoire (flock) : deux lectures simultanées ne
+    fusionnent pas deux fois le même fichier.
+
+    Returns:
+        int: Nombre de fichiers fusionnés
+    """
+    import fcntl
+
+    with open(os.path.join(directory, 'metrics.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = [
+            path for path in glob.glob(os.path.join(directory, 'metrics_*.db'))
+            if _file_pid(path) is not None and not _pid_alive(_file_pid(path))
+        ]
+        if not dead:
+            return 0
+        archive = MmapValues(os.path.join(directory, ARCHIVE_FILE))
+        try:
+            for path in dead:
+                with open(path, 'rb') as file:
+                    data = file.read()
+                if len(data) >= 8:
+                    for key, value, _ in read_entries(data):
+                        archive.add(key, value)
+                os.remove(path)
+        finally:
+            archive.close()
+    return len(dead)
+
+
+class MetricsStore:
+    """Stockage du processus courant, rouvert après un fork (un fichier par pid)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.directory = None
+        self.values = None
+
+    def current(self):
+        directory = getattr(settings, 'METRICS_DIR', '') or None
+        pid = os.getpid()
+        if self.pid != pid or self.directory != directory:
+            with self.lock:
+                if self.pid != pid or self.directory != directory:
+                    self.values = (
+                        MmapValues(os.path.join(directory, f'metrics_{pid}.db')) if directory
+                        else MemoryValues()
+                    )
+                    self.pid, self.directory = pid, directory
+        return self.values
+
+    def add(self, key, amount):
+        self.current().add(key, amount)
+
+    def collect(self):
+        """Somme des valeurs de tous les processus"""
+        values = self.current()
+        if self.directory is None:
+            return values.items()
+        merge_dead_files(self.directory)
+        totals = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.db')):
+            with open(path, 'rb') as file:
+                data = file.read()
+            if len(data) < 8:
+                continue
+            for key, value, _ in read_entries(data):
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+
+store = MetricsStore()
+registry = {}
+
+
+def _key(name, labels, suffix=''):
+    return json.dumps([name, suffix, labels], sort_keys=True, separators=(',', ':'))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry[name] = self
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} : étiquettes attendues {self.labelnames}, reçues {tuple(labels)}")
+        return {name: str(value) for name, value in labels.items()}
+
+
+class Counter(Metric):
+    """Compteur croissant (total depuis le démarrage, tous processus confondus)"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        store.add(_key(self.name, self._labels(labels), '_total'), amount)
+
+
+class Histogram(Metric):
+    """Distribution d'une durée ou d'une taille (compteurs par tranche, somme, nombre)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        bound = next(bound for bound in self.buckets if value <= bound)
+        # Tranche non cumulée (une écriture) ; cumul fait à la lecture
+        store.add(_key(self.name, {**labels, 'le': _format(bound)}, '_bucket'), 1)
+        store.add(_key(self.name, labels, '_sum'), value)
+        store.add(_key(self.name, labels, '_count'), 1)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class GaugeFunction(Metric):
+    """Jauge calculée au moment de la lecture de /metrics (ex: nombre de ruptures)"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function):
+        super().__init__(name, documentation)
+        self.function = function
+
+
+def _format(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return f'{value:.1f}'
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in sorted(labels.items())) + '}'
+
+
+def render_metrics():
+    """Exposition texte (format Prometheus 0.0.4) de toutes les métriques"""
+    samples = {}
+    for key, value in store.collect().items():
+        name, suffix, labels = json.loads(key)
+        samples.setdefault(name, []).append((suffix, labels, value))
+
+    lines = []
+    for name in sorted(set(samples) | {name for name, metric in registry.items() if metric.kind == 'gauge'}):
+        metric = registry.get(name)
+        if metric:
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+        if isinstance(metric, GaugeFunction):
+            lines.append(f'{name} {_format(metric.function())}')
+            continue
+        if isinstance(metric, Histogram):
+            lines.extend(_histogram_lines(name, metric, samples[name]))
+            continue
+        for suffix, labels, value in sorted(samples[name], key=lambda sample: (sample[0], sorted(sample[1].items()))):
+            lines.append(f'{name}{suffix}{_labels_text(labels)} {_format(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(name, metric, samples):
+    """Tranches cumulées (toutes les bornes, y compris vides), somme et nombre par série"""
+    series = {}
+    for suffix, labels, value in samples:
+        bound = labels.pop('le', None)
+        entry = series.setdefault(json.dumps(labels, sort_keys=True), {'buckets': {}, '_sum': 0.0, '_count': 0.0})
+        if suffix == '_bucket':
+            entry['buckets'][bound] = entry['buckets'].get(bound, 0.0) + value
+        else:
+            entry[suffix] += value
+    lines = []
+    for labels_json, entry in sorted(series.items()):
+        labels = json.loads(labels_json)
+        cumulative = 0.0
+        for bound in metric.buckets:
+            cumulative += entry['buckets'].get(_format(bound), 0.0)
+            lines.append(f"{name}_bucket{_labels_text({**labels, 'le': _format(bound)})} {_format(cumulative)}")
+        lines.append(f'{name}_sum{_labels_text(labels)} {_format(entry["_sum"])}')
+        lines.append(f'{name}_count{_labels_text(labels)} {_format(entry["_count"])}')
+    return lines
+
+
+def _inventory_stat(field):
+    def read():
+        from inventory.stats import get_inventory_stats
+        return getattr(get_inventory_stats(), field)
+    return read
+
+
+# ===== MÉTRIQUES DE L'APPLICATION =====
+
+CHECKOUTS = Counter(
+    'pharmacy_checkouts', "Validations de panier, par résultat (placed, insufficient_stock)", ('outcome',),
+)
+CHECKOUT_SECONDS = Histogram(
+    'pharmacy_checkout_duration_seconds', "Durée de création d'une commande (place_order)",
+)
+CART_ADDITIONS = Counter(
+    'pharmacy_cart_additions', "Ajouts au panier, par résultat (added, out_of_stock, not_held)", ('outcome',),
+)
+STOCK_UPDATES = Counter(
+    'pharmacy_stock_updates', "Mouvements de stock validés par update_stock, par type", ('movement_type',),
+)
+STOCKOUTS = Counter(
+    'pharmacy_stockouts', "Passages d'un médicament en rupture de stock",
+)
+INVOICE_PDF_SECONDS = Histogram(
+    'pharmacy_invoice_pdf_duration_seconds', "Durée de génération d'une facture PDF",
+)
+CATALOG_CACHE = Counter(
+    'pharmacy_catalog_cache_requests', "Lectures du cache du catalogue, par fragment et résultat (hit, miss)",
+    ('fragment', 'result'),
+)
+GaugeFunction(
+    'pharmacy_out_of_stock_medicines', "Médicaments en rupture de stock",
+    _inventory_stat('out_of_stock_count'),
+)
+GaugeFunction(
+    'pharmacy_low_stock_medicines', "Médicaments sous le seuil minimum de stock",
+    _inventory_stat('low_stock_count'),
+)
+
+
+def metrics_view(request):
+    """
+    Endpoint /metrics (texte Prometheus)
+
+    Avec METRICS_TOKEN, l'en-tête « Authorization: Bearer <jeton> » est exigé
+    (scraper Prometheus) ; sinon réservé au personnel connecté.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        # Comparaison en temps constant : pas de fuite du jeton par la durée de la réponse
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            return HttpResponseForbidden()
+    elif not (request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,156 @@
+# pharmacy_online/pagination.py
+# Pagination par curseur (keyset) réutilisable par toutes les applications
+# Contrairement au Paginator de Django, aucune requête COUNT(*) ni OFFSET :
+# chaque page coûte une seule requête indexée, quelle que soit sa profondeur
+
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class CursorPage:
+    """
+    Page de résultats renvoyée par CursorPaginator
+
+    S'itère comme une liste d'objets et expose les curseurs opaques à placer
+    dans le paramètre `cursor` de l'URL pour les pages suivante et précédente.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class CursorPaginator:
+    """
+    Pagination par curseur sur une clé de tri unique
+
+    Args:
+        queryset (QuerySet): Objets à paginer
+        ordering (tuple): Champs de tri, le dernier devant être unique
+                          (ex: ('name', 'id') ou ('-created_at', '-id'))
+        per_page (int): Nombre d'objets par page
+
+    Exemple :
+        page = CursorPaginator(movements, ('-created_at', '-id'), 25).get_page(
+            request.GET.get('cursor')
+        )
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering
+        ]
+
+    # ===== ENCODAGE DES CURSEURS =====
+
+    def encode_cursor(self, obj, direction):
+        """Curseur opaque désignant la position de `obj` ('n' : après, 'p' : avant)"""
+        values = [field.value_to_string(obj) for field in self.fields]
+        payload = json.dumps({'d': direction, 'v': values}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Décode un curseur reçu dans l'URL
+
+        Returns:
+            tuple | None: (direction, valeurs) ou None si le curseur est absent ou invalide
+        """
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            direction, raw_values = payload['d'], payload['v']
+            if direction not in ('n', 'p') or len(raw_values) != len(self.fields):
+                return None
+            values = [field.to_python(raw) for field, raw in zip(self.fields, raw_values)]
+        except (ValueError, KeyError, TypeError, binascii.Error, ValidationError):
+            return None
+        return direction, values
+
+    # ===== CONSTRUCTION DES REQUÊTES =====
+
+    def _seek(self, values, forward):
+        """
+        Condition « strictement après » (ou « avant ») la position donnée
+
+        Pour une clé (a, b) croissante : a > va OR (a = va AND b > vb)
+        """
+        condition = Q()
+        for i, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            term = Q(**{f'{name.lstrip("-")}__{lookup}': values[i]})
+            for previous, value in zip(self.ordering[:i], values[:i]):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def get_page(self, cursor=None):
+        """
+        Retourne la page désignée par le curseur (la première si absent ou invalide)
+
+        Une seule requête : on lit per_page + 1 objets pour savoir s'il existe une suite.
+        """
+        decoded = self.decode_cursor(cursor)
+
+        if decoded is None:
+            rows = list(self.queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_more, has_before = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        elif decoded[0] == 'n':
+            rows = list(
+                self.queryset.filter(self._seek(decoded[1], forward=True))
+                .order_by(*self.ordering)[:self.per_page + 1]
+            )
+            has_more, has_before = len(rows) > self.per_page, True
+            rows = rows[:self.per_page]
+        else:
+            rows = list(
+                self.queryset.filter(self._seek(decoded[1], forward=False))
+                .order_by(*self._reversed_ordering())[:self.per_page + 1]
+            )
+            has_more, has_before = True, len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+
+        if not rows:
+            return CursorPage([])
+
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'n') if has_more else None,
+            previous_cursor=self.encode_cursor(rows[0], 'p') if has_before else None,
+        )
@@ -0,0 +1,202 @@
+# pharmacy_online/profiling.py
+# Mesure par requête : durée de la vue, nombre et durée des requêtes SQL,
+# requêtes répétées (empreinte du SQL, signe d'un N+1)
+# Activée par échantillonnage (PROFILING_SAMPLE_RATE) ; désactivée, le middleware
+# est retiré de la chaîne au démarrage et ne coûte rien
+
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+logger = logging.getLogger(__name__)
+
+# Bornes (ms) de l'histogramme des durées
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Nombre de requêtes SQL identiques (même empreinte) à partir duquel une ligne d'alerte est écrite
+DUPLICATE_WARNING_THRESHOLD = 5
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def sql_fingerprint(sql):
+    """Forme normalisée d'une requête : listes IN et littéraux remplacés"""
+    return _LITERALS.sub('?', _IN_LIST.sub('IN (...)', sql))
+
+
+class QueryRecorder:
+    """Enveloppe d'exécution SQL (connection.execute_wrapper) : compte, durée, empreintes"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[sql_fingerprint(sql)] += 1
+
+    def duplicates(self):
+        """Empreintes exécutées plusieurs fois, les plus fréquentes en premier"""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > 1]
+
+
+class ProfileRegistry:
+    """
+    Dernières mesures par vue, en mémoire du processus (fenêtre glissante)
+
+    Chaque processus (worker gunicorn) a ses propres mesures.
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+        self.duplicates = defaultdict(Counter)
+
+    def record(self, view, wall_ms, sql_count, sql_ms, duplicates):
+        with self.lock:
+            self.samples[view].append((wall_ms, sql_count, sql_ms))
+            for sql, count in duplicates[:3]:
+                self.duplicates[view][sql] = max(self.duplicates[view][sql], count)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.duplicates.clear()
+
+    def report(self):
+        """Histogramme et percentiles par vue, vues les plus lentes (p95) en premier"""
+        with self.lock:
+            samples = {view: list(values) for view, values in self.samples.items()}
+            duplicates = {view: counter.most_common(3) for view, counter in self.duplicates.items()}
+
+        views = []
+        for view, values in samples.items():
+            walls = sorted(wall for wall, _, _ in values)
+            histogram = Counter()
+            for wall in walls:
+                bound = next((bound for bound in LATENCY_BUCKETS if wall <= bound), None)
+                histogram[f"<={bound}" if bound else f">{LATENCY_BUCKETS[-1]}"] += 1
+            views.append({
+                'view': view,
+                'requests': len(walls),
+                'p50_ms': round(_percentile(walls, 50), 2),
+                'p95_ms': round(_percentile(walls, 95), 2),
+                'max_ms': round(walls[-1], 2),
+                'avg_sql_count': round(sum(count for _, count, _ in values) / len(values), 1),
+                'avg_sql_ms': round(sum(sql_ms for _, _, sql_ms in values) / len(values), 2),
+                'histogram_ms': dict(histogram),
+                'duplicate_queries': [{'sql': sql, 'count': count} for sql, count in duplicates.get(view, [])],
+            })
+        views.sort(key=lambda row: row['p95_ms'], reverse=True)
+        return views
+
+
+def _percentile(values, percent):
+    """Percentile (plus proche rang) d'une liste triée"""
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]
+
+
+registry = ProfileRegistry(getattr(settings, 'PROFILING_WINDOW', 500))
+
+
+class ProfilingMiddleware:
+    """
+    Profilage échantillonné des requêtes
+
+    Pour une requête échantillonnée (PROFILING_SAMPLE_RATE, entre 0 et 1) :
+    - en-tête Server-Timing (durée totale, SQL) lisible dans les outils du navigateur,
+      pour le personnel connecté (ou avec DEBUG) ;
+    - mesure ajoutée à la fenêtre glissante de la vue (endpoint profiling_report) ;
+    - ligne clé=valeur dans le journal (logger pharmacy_online.profiling),
+      en WARNING si une même requête SQL est répétée (N+1 probable).
+
+    À placer en tête de MIDDLEWARE pour mesurer toute la chaîne. La durée
+    d'une réponse en streaming s'arrête au premier octet.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = float(getattr(settings, 'PROFILING_SAMPLE_RATE', 0) or 0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - started) * 1000
+        sql_ms = recorder.duration * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unresolved'
+        duplicates = recorder.duplicates()
+        registry.record(view, wall_ms, recorder.count, sql_ms, duplicates)
+
+        # Détail interne (temps SQL, nombre de requêtes) : personnel connecté ou DEBUG seulement
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['Server-Timing'] = (
+                f'app;dur={wall_ms - sql_ms:.1f}, '
+                f'db;dur={sql_ms:.1f};desc="{recorder.count} SQL, '
+                f'{sum(count - 1 for _, count in duplicates)} repeated"'
+            )
+
+        worst = duplicates[0][1] if duplicates else 0
+        level = logging.WARNING if worst >= DUPLICATE_WARNING_THRESHOLD else logging.INFO
+        logger.log(
+            level,
+            'view=%s method=%s status=%s wall_ms=%.1f sql_count=%d sql_ms=%.1f repeated_max=%d%s',
+            view, request.method, response.status_code, wall_ms, recorder.count, sql_ms, worst,
+            f' repeated_sql="{duplicates[0][0][:200]}"' if level == logging.WARNING else '',
+        )
+        return response
+
+
+@staff_member_required
+def profiling_report(request):
+    """Mesures du processus qui répond, par vue (JSON)"""
+    return _report_response(registry.report())
+
+
+@staff_member_required
+@require_POST
+def profiling_reset(request):
+    """Retourne les mesures puis vide la fenêtre (POST seulement : un GET ne modifie rien)"""
+    views = registry.report()
+    registry.clear()
+    return _report_response(views)
+
+
+def _report_response(views):
+    return JsonResponse({
+        'sample_rate': float(getattr(settings, 'PROFILING_SAMPLE_RATE', 0) or 0),
+        'window': registry.window,
+        'buckets_ms': LATENCY_BUCKETS,
+        'views': views,
+    })
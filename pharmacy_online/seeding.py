@@ -0,0 +1,312 @@
+# pharmacy_online/seeding.py
+# Jeu de données synthétique de grande taille (catalogue, clients, historique de commandes)
+# Déterministe : même graine, mêmes données. Écriture par lots : COPY sous PostgreSQL,
+# INSERT multiples ailleurs. Les identifiants sont attribués à l'avance (à la suite des
+# existants) pour relier les lignes sans relire la base ; tout est écrit dans une seule
+# transaction, les clés étrangères étant vérifiées à la validation.
+
+import csv
+import datetime
+import io
+import itertools
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from inventory.models import StockLot, StockMovement, StockSnapshot
+from inventory.sales import rebuild_daily_sales
+from inventory.stats import reconcile_inventory_stats
+from orders.models import Order, OrderItem
+from products.models import Category, Medicine
+from products.search import rebuild_search_index
+
+# Lignes écrites par lot (un COPY ou un INSERT multiple)
+BATCH_SIZE = 5000
+
+# Mot de passe commun des comptes créés (haché une seule fois)
+SEED_PASSWORD = 'seed-password'
+
+# Mots utilisés pour les noms des médicaments (et les recherches des mesures)
+NAME_WORDS = (
+    'paracetamol', 'ibuprofene', 'amoxicilline', 'omeprazole', 'cetirizine', 'loratadine',
+    'metformine', 'doliprane', 'spasfon', 'smecta', 'gaviscon', 'vitamine',
+)
+FORMS = ('comprimés', 'gélules', 'sirop', 'sachets', 'crème', 'collyre')
+MANUFACTURERS = ('Sanofi', 'Biogaran', 'Sandoz', 'Mylan', 'Arrow', 'Teva', 'Zentiva')
+
+# Statuts des commandes historiques (pondérés : la plupart sont terminées)
+ORDER_STATUSES = (('completed', 80), ('cancelled', 8), ('ready', 4), ('confirmed', 4), ('pending', 4))
+
+# Motif des entrées de stock historiques
+DELIVERY_REASON = "Livraison fournisseur"
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _copy_value(value):
+    """Valeur au format CSV de COPY (NULL écrit \\N)"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+class TableLoader:
+    """
+    Écrit les lignes d'un modèle par lots, sans instancier de modèles
+
+    Les colonnes non fournies prennent la valeur par défaut du champ (date courante
+    pour auto_now et auto_now_add), comme lors d'un enregistrement par le modèle.
+    Les valeurs sont préparées par les champs (get_db_prep_save) : INSERT multiples
+    (executemany) sur toutes les bases, COPY sous PostgreSQL.
+    """
+
+    def __init__(self, model, names, use_copy, batch_size=BATCH_SIZE):
+        self.model = model
+        given = [model._meta.get_field(name) for name in names]
+        now = timezone.now()
+        defaulted = [
+            field for field in model._meta.concrete_fields
+            if field not in given and not field.primary_key
+        ]
+        self.defaults = [
+            now if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+            else field.get_default()
+            for field in defaulted
+        ]
+        self.fields = given + defaulted
+        self.use_copy = use_copy
+        self.batch_size = batch_size
+        self.rows = []
+        self.count = 0
+
+    def add(self, *values):
+        self.rows.append(values)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        columns = ', '.join(quote(field.column) for field in self.fields)
+        defaults = tuple(self.defaults)
+        with connection.cursor() as cursor:
+            if self.use_copy:
+                sql = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+                self._copy(cursor, sql, (row + defaults for row in self.rows))
+            else:
+                # Connexion résolue une fois (le proxy `connection` coûte un accès thread-local par valeur)
+                db = connections[DEFAULT_DB_ALIAS]
+                prepare = [field.get_db_prep_save for field in self.fields]
+                placeholders = ', '.join(['%s'] * len(self.fields))
+                cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", [
+                    [prep(value, db) for prep, value in zip(prepare, row + defaults)]
+                    for row in self.rows
+                ])
+        self.count += len(self.rows)
+        self.rows = []
+
+    @staticmethod
+    def _copy(cursor, sql, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([_copy_value(value) for value in row])
+        buffer.seek(0)
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, buffer)      # psycopg2
+        else:
+            with raw.copy(sql) as copy:       # psycopg 3
+                copy.write(buffer.getvalue())
+
+
+def _weighted(rng, choices):
+    population, weights = zip(*choices)
+    return lambda: rng.choices(population, weights)[0]
+
+
+def seed_pharmacy(categories=200, medicines=20000, users=10000, orders=100000, days=365,
+                  seed=42, use_copy=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Génère un catalogue, des clients et un historique de commandes cohérent
+
+    Chaque ligne de commande a son mouvement de sortie ; des livraisons (entrées)
+    complètent l'historique. Le stock de chaque médicament est celui du grand
+    livre : instantané d'ouverture avant l'historique plus tous les mouvements ;
+    il forme un lot unique. Statistiques, ventes et index de recherche sont
+    recalculés à la fin (les lignes sont écrites sans passer par les modèles ni les signaux).
+
+    Args:
+        use_copy (bool): COPY au lieu des INSERT (défaut : sous PostgreSQL)
+        progress (callable): Appelée avec (table, lignes écrites) après chaque table
+
+    Returns:
+        dict: Lignes écrites par table, identifiants de la première ligne de chaque table
+    """
+    if use_copy is None:
+        use_copy = connection.vendor == 'postgresql'
+    if use_copy and connection.vendor != 'postgresql':
+        raise ValueError("COPY n'est disponible que sous PostgreSQL.")
+    rng = random.Random(seed)
+    now = timezone.now()
+    today = timezone.localdate()
+    start = now - datetime.timedelta(days=days)
+    progress = progress or (lambda table, count: None)
+
+    def loader(model, *names):
+        return TableLoader(model, names, use_copy, batch_size)
+
+    with transaction.atomic():
+        first = {model: next_id(model) for model in (Category, Medicine, User, Order, OrderItem)}
+        staff = User.objects.create(
+            username=f"pharmacien_seed_{first[User]}", password=make_password(SEED_PASSWORD), is_staff=True,
+        )
+        first[User] = staff.pk + 1
+
+        # ===== CATÉGORIES =====
+        table = loader(Category, 'id', 'name', 'description')
+        for i in range(categories):
+            table.add(first[Category] + i, f"Catégorie {first[Category] + i}", "Catégorie générée")
+        table.flush()
+        progress('categories', table.count)
+
+        # ===== CLIENTS =====
+        password = make_password(SEED_PASSWORD)
+        accounts = loader(User, 'id', 'username', 'password', 'email', 'date_joined')
+        profiles = loader(UserProfile, 'user', 'phone_number', 'address')
+        for i in range(users):
+            pk = first[User] + i
+            accounts.add(pk, f"client{pk}", password, f"client{pk}@example.com",
+                         start + datetime.timedelta(seconds=rng.randrange(days * 86400)))
+            profiles.add(pk, f"06{rng.randrange(10 ** 8):08d}", f"{rng.randint(1, 200)} rue de la Santé")
+        accounts.flush()
+        profiles.flush()
+        progress('users', accounts.count)
+
+        # ===== COMMANDES, LIGNES ET SORTIES DE STOCK =====
+        prices = [Decimal(rng.randint(150, 5000)) / 100 for _ in range(medicines)]
+        # Popularité très inégale (quelques médicaments font l'essentiel des ventes) ; poids cumulés calculés une fois
+        popularity = list(itertools.accumulate(rng.paretovariate(1.2) for _ in range(medicines)))
+        indices = range(medicines)
+        out_totals = [0] * medicines
+        status = _weighted(rng, ORDER_STATUSES)
+        order_table = loader(Order, 'id', 'order_number', 'user', 'status', 'total_amount', 'created_at')
+        items = loader(OrderItem, 'id', 'order', 'medicine', 'quantity', 'price')
+        movements = loader(StockMovement, 'medicine', 'movement_type', 'quantity', 'reason',
+                           'created_by', 'created_at')
+        item_id = first[OrderItem]
+        offsets = sorted(rng.randrange(days * 86400) for _ in range(orders))
+        for i, offset in enumerate(offsets):
+            pk = first[Order] + i
+            created_at = start + datetime.timedelta(seconds=offset)
+            # « S » (hors hexadécimal) : pas de collision avec les numéros aléatoires de Order.save
+            order_number = f"PHS{pk:08X}"
+            total = Decimal(0)
+            for index in set(rng.choices(indices, cum_weights=popularity, k=rng.randint(1, 4))):
+                quantity = rng.randint(1, 3)
+                items.add(item_id, pk, first[Medicine] + index, quantity, prices[index])
+                movements.add(first[Medicine] + index, 'out', quantity, f"Commande {order_number}",
+                              staff.pk, created_at)
+                out_totals[index] += quantity
+                total += quantity * prices[index]
+                item_id += 1
+            order_table.add(pk, order_number, first[User] + rng.randrange(users), status(), total, created_at)
+        order_table.flush()
+        items.flush()
+        progress('orders', order_table.count)
+        progress('order items', items.count)
+
+        # ===== LIVRAISONS =====
+        in_totals = [0] * medicines
+        for index in range(medicines):
+            for _ in range(rng.randint(0, 3)):
+                quantity = rng.choice((20, 50, 100, 200))
+                movements.add(first[Medicine] + index, 'in', quantity, DELIVERY_REASON, staff.pk,
+                              start + datetime.timedelta(seconds=rng.randrange(days * 86400)))
+                in_totals[index] += quantity
+        movements.flush()
+        progress('stock movements', movements.count)
+
+        # ===== MÉDICAMENTS, LOTS ET INSTANTANÉS D'OUVERTURE =====
+        # Stock d'ouverture suffisant pour toutes les sorties : le stock ne devient jamais négatif
+        catalog = loader(
+            Medicine, 'id', 'name', 'description', 'category', 'price', 'active_ingredient', 'dosage',
+            'manufacturer', 'requires_prescription', 'expiry_date', 'stock_quantity', 'minimum_stock',
+            'stock_status', 'created_at',
+        )
+        lots = loader(StockLot, 'medicine', 'lot_number', 'expiry_date', 'quantity', 'received_at')
+        snapshots = loader(StockSnapshot, 'medicine', 'taken_at', 'quantity')
+        opened_at = start - datetime.timedelta(days=1)
+        for index in range(medicines):
+            pk = first[Medicine] + index
+            opening = out_totals[index] + rng.choice((0, 0, 5, 20, 100, 300))
+            stock = opening + in_totals[index] - out_totals[index]
+            minimum = rng.choice((5, 10, 20))
+            ingredient = rng.choice(NAME_WORDS)
+            dosage = f"{rng.choice((50, 100, 250, 500, 1000))} mg"
+            expiry = today + datetime.timedelta(days=rng.randint(30, 1000))
+            catalog.add(
+                pk, f"{ingredient.capitalize()} {dosage} {rng.choice(FORMS)} n°{pk}",
+                f"{ingredient} {rng.choice(NAME_WORDS)} {rng.choice(FORMS)}",
+                first[Category] + rng.randrange(categories), prices[index], ingredient, dosage,
+                rng.choice(MANUFACTURERS), rng.random() < 0.2, expiry, stock, minimum,
+                Medicine.compute_stock_status(stock, minimum), opened_at,
+            )
+            snapshots.add(pk, opened_at, opening)
+            if stock:
+                lots.add(pk, f"L{pk}", expiry, stock, opened_at)
+        catalog.flush()
+        lots.flush()
+        snapshots.flush()
+        progress('medicines', catalog.count)
+
+        if connection.vendor == 'postgresql':
+            # Les identifiants fournis (COPY comme INSERT) ne font pas avancer les séquences
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [
+                    Category, Medicine, User, UserProfile, Order, OrderItem,
+                    StockMovement, StockLot, StockSnapshot,
+                ]):
+                    cursor.execute(sql)
+
+    # ===== DONNÉES DÉRIVÉES =====
+    started = time.perf_counter()
+    reconcile_inventory_stats()
+    rebuild_daily_sales()
+    rebuild_search_index()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+    progress('derived data', round(time.perf_counter() - started, 1))
+
+    return {
+        'first_ids': {model._meta.label: pk for model, pk in first.items()},
+        'staff_id': staff.pk,
+        'rows': {
+            'categories': categories,
+            'medicines': medicines,
+            'users': users,
+            'orders': orders,
+            'order_items': item_id - first[OrderItem],
+            'stock_movements': movements.count,
+        },
+    }
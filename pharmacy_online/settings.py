@@ -128,6 +128,7 @@ INSTALLED_APPS = [
 # ===== CONFIGURATION DES MIDDLEWARES =====
 
 MIDDLEWARE = [
+    'pharmacy_online.profiling.ProfilingMiddleware',          # Profilage échantillonné (PROFILING_SAMPLE_RATE)
     'django.middleware.security.SecurityMiddleware',           # Sécurité générale
     'django.contrib.sessions.middleware.SessionMiddleware',    # Gestion des sessions
     'whitenoise.middleware.WhiteNoiseMiddleware',             # Servir les fichiers statiques (production)
@@ -356,6 +357,12 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # Mesures du middleware de profilage (une ligne clé=valeur par requête échantillonnée)
+        'pharmacy_online.profiling': {
+            'handlers': ['file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -398,4 +405,55 @@ else:
             'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
+
+# Durée de vie des entrées du cache catalogue (accueil, catégories, liste des médicaments)
+# en secondes ; les entrées sont de toute façon invalidées à chaque modification du catalogue
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+
+# ===== CONFIGURATION DES TÂCHES D'ARRIÈRE-PLAN =====
+
+# Exécution des tâches longues (rendu des factures PDF, vignettes des images) :
+# 'thread' = pool de threads local au processus, 'sync' = dans la requête
+BACKGROUND_TASKS_MODE = os.environ.get('BACKGROUND_TASKS_MODE', 'thread')
+
+# Nombre de threads du pool de tâches d'arrière-plan
+BACKGROUND_TASKS_WORKERS = int(os.environ.get('BACKGROUND_TASKS_WORKERS', 2))
+
+# Nombre de processus de rendu pour l'export groupé des factures depuis le site
+# (démarrés dans le worker web : borné par défaut ; la commande export_invoices
+# utilise par défaut tous les CPU)
+INVOICE_EXPORT_WORKERS = int(os.environ.get('INVOICE_EXPORT_WORKERS', 2))
+
+# ===== CONFIGURATION DU PROFILAGE DES REQUÊTES =====
+
+# Part des requêtes profilées (0 = middleware désactivé, 1 = toutes) : durée, nombre
+# et durée des requêtes SQL, requêtes répétées ; rapport sur /profiling/ (personnel)
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+
+# Nombre de mesures conservées par vue dans la fenêtre glissante (par processus)
+PROFILING_WINDOW = int(os.environ.get('PROFILING_WINDOW', 500))
+
+# ===== CONFIGURATION DES MÉTRIQUES (PROMETHEUS) =====
+
+# Répertoire des fichiers de métriques partagés entre les processus (workers gunicorn) ;
+# vide : métriques en mémoire du processus. À vider au démarrage du serveur
+# (ex: hook on_starting de gunicorn), pas à chaque redémarrage de worker
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+
+# Jeton attendu du scraper sur /metrics (Authorization: Bearer) ; vide : personnel connecté
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# ===== CONFIGURATION DES VIGNETTES D'IMAGES =====
+
+# Largeurs (pixels) des vignettes WebP/JPEG générées pour les images des médicaments.
+# Les vignettes (MEDIA_ROOT/medicines/thumbs/) ont un nom qui dépend de leur contenu :
+# le serveur web peut les servir avec un cache très long (Cache-Control: immutable)
+THUMBNAIL_WIDTHS = tuple(
+    int(width) for width in os.environ.get('THUMBNAIL_WIDTHS', '160,320,640').split(',')
+)
+
+# ===== CONFIGURATION DES RÉSERVATIONS DE STOCK =====
+
+# Durée de vie d'une réservation de stock liée à un panier (en minutes)
+STOCK_RESERVATION_TTL_MINUTES = int(os.environ.get('STOCK_RESERVATION_TTL_MINUTES', 15))
 >>>>>>> develop
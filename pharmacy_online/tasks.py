@@ -0,0 +1,64 @@
+# pharmacy_online/tasks.py
+# Exécution de tâches en arrière-plan (rendu de factures, vignettes d'images...)
+# Pool de threads local au processus ; mode synchrone pour les tests et le débogage
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Crée à la demande le pool de threads partagé par le processus"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BACKGROUND_TASKS_WORKERS', 2),
+                thread_name_prefix='pharmacy-task',
+            )
+        return _executor
+
+
+def _run(func, args, kwargs):
+    """Exécute la tâche, journalise les erreurs et ferme les connexions du thread"""
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception("Échec de la tâche d'arrière-plan %s", func.__name__)
+        raise
+    finally:
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Lance `func(*args, **kwargs)` hors du thread de la requête
+
+    Modes (paramètre BACKGROUND_TASKS_MODE) :
+    - 'thread' (défaut) : pool de threads local (BACKGROUND_TASKS_WORKERS threads)
+    - 'sync' : exécution immédiate dans le thread appelant
+
+    Returns:
+        Future | None: Future du pool de threads, None en mode synchrone
+    """
+    if getattr(settings, 'BACKGROUND_TASKS_MODE', 'thread') == 'sync':
+        func(*args, **kwargs)
+        return None
+    return _get_executor().submit(_run, func, args, kwargs)
+
+
+def wait_for_background_tasks():
+    """Attend la fin des tâches en cours (fin d'une commande de gestion, d'un benchmark)"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
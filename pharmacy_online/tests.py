@@ -0,0 +1,233 @@
+import datetime
+import multiprocessing
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.ledger import ledger_discrepancies
+from inventory.models import StockMovement
+from inventory.utils import update_stock
+from orders.models import Order
+from products.models import Category, Medicine
+from .benchmark import compare_results, run_journey, seed_benchmark_data
+from .metrics import CART_ADDITIONS, INVOICE_PDF_SECONDS
+from .pagination import CursorPaginator
+from .profiling import ProfilingMiddleware, registry, sql_fingerprint
+
+
+def make_medicine(name='Doliprane', stock=10):
+    category, _ = Category.objects.get_or_create(name='Antidouleurs')
+    return Medicine.objects.create(
+        name=name,
+        description=f"Description de {name}",
+        category=category,
+        price=Decimal('2.50'),
+        expiry_date=datetime.date.today() + datetime.timedelta(days=365),
+        stock_quantity=stock,
+    )
+
+
+class CursorPaginatorTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('magasinier')
+        medicine = make_medicine()
+        StockMovement.objects.bulk_create([
+            StockMovement(medicine=medicine, movement_type='in', quantity=i,
+                          reason='Livraison', created_by=user)
+            for i in range(7)
+        ])
+        # Horodatages identiques : l'id départage les mouvements
+        StockMovement.objects.update(created_at=timezone.now())
+
+    def test_walks_forward_and_backward_without_gaps(self):
+        paginator = CursorPaginator(StockMovement.objects.all(), ('-created_at', '-id'), 3)
+        expected = list(StockMovement.objects.order_by('-id').values_list('id', flat=True))
+
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+        self.assertEqual([m.id for page in (first, second, third) for m in page], expected)
+        self.assertFalse(first.has_previous)
+        self.assertFalse(third.has_next)
+
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual([m.id for m in back], [m.id for m in second])
+        self.assertTrue(back.has_previous)
+
+    def test_each_page_is_a_single_query(self):
+        paginator = CursorPaginator(StockMovement.objects.all(), ('-created_at', '-id'), 3)
+        cursor = paginator.get_page(None).next_cursor
+        with self.assertNumQueries(1):
+            paginator.get_page(cursor)
+
+    def test_invalid_cursor_returns_first_page(self):
+        paginator = CursorPaginator(StockMovement.objects.all(), ('-created_at', '-id'), 3)
+        self.assertEqual(
+            [m.id for m in paginator.get_page('pas-un-curseur')],
+            [m.id for m in paginator.get_page(None)],
+        )
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.addCleanup(registry.clear)
+        self.request = RequestFactory().get('/inventory/')
+        self.request.user = User.objects.create_user('pharmacien', is_staff=True)
+
+    def test_sampled_request_reports_sql_and_repeated_queries(self):
+        make_medicine('Doliprane')
+
+        def n_plus_one(request):
+            for pk in Medicine.objects.values_list('pk', flat=True)[:1]:
+                for _ in range(6):
+                    Medicine.objects.filter(pk=pk).exists()
+            return HttpResponse('ok')
+
+        with self.assertLogs('pharmacy_online.profiling', 'WARNING') as logs:
+            response = ProfilingMiddleware(n_plus_one)(self.request)
+
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="7 SQL, 5 repeated"$')
+        self.assertIn('sql_count=7', logs.output[0])
+        self.assertIn('repeated_max=6', logs.output[0])
+        [report] = registry.report()
+        self.assertEqual((report['view'], report['requests'], report['avg_sql_count']), ('unresolved', 1, 7))
+        self.assertEqual(report['duplicate_queries'][0]['count'], 6)
+
+    def test_timing_header_is_not_sent_to_customers(self):
+        self.request.user = AnonymousUser()
+        response = ProfilingMiddleware(lambda request: HttpResponse())(self.request)
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(registry.report()[0]['requests'], 1)
+
+    def test_sql_fingerprint_ignores_literals_and_in_list_lengths(self):
+        self.assertEqual(
+            sql_fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'x\' LIMIT 21'),
+            sql_fingerprint('SELECT * FROM t WHERE id IN (%s) AND name = \'y\' LIMIT 1'),
+        )
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_disabled_middleware_is_removed_from_the_chain(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse())
+
+    def test_report_endpoint_is_staff_only(self):
+        url = reverse('profiling_report')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.request.user)
+        ProfilingMiddleware(lambda request: HttpResponse())(self.request)
+        views = {row['view']: row for row in self.client.get(url, {'reset': 1}).json()['views']}
+        # Requête de redirection vers la connexion, profilée par le middleware du projet
+        self.assertEqual(views['profiling_report']['requests'], 1)
+        self.assertEqual(sum(views['unresolved']['histogram_ms'].values()), 1)
+        # Un GET ne vide jamais la fenêtre (préchargement, lien partagé)
+        self.assertIn('unresolved', [row['view'] for row in registry.report()])
+
+        reset = reverse('profiling_reset')
+        self.assertEqual(self.client.get(reset).status_code, 405)
+        views = {row['view'] for row in self.client.post(reset).json()['views']}
+        self.assertIn('unresolved', views)
+        # Fenêtre vidée : seule la requête de remise à zéro, mesurée après la vue, y figure
+        self.assertEqual([row['view'] for row in registry.report()], ['profiling_reset'])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        # Répertoire propre à chaque test : les valeurs des autres tests n'y figurent pas
+        self.directory = directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.enterContext(override_settings(METRICS_DIR=directory, METRICS_TOKEN='secret'))
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_counters_from_all_processes_are_summed(self):
+        def work():
+            for _ in range(10):
+                CART_ADDITIONS.inc(outcome='added')
+            os._exit(0)
+
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=work) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        CART_ADDITIONS.inc(outcome='added')
+
+        self.assertIn('pharmacy_cart_additions_total{outcome="added"} 31.0', self.scrape())
+        # Fichiers des processus terminés fusionnés dans l'archive : rien n'est perdu ni compté deux fois
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory) if name.endswith('.db')),
+            sorted(['metrics_archive.db', f'metrics_{os.getpid()}.db']),
+        )
+        self.assertIn('pharmacy_cart_additions_total{outcome="added"} 31.0', self.scrape())
+
+    def test_stock_out_is_counted_after_commit(self):
+        medicine = make_medicine(stock=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_stock(medicine, 3, 'out', "Casse", User.objects.create_user('pharmacien'))
+
+        text = self.scrape()
+        self.assertIn('pharmacy_stockouts_total 1.0', text)
+        self.assertIn('pharmacy_stock_updates_total{movement_type="out"} 1.0', text)
+        self.assertIn('pharmacy_out_of_stock_medicines 1.0', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        INVOICE_PDF_SECONDS.observe(0.02)
+        INVOICE_PDF_SECONDS.observe(3)
+
+        text = self.scrape()
+        self.assertIn('# TYPE pharmacy_invoice_pdf_duration_seconds histogram', text)
+        self.assertIn('pharmacy_invoice_pdf_duration_seconds_bucket{le="0.01"} 0.0', text)
+        self.assertIn('pharmacy_invoice_pdf_duration_seconds_bucket{le="0.025"} 1.0', text)
+        self.assertIn('pharmacy_invoice_pdf_duration_seconds_bucket{le="+Inf"} 2.0', text)
+        self.assertIn('pharmacy_invoice_pdf_duration_seconds_count 2.0', text)
+
+    def test_endpoint_requires_the_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(
+            self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403,
+        )
+
+
+@override_settings(BACKGROUND_TASKS_MODE='sync')
+class BenchmarkHarnessTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.data = seed_benchmark_data(categories=3, medicines=40, users=4, orders=30, seed=7)
+
+    def test_seeded_dataset_is_consistent_with_the_ledger(self):
+        self.assertEqual(self.data.counts(), {'categories': 3, 'medicines': len(self.data.medicine_ids),
+                                              'users': 4, 'orders': 30})
+        self.assertEqual(Order.objects.filter(total_amount=0).count(), 0)
+        self.assertFalse(ledger_discrepancies().exists())
+
+    def test_checkout_journey_places_orders(self):
+        orders = Order.objects.count()
+        row = run_journey('checkout', self.data, requests=5, concurrency=1, seed=7)
+
+        self.assertEqual((row['requests'], row['errors'], row['status_codes']), (5, 0, {'302': 5}))
+        self.assertEqual(Order.objects.count(), orders + 5)
+        self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+        self.assertFalse(ledger_discrepancies().exists())
+
+    def test_compare_results_reports_ratios(self):
+        baseline = {'journeys': [{'journey': 'checkout', 'p50_ms': 10, 'p99_ms': 40, 'throughput_rps': 100}]}
+        current = {'journeys': [{'journey': 'checkout', 'p50_ms': 15, 'p99_ms': 40, 'throughput_rps': 50}]}
+        self.assertEqual(compare_results(baseline, current), [{
+            'journey': 'checkout', 'p50_ms_ratio': 1.5, 'p99_ms_ratio': 1.0, 'throughput_rps_ratio': 0.5,
+        }])
@@ -43,6 +43,8 @@ urlpatterns = [
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 =======
 from products.views import home
+from pharmacy_online.metrics import metrics_view
+from pharmacy_online.profiling import profiling_report, profiling_reset
 
 # ===== CONFIGURATION DES PATTERNS D'URLS PRINCIPAUX =====
 
@@ -74,6 +76,13 @@ urlpatterns = [
     # URLs d'authentification Django par défaut
     # Inclut login/, logout/, password_change/, etc.
     path('auth/', include('django.contrib.auth.urls')),
+
+    # Mesures du profilage des requêtes par vue (personnel, JSON) ; remise à zéro en POST
+    path('profiling/', profiling_report, name='profiling_report'),
+    path('profiling/reset/', profiling_reset, name='profiling_reset'),
+
+    # Métriques au format texte Prometheus (jeton METRICS_TOKEN ou personnel)
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # ===== CONFIGURATION DES FICHIERS MÉDIA (DÉVELOPPEMENT) =====
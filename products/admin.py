@@ -27,11 +27,19 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Medicine)
 class MedicineAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price', 'stock_quantity', 'is_available', 'expiry_date']
-    list_filter = ['category', 'is_available', 'requires_prescription', 'created_at']
+    list_display = ['name', 'category', 'price', 'stock_quantity', 'stock_status', 'is_available', 'expiry_date']
+    list_filter = ['stock_status', 'category', 'is_available', 'requires_prescription', 'created_at']
     search_fields = ['name', 'active_ingredient', 'manufacturer']
-    list_editable = ['price', 'stock_quantity', 'is_available']
-    readonly_fields = ['created_at', 'updated_at']
+    # Le stock est la somme des lots : il se modifie par les mouvements de stock
+    list_editable = ['price', 'is_available']
+    readonly_fields = ['stock_quantity', 'stock_status', 'created_at', 'updated_at']
+
+    def get_readonly_fields(self, request, obj=None):
+        # La péremption est celle du premier lot en stock : saisie à la création
+        # (lot initial), ensuite recalculée par les mouvements de stock
+        if obj is None:
+            return self.readonly_fields
+        return self.readonly_fields + ['expiry_date']
 
     fieldsets = (
         ('Informations générales', {
@@ -41,7 +49,7 @@ class MedicineAdmin(admin.ModelAdmin):
             'fields': ('active_ingredient', 'dosage', 'manufacturer', 'requires_prescription')
         }),
         ('Prix et stock', {
-            'fields': ('price', 'stock_quantity', 'minimum_stock', 'expiry_date')
+            'fields': ('price', 'stock_quantity', 'minimum_stock', 'stock_status', 'expiry_date')
         }),
         ('Dates', {
             'fields': ('created_at', 'updated_at'),
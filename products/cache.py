@@ -0,0 +1,97 @@
+# products/cache.py
+# Cache du catalogue (page d'accueil, catégories, pages de la liste des médicaments)
+# Les clés sont versionnées : toute modification du catalogue incrémente la version,
+# ce qui invalide d'un coup toutes les entrées sans avoir à les énumérer
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from inventory.sales import top_selling_medicines
+from pharmacy_online.metrics import CATALOG_CACHE
+from .models import Category, Medicine
+
+# Clé du numéro de version courant du catalogue
+VERSION_KEY = 'catalog:version'
+
+
+def catalog_timeout():
+    """Durée de vie des entrées du cache catalogue (paramètre CATALOG_CACHE_TIMEOUT)"""
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def catalog_version():
+    """Version courante du catalogue (initialisée à 1 si absente du cache)"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def invalidate_catalog():
+    """Invalide toutes les entrées du cache catalogue en changeant de version"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Version absente (cache vidé ou redémarré) : repartir d'une nouvelle version
+        cache.add(VERSION_KEY, 1, timeout=None)
+        cache.incr(VERSION_KEY)
+
+
+def catalog_key(name, *parts):
+    """
+    Construit une clé de cache versionnée
+
+    Les paramètres libres (terme de recherche, curseur...) sont hachés pour
+    rester compatibles avec toutes les implémentations de cache.
+    """
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f"catalog:v{catalog_version()}:{name}:{digest}"
+
+
+def cached(name, parts, builder):
+    """
+    Retourne la valeur en cache ou la calcule avec `builder()` puis la stocke
+
+    Args:
+        name (str): Nom du fragment (ex: 'featured')
+        parts (tuple): Paramètres qui distinguent les entrées (catégorie, recherche, page)
+        builder (callable): Fonction sans argument qui calcule la valeur (évaluée, picklable)
+    """
+    key = catalog_key(name, *parts)
+    value = cache.get(key)
+    if value is None:
+        CATALOG_CACHE.inc(fragment=name, result='miss')
+        value = builder()
+        cache.set(key, value, timeout=catalog_timeout())
+    else:
+        CATALOG_CACHE.inc(fragment=name, result='hit')
+    return value
+
+
+# ===== FRAGMENTS DU CATALOGUE =====
+
+def get_featured_medicines(limit=8):
+    """Médicaments en vedette de la page d'accueil (les plus récents disponibles)"""
+    return cached('featured', (limit,), lambda: list(
+        Medicine.objects.filter(is_available=True, stock_quantity__gt=0)
+        .order_by('-created_at')[:limit]
+    ))
+
+
+def get_categories(limit=None):
+    """Liste des catégories, éventuellement limitée (menu de navigation)"""
+    def build():
+        categories = Category.objects.all()
+        return list(categories[:limit] if limit else categories)
+    return cached('categories', (limit,), build)
+
+
+def get_best_sellers(days=30, limit=8):
+    """Meilleures ventes disponibles sur les `days` derniers jours (agrégat journalier)"""
+    return cached('best_sellers', (days, limit), lambda: list(top_selling_medicines(
+        days, limit,
+        queryset=Medicine.objects.filter(is_available=True, stock_quantity__gt=0),
+    )))
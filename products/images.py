@@ -0,0 +1,154 @@
+# products/images.py
+# Vignettes des images des médicaments (WebP et JPEG, plusieurs largeurs)
+# Générées en arrière-plan après l'upload ; le nom des fichiers contient l'empreinte
+# de l'image d'origine : une vignette ne change jamais et peut être mise en cache
+# indéfiniment par le navigateur et le CDN
+
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from pharmacy_online.tasks import run_in_background
+from .cache import invalidate_catalog
+from .models import Medicine
+
+logger = logging.getLogger(__name__)
+
+# Sous-répertoire de MEDIA_ROOT contenant les vignettes
+THUMBNAIL_DIR = 'medicines/thumbs'
+
+# Largeurs générées (pixels) : grilles du catalogue jusqu'aux écrans haute densité
+THUMBNAIL_WIDTHS = (160, 320, 640)
+
+# Format : (extension, format Pillow, options d'enregistrement)
+THUMBNAIL_FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def thumbnail_widths():
+    return getattr(settings, 'THUMBNAIL_WIDTHS', THUMBNAIL_WIDTHS)
+
+
+def image_fingerprint(file):
+    """Empreinte SHA-256 (tronquée) du contenu de l'image, lue par blocs"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()[:16]
+
+
+def thumbnail_name(fingerprint, width, file_format):
+    """Chemin de stockage d'une vignette, relatif à MEDIA_ROOT"""
+    return f"{THUMBNAIL_DIR}/{fingerprint}_{width}.{THUMBNAIL_FORMATS[file_format][0]}"
+
+
+def _load_image(file, max_width):
+    """Ouvre l'image, orientée selon l'EXIF ; les JPEG sont décodés directement à taille réduite"""
+    image = Image.open(file)
+    image.draft('RGB', (max_width, max_width * 4))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    return image
+
+
+def _encode(image, file_format):
+    _, pillow_format, options = THUMBNAIL_FORMATS[file_format]
+    if pillow_format == 'JPEG' and image.mode == 'RGBA':
+        # Pas de transparence en JPEG : fond blanc
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def build_variants(file):
+    """
+    Génère les vignettes d'une image, sans agrandissement
+
+    Les vignettes déjà présentes (même image d'origine) ne sont pas recalculées.
+
+    Args:
+        file: Fichier image ouvert en binaire
+
+    Returns:
+        dict: {'webp': {largeur: nom}, 'jpeg': {largeur: nom}}
+    """
+    fingerprint = image_fingerprint(file)
+    configured = sorted(thumbnail_widths())
+    image = _load_image(file, configured[-1])
+    # Jamais d'agrandissement : les largeurs supérieures sont remplacées par celle de l'image
+    widths = [width for width in configured if width < image.width]
+    if len(widths) < len(configured):
+        widths.append(image.width)
+
+    variants = {file_format: {} for file_format in THUMBNAIL_FORMATS}
+    for width in widths:
+        resized = None
+        for file_format in THUMBNAIL_FORMATS:
+            name = thumbnail_name(fingerprint, width, file_format)
+            if not default_storage.exists(name):
+                if resized is None:
+                    height = max(1, round(image.height * width / image.width))
+                    resized = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+                name = default_storage.save(name, ContentFile(_encode(resized, file_format)))
+            variants[file_format][str(width)] = name
+    return variants
+
+
+def generate_image_variants(medicine_id):
+    """
+    Tâche d'arrière-plan : vignettes de l'image actuelle d'un médicament
+
+    L'enregistrement ne porte que sur image_variants et seulement si l'image
+    n'a pas changé entre-temps.
+
+    Returns:
+        dict | None: Vignettes, None si le médicament n'existe plus ou n'a pas d'image
+    """
+    image = Medicine.objects.filter(pk=medicine_id).values_list('image', flat=True).first()
+    if not image:
+        return None
+    try:
+        with default_storage.open(image, 'rb') as file:
+            variants = build_variants(file)
+    except (OSError, Image.DecompressionBombError):
+        logger.warning("Vignettes impossibles pour l'image %s du médicament %s", image, medicine_id)
+        return None
+
+    variants['source'] = image
+    if Medicine.objects.filter(pk=medicine_id, image=image).update(image_variants=variants):
+        invalidate_catalog()
+    return variants
+
+
+def schedule_image_variants(medicine_id):
+    """Planifie la génération des vignettes après validation de la transaction en cours"""
+    transaction.on_commit(lambda: run_in_background(generate_image_variants, medicine_id))
+
+
+def image_sources(medicine, file_format='jpeg'):
+    """
+    Vignettes à jour de l'image du médicament, par largeur croissante
+
+    Returns:
+        list: Tuples (largeur, url) ; vide si les vignettes ne sont pas (encore) générées
+    """
+    variants = medicine.image_variants or {}
+    if not medicine.image or variants.get('source') != medicine.image.name:
+        return []
+    return sorted(
+        (int(width), default_storage.url(name)) for width, name in variants.get(file_format, {}).items()
+    )
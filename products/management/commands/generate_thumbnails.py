@@ -0,0 +1,35 @@
+# products/management/commands/generate_thumbnails.py
+# Génère les vignettes manquantes (images antérieures au pipeline, changement
+# de THUMBNAIL_WIDTHS) ; les vignettes déjà présentes ne sont pas recalculées
+
+from django.core.management.base import BaseCommand
+
+from products.images import generate_image_variants
+from products.models import Medicine
+
+
+class Command(BaseCommand):
+    help = "Génère les vignettes WebP/JPEG des images des médicaments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Traite toutes les images, y compris celles qui ont déjà leurs vignettes",
+        )
+
+    def handle(self, *args, **options):
+        medicines = (
+            Medicine.objects.exclude(image='').exclude(image__isnull=True)
+            .only('id', 'image', 'image_variants').order_by('pk')
+        )
+        done = failed = 0
+        for medicine in medicines.iterator(chunk_size=500):
+            if not options['all'] and (medicine.image_variants or {}).get('source') == medicine.image.name:
+                continue
+            if generate_image_variants(medicine.pk):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Vignettes générées pour {done} image(s), {failed} image(s) illisible(s)."
+        ))
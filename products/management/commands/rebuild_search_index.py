@@ -0,0 +1,17 @@
+# products/management/commands/rebuild_search_index.py
+# Reconstruit l'index de recherche plein texte du catalogue (après un import en masse)
+
+from django.core.management.base import BaseCommand
+
+from products.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des médicaments"
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index()
+        if indexed is None:
+            self.stdout.write("Aucun index à reconstruire (PostgreSQL maintient son index GIN).")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{indexed} médicament(s) indexé(s)."))
@@ -0,0 +1,46 @@
+# products/management/commands/seed_pharmacy.py
+# Jeu de données synthétique de grande taille (tests de charge, plans d'exécution réalistes)
+# Déterministe (--seed) ; écrit dans la base configurée, à la suite des données existantes.
+# Sous PostgreSQL les tables sont chargées par COPY (--no-copy : INSERT multiples).
+# Ex: python manage.py seed_pharmacy --medicines 100000 --users 200000 --orders 1000000
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pharmacy_online.seeding import BATCH_SIZE, seed_pharmacy
+
+
+class Command(BaseCommand):
+    help = "Génère catalogue, clients, commandes et mouvements de stock synthétiques (déterministes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=200, help="Catégories")
+        parser.add_argument('--medicines', type=int, default=20000, help="Médicaments")
+        parser.add_argument('--users', type=int, default=10000, help="Clients (avec profil)")
+        parser.add_argument('--orders', type=int, default=100000, help="Commandes (1 à 4 lignes chacune)")
+        parser.add_argument('--days', type=int, default=365, help="Période couverte par l'historique (jours)")
+        parser.add_argument('--seed', type=int, default=42, help="Graine du générateur aléatoire")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Lignes par lot")
+        parser.add_argument('--no-copy', action='store_true', help="INSERT multiples même sous PostgreSQL")
+
+    def handle(self, *args, **options):
+        if min(options['categories'], options['medicines'], options['users'], options['days']) < 1:
+            raise CommandError("Il faut au moins une catégorie, un médicament, un client et un jour.")
+        started = time.perf_counter()
+
+        def progress(table, count):
+            self.stderr.write(f"{time.perf_counter() - started:8.1f} s  {table} : {count}")
+
+        result = seed_pharmacy(
+            categories=options['categories'], medicines=options['medicines'], users=options['users'],
+            orders=options['orders'], days=options['days'], seed=options['seed'],
+            use_copy=False if options['no_copy'] else None, batch_size=options['batch_size'],
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+        rows = sum(result['rows'].values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows} ligne(s) en {elapsed:.1f} s ({rows / elapsed:.0f} lignes/s) : "
+            + ", ".join(f"{count} {table}" for table, count in result['rows'].items())
+        ))
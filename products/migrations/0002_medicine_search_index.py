@@ -0,0 +1,49 @@
+# Index de recherche plein texte des médicaments
+# PostgreSQL : index GIN sur l'expression tsvector utilisée par products/search.py
+# SQLite : table virtuelle FTS5 alimentée par les signaux de products/signals.py
+
+from django.db import migrations
+
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(active_ingredient, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS products_medicine_search_gin "
+            f"ON products_medicine USING gin (({PG_SEARCH_VECTOR}))"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS products_medicine_fts USING fts5("
+            "name, active_ingredient, description, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO products_medicine_fts (rowid, name, active_ingredient, description) "
+            "SELECT id, name, active_ingredient, description FROM products_medicine"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS products_medicine_search_gin")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS products_medicine_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_medicine_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['name', 'id'], name='products_me_name_f3524b_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:30
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+
+
+def fill_stock_status(apps, schema_editor):
+    # Statut initial calculé en un seul UPDATE (même règle que Medicine.compute_stock_status)
+    Medicine = apps.get_model('products', 'Medicine')
+    Medicine.objects.update(stock_status=Case(
+        When(stock_quantity=0, then=Value('out')),
+        When(stock_quantity__lte=F('minimum_stock'), then=Value('low')),
+        default=Value('ok'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_medicine_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicine',
+            name='stock_status',
+            field=models.CharField(choices=[('ok', 'En stock'), ('low', 'Stock faible'), ('out', 'Rupture')], default='out', editable=False, max_length=3),
+        ),
+        migrations.RunPython(fill_stock_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['stock_status', 'name'], name='products_me_stock_s_dc9e79_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_medicine_stock_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['expiry_date'], name='products_me_expiry__73583f_idx'),
+        ),
+    ]
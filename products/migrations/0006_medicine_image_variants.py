@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_medicine_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicine',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -24,10 +24,27 @@ class Product(models.Model):
 # Définit la structure des catégories et médicaments dans la base de données
 
 from django.db import models
+from django.db.models import Case, F, Value, When
+from django.db.models.lookups import LessThanOrEqual
 from django.contrib.auth.models import User
 from django.urls import reverse
 
 
+def stock_status_expression(stock=F('stock_quantity'), minimum=F('minimum_stock')):
+    """
+    Expression SQL du statut de stock ('out', 'low' ou 'ok')
+
+    Les UPDATE en masse (checkout, annulations) passent la nouvelle quantité en
+    `stock` pour tenir stock_status à jour dans la même requête.
+    """
+    return Case(
+        When(LessThanOrEqual(stock, 0), then=Value('out')),
+        When(LessThanOrEqual(stock, minimum), then=Value('low')),
+        default=Value('ok'),
+        output_field=models.CharField(),
+    )
+
+
 class Category(models.Model):
     """
     Modèle pour les catégories de médicaments
@@ -86,6 +103,11 @@ class Medicine(models.Model):
     # Image du médicament (optionnel)
     # upload_to='medicines/' : stocke les images dans le dossier media/medicines/
     image = models.ImageField(upload_to='medicines/', blank=True, null=True)
+
+    # Vignettes de l'image en plusieurs largeurs (WebP et JPEG), générées en
+    # arrière-plan après l'upload (voir products/images.py)
+    # Format : {'source': nom de l'image, 'webp': {largeur: nom}, 'jpeg': {largeur: nom}}
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     
     # ===== INFORMATIONS MÉDICALES =====
     
@@ -116,6 +138,18 @@ class Medicine(models.Model):
     # Indique si le médicament est disponible à la vente
     # Peut être False même si stock_quantity > 0 (ex: retrait temporaire)
     is_available = models.BooleanField(default=True)
+
+    # Statut de stock précalculé à chaque modification du stock ou du seuil
+    # (save() et UPDATE en masse via stock_status_expression) : les rapports de
+    # stock faible et de rupture deviennent des lectures d'index
+    STOCK_STATUS_CHOICES = [
+        ('ok', 'En stock'),
+        ('low', 'Stock faible'),
+        ('out', 'Rupture'),
+    ]
+    stock_status = models.CharField(
+        max_length=3, choices=STOCK_STATUS_CHOICES, default='out', editable=False
+    )
     
     # ===== TIMESTAMPS =====
     
@@ -128,11 +162,36 @@ class Medicine(models.Model):
     class Meta:
         # Tri par défaut par nom alphabétique
         ordering = ['name']
+        indexes = [
+            # Parcours du catalogue par curseur (name, id)
+            models.Index(fields=['name', 'id']),
+            # Rapports de stock faible / rupture, triés par nom
+            models.Index(fields=['stock_status', 'name']),
+            # Médicaments périmés ou proches de la péremption
+            models.Index(fields=['expiry_date']),
+        ]
 
     def __str__(self):
         """Représentation textuelle du médicament"""
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Recalcule le statut de stock avant chaque enregistrement"""
+        self.stock_status = self.compute_stock_status(self.stock_quantity, self.minimum_stock)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'stock_quantity', 'minimum_stock'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'stock_status'}
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def compute_stock_status(stock_quantity, minimum_stock):
+        """Statut de stock ('out', 'low' ou 'ok'), même règle que stock_status_expression"""
+        if stock_quantity <= 0:
+            return 'out'
+        if stock_quantity <= minimum_stock:
+            return 'low'
+        return 'ok'
+
     def get_absolute_url(self):
         """
         Retourne l'URL pour afficher les détails de ce médicament
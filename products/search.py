@@ -0,0 +1,161 @@
+# products/search.py
+# Recherche plein texte dans le catalogue des médicaments
+# PostgreSQL : index GIN sur un tsvector ; SQLite : table virtuelle FTS5 ; autres : icontains
+
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+
+# Nombre maximum de résultats classés renvoyés par une recherche
+SEARCH_RESULTS_LIMIT = 500
+
+# Table virtuelle FTS5 utilisée sous SQLite (rowid = id du médicament)
+FTS_TABLE = 'products_medicine_fts'
+
+# Expression tsvector indexée sous PostgreSQL (voir migration 0002_medicine_search_index).
+# La requête doit utiliser exactement la même expression pour que l'index GIN soit utilisé.
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(active_ingredient, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+# Mots de la recherche (lettres, chiffres, y compris accentués)
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """Découpe la saisie utilisateur en mots, sans opérateurs de recherche"""
+    return [term.lower() for term in WORD_RE.findall(query or '')]
+
+
+def fts_available():
+    """Indique si la table FTS5 existe sur la base SQLite courante"""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def _ranked_ids(terms, limit, queryset):
+    """
+    Identifiants des médicaments correspondants, du plus pertinent au moins pertinent
+
+    Chaque mot est recherché en préfixe (« dolip » trouve « Doliprane ») et tous
+    les mots doivent être présents. Seuls les médicaments de `queryset` sont
+    classés : la limite s'applique après les filtres de l'appelant (stock,
+    catégorie), pas sur tout le catalogue.
+
+    Returns:
+        list | None: Liste d'ids, ou None si aucun index plein texte n'est disponible
+    """
+    candidates, candidate_params = queryset.order_by().values('pk').query.sql_with_params()
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f"{term}:*" for term in terms)
+        sql = (
+            f"SELECT id FROM products_medicine, to_tsquery('simple', %s) query "
+            f"WHERE ({PG_SEARCH_VECTOR}) @@ query AND id IN ({candidates}) "
+            f"ORDER BY ts_rank({PG_SEARCH_VECTOR}, query) DESC, name "
+            f"LIMIT %s"
+        )
+        params = [tsquery, *candidate_params, limit]
+    elif fts_available():
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # bm25 : plus petit = plus pertinent ; poids nom > principe actif > description
+        sql = (
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({candidates}) "
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 1.0) LIMIT %s"
+        )
+        params = [match, *candidate_params, limit]
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_medicines(queryset, query, limit=SEARCH_RESULTS_LIMIT):
+    """
+    Filtre un QuerySet de médicaments par recherche plein texte, classé par pertinence
+
+    Args:
+        queryset (QuerySet): Médicaments candidats (ex: disponibles et en stock)
+        query (str): Saisie de l'utilisateur
+        limit (int): Nombre maximum de résultats classés (parmi les candidats)
+
+    Returns:
+        QuerySet: Médicaments correspondants, triés par pertinence
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    ids = _ranked_ids(terms, limit, queryset)
+    if ids is None:
+        # Pas d'index plein texte : recherche simple insensible à la casse
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term) |
+                Q(active_ingredient__icontains=term) |
+                Q(description__icontains=term)
+            )
+        return queryset
+
+    if not ids:
+        return queryset.none()
+
+    # Conservation de l'ordre de pertinence calculé par l'index
+    rank = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(rank)
+
+
+# ===== SYNCHRONISATION DE L'INDEX SQLITE =====
+
+def index_medicine(medicine):
+    """Ajoute ou met à jour un médicament dans l'index FTS5 (sans effet hors SQLite)"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [medicine.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, active_ingredient, description) "
+            f"VALUES (%s, %s, %s, %s)",
+            [medicine.pk, medicine.name, medicine.active_ingredient, medicine.description],
+        )
+
+
+def unindex_medicine(medicine_id):
+    """Retire un médicament de l'index FTS5 (sans effet hors SQLite)"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [medicine_id])
+
+
+def rebuild_search_index():
+    """
+    Reconstruit entièrement l'index FTS5 depuis la table des médicaments
+
+    À lancer après des imports en masse (bulk_create ne déclenche pas les signaux).
+    Sous PostgreSQL l'index GIN est maintenu par la base : rien à faire.
+
+    Returns:
+        int | None: Nombre de médicaments indexés, None si aucun index à reconstruire
+    """
+    if not fts_available():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, active_ingredient, description) "
+            f"SELECT id, name, active_ingredient, description FROM products_medicine"
+        )
+        return cursor.rowcount
@@ -0,0 +1,45 @@
+# products/signals.py
+# Signaux du catalogue : maintien de l'index de recherche plein texte,
+# invalidation du cache catalogue et vignettes des images
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog
+from .images import schedule_image_variants
+from .models import Category, Medicine
+from .search import index_medicine, unindex_medicine
+
+
+@receiver(post_save, sender=Medicine)
+def update_search_index(sender, instance, **kwargs):
+    """Réindexe le médicament après chaque enregistrement"""
+    index_medicine(instance)
+
+
+@receiver(post_delete, sender=Medicine)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Retire le médicament supprimé de l'index"""
+    unindex_medicine(instance.pk)
+
+
+@receiver(post_save, sender=Medicine)
+def update_image_variants(sender, instance, raw=False, **kwargs):
+    """Nouvelle image (ou vignettes manquantes) : vignettes générées en arrière-plan"""
+    if raw or not instance.image:
+        return
+    if (instance.image_variants or {}).get('source') != instance.image.name:
+        schedule_image_variants(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Medicine)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Toute modification d'un médicament ou d'une catégorie invalide le cache catalogue
+
+    Après validation de la transaction (comme au checkout et à la réception) : une
+    requête concurrente ne peut pas remettre en cache les données d'avant la validation.
+    """
+    transaction.on_commit(invalidate_catalog)
@@ -0,0 +1,43 @@
+# products/templatetags/medicine_images.py
+# Images responsives des médicaments : srcset des vignettes WebP/JPEG
+# Usage : {% load medicine_images %} puis {% medicine_picture medicine sizes="..." %}
+
+from django import template
+from django.utils.html import format_html
+
+from products.images import image_sources
+
+register = template.Library()
+
+# Taille affichée par défaut : grille du catalogue (12 vignettes, 4 par ligne sur ordinateur)
+DEFAULT_SIZES = '(max-width: 576px) 50vw, (max-width: 992px) 33vw, 240px'
+
+
+@register.simple_tag
+def image_srcset(medicine, file_format='jpeg'):
+    """Attribut srcset des vignettes ('url 160w, url 320w, ...'), vide si non générées"""
+    return ', '.join(f"{url} {width}w" for width, url in image_sources(medicine, file_format))
+
+
+@register.simple_tag
+def medicine_picture(medicine, sizes=DEFAULT_SIZES, css_class=''):
+    """
+    Élément <picture> : WebP pour les navigateurs qui le lisent, JPEG sinon
+
+    Tant que les vignettes ne sont pas générées, l'image d'origine est affichée.
+    """
+    if not medicine.image:
+        return ''
+    jpeg = image_sources(medicine, 'jpeg')
+    if not jpeg:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async">',
+            medicine.image.url, medicine.name, css_class,
+        )
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        image_srcset(medicine, 'webp'), sizes,
+        jpeg[0][1], image_srcset(medicine, 'jpeg'), sizes, medicine.name, css_class,
+    )
@@ -1,3 +1,220 @@
-from django.test import TestCase
+import datetime
+import io
+import shutil
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from inventory.ledger import ledger_discrepancies
+from inventory.models import StockMovement
+from orders.checkout import place_order
+from orders.models import Cart, CartItem, Order, OrderItem
+from pharmacy_online.seeding import seed_pharmacy
+from .cache import get_categories, get_featured_medicines
+from .models import Category, Medicine
+from .search import search_medicines
+
+
+def make_medicine(category, name, active_ingredient='', description='', stock=10):
+    return Medicine.objects.create(
+        name=name,
+        description=description or f"Description de {name}",
+        category=category,
+        price=Decimal('3.00'),
+        active_ingredient=active_ingredient,
+        expiry_date=datetime.date.today() + datetime.timedelta(days=365),
+        stock_quantity=stock,
+    )
+
+
+class MedicineSearchTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Antidouleurs')
+        self.doliprane = make_medicine(category, 'Doliprane 500', active_ingredient='Paracétamol')
+        self.efferalgan = make_medicine(category, 'Efferalgan', active_ingredient='Paracétamol')
+        self.advil = make_medicine(
+            category, 'Advil', active_ingredient='Ibuprofène',
+            description='Anti-inflammatoire, ne pas associer au paracétamol',
+        )
+
+    def search(self, query):
+        return list(search_medicines(Medicine.objects.all(), query))
+
+    def test_prefix_and_accent_insensitive_matching(self):
+        self.assertEqual(self.search('dolip'), [self.doliprane])
+        self.assertEqual(self.search('ibuprofene'), [self.advil])
+
+    def test_results_are_ranked_by_field_weight(self):
+        results = self.search('paracetamol')
+        self.assertEqual(set(results[:2]), {self.doliprane, self.efferalgan})
+        self.assertEqual(results[2], self.advil)
+
+    def test_index_follows_save_and_delete(self):
+        self.advil.name = 'Nurofen'
+        self.advil.save()
+        self.assertEqual(self.search('nurofen'), [self.advil])
+        self.assertEqual(self.search('advil'), [])
+
+        self.advil.delete()
+        self.assertEqual(self.search('nurofen'), [])
+
+    def test_limit_applies_after_the_caller_filters(self):
+        # Les résultats les mieux classés sont en rupture : la limite ne doit pas les compter
+        Medicine.objects.filter(pk__in=[self.doliprane.pk, self.efferalgan.pk]).update(stock_quantity=0)
+        in_stock = Medicine.objects.filter(stock_quantity__gt=0)
+        self.assertEqual(list(search_medicines(in_stock, 'paracetamol', limit=1)), [self.advil])
+
+    def test_operators_in_user_input_are_ignored(self):
+        self.assertEqual(self.search('"doli* OR'), [])
+        self.assertEqual(self.search('doli*'), [self.doliprane])
+
+
+@override_settings(BACKGROUND_TASKS_MODE='sync')
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Vitamines')
+        self.vitamine_c = make_medicine(self.category, 'Vitamine C')
+
+    def test_featured_medicines_are_served_from_cache(self):
+        self.assertEqual(get_featured_medicines(), [self.vitamine_c])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_featured_medicines(), [self.vitamine_c])
+
+    def test_medicine_and_category_changes_invalidate_the_cache(self):
+        get_featured_medicines()
+        get_categories()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vitamine_d = make_medicine(self.category, 'Vitamine D')
+            # Pas d'invalidation avant la validation de la transaction
+            self.assertNotIn(vitamine_d, get_featured_medicines())
+        self.assertIn(vitamine_d, get_featured_medicines())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Antibiotiques')
+        self.assertEqual(len(get_categories()), 2)
+
+    def test_stock_out_at_checkout_invalidates_the_cache(self):
+        user = User.objects.create_user('client')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, medicine=self.vitamine_c, quantity=10)
+        get_featured_medicines()
+
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media), self.captureOnCommitCallbacks(execute=True):
+            place_order(cart, user)
+
+        self.assertEqual(get_featured_medicines(), [])
+
+
+def make_image(width, height, image_format='JPEG'):
+    """Image bruitée (peu compressible, comme une photo)"""
+    image = Image.merge('RGB', [Image.effect_noise((width, height), 64)] * 3)
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=95)
+    return SimpleUploadedFile(f'photo.{image_format.lower()}', buffer.getvalue())
+
+
+@override_settings(BACKGROUND_TASKS_MODE='sync', THUMBNAIL_WIDTHS=(160, 320, 640))
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.category = Category.objects.create(name='Antidouleurs')
+
+    def create_with_image(self, name, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            medicine = make_medicine(self.category, name)
+            medicine.image = image
+            medicine.save()
+        medicine.refresh_from_db()
+        return medicine
+
+    def test_upload_generates_hashed_webp_and_jpeg_thumbnails(self):
+        original = make_image(1600, 1200)
+        medicine = self.create_with_image('Doliprane', original)
+
+        variants = medicine.image_variants
+        self.assertEqual(variants['source'], medicine.image.name)
+        self.assertEqual(sorted(variants['webp'], key=int), ['160', '320', '640'])
+        with default_storage.open(variants['jpeg']['320']) as file:
+            self.assertEqual(Image.open(file).size, (320, 240))
+        # Vignette de la grille : un ordre de grandeur plus légère que l'original
+        self.assertLess(default_storage.size(variants['webp']['320']) * 10, original.size)
+
+        # Même image sur un autre médicament : mêmes fichiers (empreinte du contenu)
+        other = self.create_with_image('Efferalgan', make_image(10, 10))
+        self.assertNotEqual(other.image_variants['jpeg'], variants['jpeg'])
+        original.seek(0)
+        again = self.create_with_image('Dafalgan', SimpleUploadedFile('copie.jpg', original.read()))
+        self.assertEqual(again.image_variants['webp'], variants['webp'])
+
+    def test_small_images_are_not_upscaled(self):
+        medicine = self.create_with_image('Smecta', make_image(200, 100, 'PNG'))
+        self.assertEqual(sorted(medicine.image_variants['jpeg'], key=int), ['160', '200'])
+
+    def test_picture_tag_serves_srcset_then_falls_back_to_the_original(self):
+        medicine = self.create_with_image('Doliprane', make_image(800, 600))
+        template = Template('{% load medicine_images %}{% medicine_picture medicine %}')
+        html = template.render(Context({'medicine': medicine}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('_640.webp 640w', html)
+        self.assertIn('_160.jpg 160w', html)
+
+        # Nouvelle image, vignettes pas encore générées : image d'origine
+        medicine.image = make_image(300, 300)
+        medicine.image.name = 'medicines/nouvelle.jpg'
+        html = template.render(Context({'medicine': medicine}))
+        self.assertNotIn('srcset', html)
+        self.assertIn('nouvelle.jpg', html)
+
+
+@override_settings(BACKGROUND_TASKS_MODE='sync')
+class SeedPharmacyTests(TestCase):
+    def seed(self, **kwargs):
+        options = dict(categories=3, medicines=25, users=8, orders=60, days=30, seed=7, batch_size=40)
+        return seed_pharmacy(**{**options, **kwargs})
+
+    def test_seeded_history_is_consistent_with_the_stock(self):
+        existing = make_medicine(Category.objects.create(name='Existante'), 'Doliprane')
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.seed()
+
+        self.assertEqual(Medicine.objects.count(), 26)
+        self.assertEqual(Order.objects.count(), 60)
+        self.assertEqual(OrderItem.objects.count(), result['rows']['order_items'])
+        self.assertEqual(
+            StockMovement.objects.filter(movement_type='out').aggregate(total=Sum('quantity'))['total'],
+            OrderItem.objects.aggregate(total=Sum('quantity'))['total'],
+        )
+        # Identifiants à la suite des données existantes
+        self.assertGreater(result['first_ids']['products.Medicine'], existing.pk)
+        # Stock = instantané d'ouverture + mouvements = lots ; totaux des commandes = lignes
+        self.assertFalse(ledger_discrepancies().exists())
+        for medicine in Medicine.objects.exclude(pk=existing.pk).annotate(lot_total=Sum('lots__quantity')):
+            self.assertEqual(medicine.lot_total or 0, medicine.stock_quantity)
+            self.assertEqual(medicine.stock_status, Medicine.compute_stock_status(
+                medicine.stock_quantity, medicine.minimum_stock))
+        for order in Order.objects.prefetch_related('items'):
+            self.assertEqual(order.total_amount, sum(item.quantity * item.price for item in order.items.all()))
+        self.assertTrue(search_medicines(Medicine.objects.all(), 'paracetamol'))
+
+    def test_same_seed_gives_the_same_data(self):
+        self.seed()
+        columns = ('dosage', 'price', 'stock_quantity', 'minimum_stock')
+        first = list(Medicine.objects.order_by('pk').values_list(*columns))
+        Order.objects.all().delete()
+        Medicine.objects.all().delete()
+        self.seed()
+        self.assertEqual(list(Medicine.objects.order_by('pk').values_list(*columns)), first)
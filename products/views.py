@@ -25,10 +25,14 @@ def product_list(request):
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
 from django.core.paginator import Paginator
 from .models import Medicine, Category
+from .search import search_medicines
+from .cache import cached, get_best_sellers, get_categories, get_featured_medicines
+from pharmacy_online.metrics import CART_ADDITIONS
+from pharmacy_online.pagination import CursorPaginator
 from orders.models import Cart, CartItem
+from inventory.reservations import hold_stock
 
 
 def home(request):
@@ -38,6 +42,7 @@ def home(request):
     Affiche :
     - Les médicaments en vedette (disponibles et en stock)
     - Les catégories principales
+    - Les meilleures ventes des 30 derniers jours
     - Une interface d'accueil attrayante
     
     Args:
@@ -47,40 +52,26 @@ def home(request):
         HttpResponse: Rendu du template d'accueil avec le contexte
     """
     
-    # Récupération des médicaments en vedette (limités à 8)
-    featured_medicines = Medicine.objects.filter(
-        is_available=True,
-        stock_quantity__gt=0
-    ).order_by('-created_at')[:8]  # Les plus récents en premier
-    
-    # Récupération des catégories principales (limitées à 6)
-    categories = Category.objects.all()[:6]
+    # Récupération des médicaments en vedette (limités à 8, les plus récents)
+    # et des catégories principales (limitées à 6), servis depuis le cache catalogue
+    featured_medicines = get_featured_medicines(8)
+    categories = get_categories(6)
+    best_sellers = get_best_sellers(30, 8)
     
     # Préparation du contexte
     context = {
         'featured_medicines': featured_medicines,
         'categories': categories,
+        'best_sellers': best_sellers,
     }
     
     return render(request, 'home.html', context)
 
 
-def medicine_list(request):
+def _medicine_page(category_id, search_query, page_number, cursor):
     """
-    Vue principale pour afficher la liste des médicaments disponibles
-    
-    Cette vue implémente :
-    1. Affichage de tous les médicaments en stock
-    2. Filtrage par catégorie
-    3. Recherche textuelle multi-champs
-    4. Pagination des résultats
-    5. Affichage des catégories pour la navigation
-    
-    Args:
-        request: Objet HttpRequest contenant les paramètres de la requête
-        
-    Returns:
-        HttpResponse: Rendu du template avec le contexte des médicaments
+    Calcule une page de la liste des médicaments (valeur entièrement évaluée,
+    pour pouvoir être stockée dans le cache catalogue)
     """
     
     # ===== RÉCUPÉRATION DES DONNÉES DE BASE =====
@@ -90,41 +81,72 @@ def medicine_list(request):
         is_available=True,           # Seulement les médicaments disponibles
         stock_quantity__gt=0        # Seulement ceux avec du stock
     )
-    
-    # Récupération de toutes les catégories pour le menu de filtrage
-    categories = Category.objects.all()
 
     # ===== FILTRAGE PAR CATÉGORIE =====
     
-    # Récupération du paramètre de catégorie depuis l'URL
-    category_id = request.GET.get('category')
     if category_id:
         # Application du filtre par catégorie
         medicines = medicines.filter(category_id=category_id)
 
     # ===== RECHERCHE TEXTUELLE =====
     
-    # Récupération du terme de recherche depuis l'URL
-    search_query = request.GET.get('search')
     if search_query:
-        # Recherche dans plusieurs champs avec Q objects (requêtes complexes)
-        medicines = medicines.filter(
-            Q(name__icontains=search_query) |                    # Nom du médicament
-            Q(active_ingredient__icontains=search_query) |       # Principe actif
-            Q(description__icontains=search_query)               # Description
-        )
-        # icontains : recherche insensible à la casse
+        # Recherche plein texte classée par pertinence sur le nom, le principe
+        # actif et la description, avec correspondance par préfixe
+        # (index GIN sous PostgreSQL, FTS5 sous SQLite : voir products/search.py)
+        medicines = search_medicines(medicines, search_query)
+
+        # Résultats classés (nombre borné par SEARCH_RESULTS_LIMIT) : pagination
+        # numérotée sur la liste des ids, puis chargement des 12 médicaments de la page
+        ranked_ids = list(medicines.values_list('pk', flat=True))
+        page = Paginator(ranked_ids, 12).get_page(page_number)
+        by_id = Medicine.objects.in_bulk(page.object_list)
+        page.object_list = [by_id[pk] for pk in page.object_list if pk in by_id]
+        return page
 
     # ===== PAGINATION =====
     
-    # Configuration de la pagination : 12 médicaments par page
-    paginator = Paginator(medicines, 12)
+    # Parcours du catalogue : pagination par curseur sur (name, id),
+    # sans COUNT(*) ni OFFSET, 12 médicaments par page
+    return CursorPaginator(medicines, ('name', 'id'), 12).get_page(cursor)
+
+
+def medicine_list(request):
+    """
+    Vue principale pour afficher la liste des médicaments disponibles
     
-    # Récupération du numéro de page depuis l'URL
-    page_number = request.GET.get('page')
+    Cette vue implémente :
+    1. Affichage de tous les médicaments en stock
+    2. Filtrage par catégorie
+    3. Recherche plein texte multi-champs classée par pertinence
+    4. Pagination des résultats (par curseur hors recherche)
+    5. Affichage des catégories pour la navigation
     
-    # Récupération de la page demandée
-    medicines = paginator.get_page(page_number)
+    Args:
+        request: Objet HttpRequest contenant les paramètres de la requête
+        
+    Returns:
+        HttpResponse: Rendu du template avec le contexte des médicaments
+    """
+    
+    # ===== PARAMÈTRES DE LA REQUÊTE =====
+    
+    # Catégorie, terme de recherche et position dans la liste depuis l'URL
+    category_id = request.GET.get('category')
+    search_query = request.GET.get('search')
+    page_number = request.GET.get('page')
+    cursor = request.GET.get('cursor')
+
+    # Récupération de toutes les catégories pour le menu de filtrage
+    categories = get_categories()
+
+    # Page de médicaments mise en cache par catégorie, recherche et page ;
+    # invalidée à chaque modification du catalogue (voir products/signals.py)
+    medicines = cached(
+        'medicine_list',
+        (category_id, search_query, page_number, cursor),
+        lambda: _medicine_page(category_id, search_query, page_number, cursor),
+    )
 
     # ===== PRÉPARATION DU CONTEXTE =====
     
@@ -168,7 +190,7 @@ def add_to_cart(request, medicine_id):
     
     Cette vue :
     1. Vérifie que l'utilisateur est connecté (@login_required)
-    2. Vérifie la disponibilité du stock
+    2. Réserve le stock pour le panier (voir inventory/reservations.py)
     3. Ajoute ou met à jour la quantité dans le panier
     4. Affiche des messages de confirmation ou d'erreur
     
@@ -191,6 +213,7 @@ def add_to_cart(request, medicine_id):
     
     # Vérification que le médicament est en stock
     if medicine.stock_quantity <= 0:
+        CART_ADDITIONS.inc(outcome='out_of_stock')
         messages.error(request, "Ce médicament n'est plus en stock.")
         return redirect('products:medicine_detail', pk=medicine_id)
 
@@ -199,26 +222,29 @@ def add_to_cart(request, medicine_id):
     # Récupération ou création du panier de l'utilisateur
     cart, created = Cart.objects.get_or_create(user=request.user)
     
-    # Récupération ou création de l'article dans le panier
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        medicine=medicine,
-        defaults={'quantity': 1}  # Quantité par défaut si nouvel article
-    )
+    # Quantité visée après ajout (1 pour un nouvel article)
+    cart_item = CartItem.objects.filter(cart=cart, medicine=medicine).first()
+    quantity = cart_item.quantity + 1 if cart_item else 1
 
-    if not created:
-        # Article déjà dans le panier : augmentation de la quantité
-        if cart_item.quantity < medicine.stock_quantity:
-            # Vérification que l'augmentation est possible
-            cart_item.quantity += 1
-            cart_item.save()
-            messages.success(request, f"{medicine.name} ajouté au panier.")
-        else:
-            # Stock insuffisant pour augmenter
+    # Réservation du stock pour ce panier : échoue si les dernières unités
+    # sont déjà réservées par d'autres paniers
+    if not hold_stock(cart, medicine, quantity):
+        CART_ADDITIONS.inc(outcome='not_held')
+        if cart_item:
             messages.warning(request, "Stock insuffisant pour augmenter la quantité.")
+        else:
+            messages.error(request, "Ce médicament n'est plus disponible pour le moment.")
+        return redirect('products:medicine_detail', pk=medicine_id)
+
+    if cart_item:
+        # Article déjà dans le panier : augmentation de la quantité
+        cart_item.quantity = quantity
+        cart_item.save()
     else:
         # Nouvel article ajouté
-        messages.success(request, f"{medicine.name} ajouté au panier.")
+        CartItem.objects.create(cart=cart, medicine=medicine, quantity=quantity)
+    CART_ADDITIONS.inc(outcome='added')
+    messages.success(request, f"{medicine.name} ajouté au panier.")
 
     # Redirection vers la page du médicament
     return redirect('products:medicine_detail', pk=medicine_id)